@@ -0,0 +1,128 @@
+"""
+Frame codec for the streaming endpoints.
+
+Every service emits one JSON document per streamed update, and the cumulative
+reports inside those documents get re-serialised on every token. This module
+keeps that hot path in one place:
+
+- JSON uses orjson when it is installed and falls back to the stdlib.
+- MessagePack framing is offered when `msgpack` is installed and the caller
+  asks for it with `Accept: application/x-msgpack`. Frames are written back to
+  back and decoded with a streaming unpacker, so no delimiter is needed.
+
+The same file is shipped in every service directory because each service is
+built from its own Docker context.
+"""
+
+import json
+from typing import Any, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional binary framing
+    msgpack = None
+
+SSE_MEDIA_TYPE = "text/event-stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+MSGPACK_AVAILABLE = msgpack is not None
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serialise ``obj`` to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """Serialise ``obj`` to a compact JSON string."""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def loads(data: str | bytes) -> Any:
+    """Parse a JSON document. Raises ``ValueError`` on malformed input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_sse(obj: Any) -> bytes:
+    """Encode ``obj`` as a single ``data:`` server-sent event."""
+    return b"data: " + dumps_bytes(obj) + b"\n\n"
+
+
+def encode_ndjson(obj: Any) -> bytes:
+    """Encode ``obj`` as one newline-terminated JSON line."""
+    return dumps_bytes(obj) + b"\n"
+
+
+def encode_msgpack(obj: Any) -> bytes:
+    """Encode ``obj`` as one MessagePack frame."""
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def encode_frame(obj: Any, media_type: str) -> bytes:
+    """Encode ``obj`` for a response that was negotiated as ``media_type``."""
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return encode_msgpack(obj)
+    if media_type == NDJSON_MEDIA_TYPE:
+        return encode_ndjson(obj)
+    return encode_sse(obj)
+
+
+def negotiate_media_type(accept: Optional[str], default: str) -> str:
+    """
+    Pick the response framing for a streaming endpoint.
+
+    MessagePack is only chosen when the client lists it explicitly and the
+    library is importable here; everything else gets ``default`` so browsers
+    and existing clients keep receiving text frames.
+    """
+    if not accept or msgpack is None:
+        return default
+    for item in accept.split(","):
+        media_range, _, params = item.strip().partition(";")
+        if media_range.strip().lower() != MSGPACK_MEDIA_TYPE:
+            continue
+        if params.replace(" ", "").lower() in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            return default
+        return MSGPACK_MEDIA_TYPE
+    return default
+
+
+def upstream_accept_header() -> str:
+    """Accept header used when this service consumes another service's stream."""
+    if msgpack is None:
+        return SSE_MEDIA_TYPE
+    return f"{MSGPACK_MEDIA_TYPE}, {SSE_MEDIA_TYPE};q=0.9"
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    """Return True if a response ``Content-Type`` announces MessagePack frames."""
+    if not content_type:
+        return False
+    return content_type.split(";")[0].strip().lower() == MSGPACK_MEDIA_TYPE
+
+
+class MsgpackFrameDecoder:
+    """Incrementally decode back-to-back MessagePack frames from byte chunks."""
+
+    def __init__(self, max_buffer_size: int = 64 * 1024 * 1024):
+        if msgpack is None:
+            raise RuntimeError("msgpack is not installed")
+        self._unpacker = msgpack.Unpacker(raw=False, max_buffer_size=max_buffer_size)
+
+    def feed(self, chunk: bytes) -> Iterator[Any]:
+        """Add ``chunk`` to the buffer and yield every frame now complete."""
+        self._unpacker.feed(chunk)
+        yield from self._unpacker
@@ -0,0 +1,206 @@
+"""
+Documents retrieved during one research run, and what the model has seen.
+
+The same documents come back from many searches of a run. The store keeps
+each one once, keyed by its normalized URL, with the document split into
+passages a single time. Search evidence is chosen among the passages the model has not been
+shown yet: a passage counts as shown while the observation of the turn that
+showed it is still in the model input, and becomes new again once that turn
+has been compacted away (turn_context.py).
+
+Searches are remembered by a MinHash signature of the word shingles of their
+query (runs of QUERY_SHINGLE_WORDS consecutive terms, stopwords left out). A
+query whose estimated Jaccard similarity to an earlier query of the run
+reaches QUERY_DUPLICATE_THRESHOLD (the same terms in the same order, with a
+stopword or punctuation changed) is answered from the documents of that
+search, without a request.
+
+Settings are read from the environment:
+
+- DOCUMENT_STORE: reuse documents and repeated searches within a run
+  (default "true")
+- QUERY_DUPLICATE_THRESHOLD: similarity at which a query repeats an earlier
+  one (default 0.8)
+"""
+
+import hashlib
+import os
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+import passages
+
+DOCUMENT_STORE = os.getenv("DOCUMENT_STORE", "true").lower() == "true"
+QUERY_DUPLICATE_THRESHOLD = float(os.getenv("QUERY_DUPLICATE_THRESHOLD", "0.8"))
+
+MINHASH_PERMUTATIONS = 64
+QUERY_SHINGLE_WORDS = 2
+# A prime above 2^32, so (a * x + b) mod p of 32-bit hashes stays in uint64
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 1 << 32, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+# Query parameters that only track where a visitor came from
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+
+
+def normalize_url(url: str) -> str:
+    """``url`` without scheme, www., fragment or tracking parameters."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(
+        sorted(
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not name.lower().startswith(_TRACKING_PARAMS)
+        )
+    )
+    normalized = host + parts.path.rstrip("/")
+    return f"{normalized}?{query}" if query else normalized
+
+
+def document_key(url: str, text: str) -> str:
+    if url.strip():
+        return f"url:{normalize_url(url)}"
+    return "text:" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def shingles(query: str, size: int = QUERY_SHINGLE_WORDS) -> Set[str]:
+    """Runs of ``size`` consecutive query terms, the terms of a shorter query."""
+    terms = passages.tokenize(query)
+    if len(terms) <= size:
+        return {" ".join(terms)} if terms else set()
+    return {" ".join(terms[i : i + size]) for i in range(len(terms) - size + 1)}
+
+
+def minhash(query: str) -> Optional[np.ndarray]:
+    """MinHash signature of the query's shingles, None when it has no terms."""
+    shingled = shingles(query)
+    if not shingled:
+        return None
+    hashes = np.array(
+        [zlib.crc32(shingle.encode("utf-8")) for shingle in shingled],
+        dtype=np.uint64,
+    )
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+class StoredDocument:
+    __slots__ = ("url", "text", "passages", "shown")
+
+    def __init__(self, url: str, text: str):
+        self.url = url
+        self.text = text
+        self.passages = passages.split_passages(text)
+        self.shown: Dict[int, int] = {}  # passage index -> turn that showed it
+
+
+class DocumentStore:
+    """Documents, shown passages and searches of one research run."""
+
+    def __init__(
+        self,
+        enabled: bool = DOCUMENT_STORE,
+        duplicate_threshold: float = QUERY_DUPLICATE_THRESHOLD,
+    ):
+        # Disabled, every search goes out and every passage counts as new
+        self.enabled = enabled
+        self.duplicate_threshold = duplicate_threshold
+        self.documents: Dict[str, StoredDocument] = {}
+        # Earlier searches: signature rows, and (query, num_docs, keys) of each
+        self._signatures = np.empty((0, MINHASH_PERMUTATIONS), dtype=np.uint64)
+        self._searches: List[Tuple[str, int, List[str]]] = []
+        self._stats = {
+            "documents_added": 0,
+            "documents_reused": 0,
+            "searches_served": 0,
+            "passages_withheld": 0,
+        }
+
+    def add(self, documents: Sequence[str], urls: Sequence[str]) -> List[str]:
+        """Keys of the documents, adding the ones not stored yet."""
+        keys = []
+        for text, url in zip(documents, urls):
+            key = document_key(url, text)
+            if key in self.documents:
+                self._stats["documents_reused"] += 1
+            else:
+                self.documents[key] = StoredDocument(url, text)
+                self._stats["documents_added"] += 1
+            keys.append(key)
+        return keys
+
+    def record_search(self, query: str, num_docs: int, keys: List[str]) -> None:
+        signature = minhash(query)
+        if signature is None or not keys:
+            return
+        self._signatures = np.vstack([self._signatures, signature])
+        self._searches.append((query, num_docs, keys))
+
+    def find_search(self, query: str, num_docs: int) -> Optional[List[str]]:
+        """
+        Document keys of an earlier search that ``query`` repeats and that
+        fetched at least ``num_docs`` documents, or None.
+        """
+        if not self.enabled or not self._searches:
+            return None
+        signature = minhash(query)
+        if signature is None:
+            return None
+        similarity = (self._signatures == signature).mean(axis=1)
+        for index in np.argsort(-similarity, kind="stable"):
+            if similarity[index] < self.duplicate_threshold:
+                break
+            earlier, earlier_docs, keys = self._searches[index]
+            if earlier_docs >= num_docs:
+                print(f"Search {query!r} repeats {earlier!r}, served from the run")
+                self._stats["searches_served"] += 1
+                return keys[:num_docs]
+        return None
+
+    def urls(self, keys: Iterable[str]) -> List[str]:
+        return [self.documents[key].url for key in keys]
+
+    def select_evidence(
+        self,
+        queries: Sequence[str],
+        keys: Sequence[str],
+        turn: int,
+        shown_turns: Set[int],
+        token_budget: int = passages.EVIDENCE_TOKEN_BUDGET,
+    ) -> Tuple[List[Tuple[str, str, float]], int]:
+        """
+        The best passages of the documents that are not in the model input,
+        now marked as shown by ``turn``, and how many matching passages were
+        left out because they are. ``shown_turns`` are the turns whose
+        observation is still in the input.
+        """
+        candidates, refs = [], []
+        withheld = []
+        for key in keys:
+            document = self.documents[key]
+            for index, passage in enumerate(document.passages):
+                if self.enabled and document.shown.get(index) in shown_turns:
+                    withheld.append(passage)
+                else:
+                    candidates.append(passage)
+                    refs.append((document, index))
+        selected = []
+        for index, score in passages.rank_passages(queries, candidates, token_budget):
+            document, passage_index = refs[index]
+            document.shown[passage_index] = turn
+            selected.append((candidates[index], document.url, score))
+        repeated = int(np.count_nonzero(passages.bm25_scores(queries, withheld) > 0))
+        self._stats["passages_withheld"] += repeated
+        return selected, repeated
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self._stats)
+        stats["documents"] = len(self.documents)
+        stats["searches"] = len(self._searches)
+        return stats
@@ -0,0 +1,247 @@
+"""
+Pooled HTTP clients with timeouts, retries and per-backend latency numbers.
+
+One requests.Session (sync) and one httpx.AsyncClient (async) per process
+keep connections to the search backends alive across searches and runs.
+``request`` and ``arequest`` send through them with connect and read
+timeouts and retry what is worth retrying:
+
+- connection errors and timeouts
+- 408, 425, 429 and 5xx gateway/availability statuses (500, 502, 503, 504),
+  after the Retry-After the server asked for when it sent one
+
+Other statuses are returned to the caller at once. Retries wait with
+exponential backoff and full jitter (a random delay up to
+HTTP_BACKOFF_BASE_SECONDS * 2^retry, capped at HTTP_BACKOFF_MAX_SECONDS), so
+runs that failed together don't retry together.
+
+Every attempt is timed per backend; ``stats()`` returns request, retry and
+error counts, statuses and latency percentiles (``GET /retrieval-stats``).
+
+Settings are read from the environment:
+
+- HTTP_CONNECT_TIMEOUT_SECONDS (default 5)
+- HTTP_READ_TIMEOUT_SECONDS (default 30)
+- HTTP_MAX_ATTEMPTS: attempts per request, including the first (default 3)
+- HTTP_BACKOFF_BASE_SECONDS (default 0.5)
+- HTTP_BACKOFF_MAX_SECONDS (default 8)
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "30"))
+HTTP_MAX_ATTEMPTS = int(os.getenv("HTTP_MAX_ATTEMPTS", "3"))
+HTTP_BACKOFF_BASE_SECONDS = float(os.getenv("HTTP_BACKOFF_BASE_SECONDS", "0.5"))
+HTTP_BACKOFF_MAX_SECONDS = float(os.getenv("HTTP_BACKOFF_MAX_SECONDS", "8"))
+
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+POOL_CONNECTIONS = 100
+POOL_KEEPALIVE = 20
+# Latencies kept per backend for the percentiles
+LATENCY_WINDOW = 1000
+
+
+class BackendStats:
+    """Attempts, retries, errors, statuses and recent latencies of a backend."""
+
+    def __init__(self):
+        self.requests = 0
+        self.attempts = 0
+        self.retries = 0
+        self.errors = 0
+        self.statuses: Dict[str, int] = {}
+        self.latencies_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return round(
+                latencies[min(len(latencies) - 1, int(fraction * len(latencies)))], 1
+            )
+
+        return {
+            "requests": self.requests,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "errors": self.errors,
+            "statuses": dict(self.statuses),
+            "mean_ms": (
+                round(sum(latencies) / len(latencies), 1) if latencies else None
+            ),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(latencies[-1], 1) if latencies else None,
+        }
+
+
+_stats: Dict[str, BackendStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _record(backend: str, ms: float, status: Optional[int] = None, error=False):
+    with _stats_lock:
+        stats = _stats.setdefault(backend, BackendStats())
+        stats.attempts += 1
+        stats.latencies_ms.append(ms)
+        if error:
+            stats.errors += 1
+        else:
+            stats.statuses[str(status)] = stats.statuses.get(str(status), 0) + 1
+
+
+def _count(backend: str, name: str) -> None:
+    with _stats_lock:
+        stats = _stats.setdefault(backend, BackendStats())
+        setattr(stats, name, getattr(stats, name) + 1)
+
+
+def stats() -> Dict[str, Any]:
+    """Numbers of every backend called from this process."""
+    with _stats_lock:
+        return {backend: stats.summary() for backend, stats in _stats.items()}
+
+
+def backoff_delay(retry: int, retry_after: Optional[str] = None) -> float:
+    """Seconds to wait before retry number ``retry`` (1 for the first)."""
+    if retry_after:
+        try:
+            return min(float(retry_after), HTTP_BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass  # an HTTP date; fall back to backoff
+    ceiling = min(HTTP_BACKOFF_MAX_SECONDS, HTTP_BACKOFF_BASE_SECONDS * 2**retry)
+    return random.uniform(0, ceiling)
+
+
+# Sync
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Shared requests session with a connection pool per host."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_KEEPALIVE, pool_maxsize=POOL_CONNECTIONS
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def request(
+    backend: str,
+    method: str,
+    url: str,
+    max_attempts: int = HTTP_MAX_ATTEMPTS,
+    **kwargs,
+) -> requests.Response:
+    """
+    Send a request on the shared session, retrying as described above.
+    Returns the last response, or raises the last exception when every
+    attempt failed without one.
+    """
+    kwargs.setdefault(
+        "timeout", (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS)
+    )
+    _count(backend, "requests")
+    for attempt in range(1, max_attempts + 1):
+        start = time.perf_counter()
+        try:
+            response = get_session().request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _record(backend, (time.perf_counter() - start) * 1000, error=True)
+            if attempt == max_attempts:
+                raise
+            print(f"{backend} request failed ({e}), retrying")
+            retry_after = None
+        else:
+            _record(backend, (time.perf_counter() - start) * 1000, response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == max_attempts:
+                return response
+            print(f"{backend} returned {response.status_code}, retrying")
+            retry_after = response.headers.get("Retry-After")
+        _count(backend, "retries")
+        time.sleep(backoff_delay(attempt, retry_after))
+
+
+# Async
+
+_async_client = None
+
+
+def get_async_client():
+    """
+    Shared httpx client for the async queries, so concurrent research runs
+    reuse its connection pool instead of opening connections per search.
+    """
+    global _async_client
+    if _async_client is None:
+        import httpx
+
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                HTTP_READ_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS
+            ),
+            limits=httpx.Limits(
+                max_connections=POOL_CONNECTIONS,
+                max_keepalive_connections=POOL_KEEPALIVE,
+            ),
+        )
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def arequest(
+    backend: str,
+    method: str,
+    url: str,
+    max_attempts: int = HTTP_MAX_ATTEMPTS,
+    **kwargs,
+):
+    """request() on the shared async client; returns an httpx.Response."""
+    import httpx
+
+    _count(backend, "requests")
+    for attempt in range(1, max_attempts + 1):
+        start = time.perf_counter()
+        try:
+            response = await get_async_client().request(method, url, **kwargs)
+        except (httpx.TransportError, httpx.TimeoutException) as e:
+            _record(backend, (time.perf_counter() - start) * 1000, error=True)
+            if attempt == max_attempts:
+                raise
+            print(f"{backend} request failed ({e!r}), retrying")
+            retry_after = None
+        else:
+            _record(backend, (time.perf_counter() - start) * 1000, response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == max_attempts:
+                return response
+            print(f"{backend} returned {response.status_code}, retrying")
+            retry_after = response.headers.get("Retry-After")
+        _count(backend, "retries")
+        await asyncio.sleep(backoff_delay(attempt, retry_after))
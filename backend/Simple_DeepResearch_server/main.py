@@ -15,36 +15,28 @@ Logs:
 
 """
 
-import json
+import asyncio
 import os
 import re
+import threading
+import time
 import traceback
+from contextlib import asynccontextmanager
 
-import google.generativeai as generativeai
-import openai
-import requests
+import codec
+import http_client
+import passages
+import search_cache
+from document_store import DocumentStore
 from dotenv import load_dotenv
-from flask import Flask, Response, jsonify, request
-from flask_cors import CORS
-from google import genai
-from google.genai import types
+from fastapi import APIRouter, FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from http_client import close_async_client, get_async_client
 from prompt import report_format_reminder_prompt, report_prompt, summary_reminder_prompt
-from retrieval import query_clueweb, query_serper
-
-app = Flask(__name__)
-CORS(
-    app,
-    origins="*",
-    methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=[
-        "Content-Type",
-        "Authorization",
-        "Accept",
-        "Origin",
-        "X-Requested-With",
-    ],
-)
-
+from prompt_cache import PromptCache
+from retrieval import aquery_clueweb, aquery_serper
+from turn_context import TurnContext
 
 # Load environment variables from parent directory
 load_dotenv("../../.env")  # Load from parent directory .env file
@@ -58,24 +50,69 @@ PROJECT_ID = "[deepresearch-llm-modeling]"
 LOCATION = os.environ.get("GOOGLE_CLOUD_REGION", "us-central1")
 MODEL_ID = "gemini-2.5-pro-preview-05-06"
 MODEL_ID_Flash = "gemini-2.5-flash-preview-05-20"
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+# Start a turn's search as soon as the streamed response has closed its
+# <search> tag, while the model is still finishing the response
+SPECULATIVE_SEARCH = os.getenv("SPECULATIVE_SEARCH", "true").lower() == "true"
+
+
+def log_environment():
+    """Log environment variable status."""
+    print("=== Simple DeepResearch Server Environment Variables ===")
+    print(f"GEMINI_API_KEY: {'✓ SET' if GEMINI_API_KEY else '✗ NOT SET'}")
+    print(f"SERPER_API_KEY: {'✓ SET' if SERPER_API_KEY else '✗ NOT SET'}")
+    print(f"OPENAI_API_KEY: {'✓ SET' if OPENAI_API_KEY else '✗ NOT SET'}")
+    print(f"PERPLEXITY_API_KEY: {'✓ SET' if PERPLEXITY_API_KEY else '✗ NOT SET'}")
+    print(
+        f"GOOGLE_CLOUD_REGION: {'✓ SET' if LOCATION != 'us-central1' else '✓ DEFAULT (us-central1)'}"
+    )
+    print("=========================================================")
 
-# Log environment variable status
-print("=== Simple DeepResearch Server Environment Variables ===")
-print(f"GEMINI_API_KEY: {'✓ SET' if GEMINI_API_KEY else '✗ NOT SET'}")
-print(f"SERPER_API_KEY: {'✓ SET' if SERPER_API_KEY else '✗ NOT SET'}")
-print(f"OPENAI_API_KEY: {'✓ SET' if OPENAI_API_KEY else '✗ NOT SET'}")
-print(f"PERPLEXITY_API_KEY: {'✓ SET' if PERPLEXITY_API_KEY else '✗ NOT SET'}")
-print(
-    f"GOOGLE_CLOUD_REGION: {'✓ SET' if LOCATION != 'us-central1' else '✓ DEFAULT (us-central1)'}"
-)
-print("=========================================================")
 
 ACTIONS = ["search", "answer", "plan", "scripts", "summary"]
 
+# Queries one search action may carry, one per line; they run concurrently
+MAX_SEARCH_QUERIES = 4
+
+_genai_client = None
+_genai_client_lock = threading.Lock()
+
+
+def get_genai_client():
+    """
+    Shared Gemini client, created on first use. Importing google.genai and
+    building the client cost more than the rest of this service's startup.
+    """
+    global _genai_client
+    if _genai_client is None:
+        with _genai_client_lock:
+            if _genai_client is None:
+                from google import genai
+
+                _genai_client = genai.Client(api_key=GEMINI_API_KEY)
+    return _genai_client
+
+
+def parse_search_queries(content):
+    """
+    Queries of a search action: one per line, without list markers or
+    duplicates, at most MAX_SEARCH_QUERIES.
+    """
+    queries, seen = [], set()
+    for line in content.splitlines():
+        query = re.sub(r"^\s*(?:[-*]|\d+[.)])\s+", "", line).strip()
+        key = " ".join(query.lower().split())
+        if key and key not in seen:
+            seen.add(key)
+            queries.append(query)
+    return queries[:MAX_SEARCH_QUERIES]
+
+
+def numbered(items):
+    return "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
 
-generativeai.configure(api_key=GEMINI_API_KEY)
 
-MAX_CONTEXT_LENGTH = 40000
+router = APIRouter()
 
 
 class LLMAgent:
@@ -84,7 +121,7 @@ class LLMAgent:
             self.model_name = MODEL_ID_Flash
         else:
             self.model_name = MODEL_ID
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
+        self.client = get_genai_client()
         self.consecutive_search_cnt = (
             0  # number of consecutive search actions performed for each sample
         )
@@ -95,11 +132,39 @@ class LLMAgent:
         self.summary_history = ""
         self.config = config
         self.context_cnt = []
+        self.input_tokens = []  # estimated input tokens of each turn
+        self.context = None
+        self.prompt_cache = None
+        self.prefetch = None  # speculative search of the current turn
+        self.prefetch_turns = []  # search time hidden behind generation, per turn
+        self.documents = DocumentStore()  # documents retrieved during this run
         self.current_think_content = ""
 
-    def run_llm_loop(self, prompt):
+    async def run_llm_loop(self, prompt):
+        """
+        Run the research loop, yielding the intermediate steps after every
+        turn and the final report last. Model calls and searches are awaited,
+        so one event loop serves many concurrent runs.
+        """
+        self.context = TurnContext(prompt, compaction_reminder=summary_reminder_prompt)
+        self.prompt_cache = PromptCache(self.client, self.model_name)
+        try:
+            async for step_data in self._research_turns(prompt):
+                yield step_data
+        finally:
+            # Also when the client went away mid-run
+            await self.cancel_prefetch()
+            await self.prompt_cache.close()
+            print(f"Prompt cache: {self.prompt_cache.summary()}")
+            if self.prefetch_turns:
+                saved = sum(turn["saved_ms"] for turn in self.prefetch_turns)
+                print(f"Speculative search saved {saved:.0f} ms in total")
+            print(f"Document store: {self.documents.stats()}")
+
+    async def _research_turns(self, prompt):
         done = False
         input = prompt
+        action = ""
 
         for step in range(self.config["max_turns"]):
             try:
@@ -108,18 +173,14 @@ class LLMAgent:
                 print(f"=====turn {self.num_env_steps}======")
 
                 # start = time.time()
-                thought, action = self.query_gemini(input)
+                thought, action = await self.query_gemini(input)
                 actioname, content = self.parse_action(action)
 
                 if actioname == "scripts" or actioname == "summary":
                     content = self.remove_markdown_blocks(content)
 
-                response_with_thought = f"<think>{thought}</think>\n\n{action}"
-
-                # self._record_trajectory(input, response_with_thought)
-
                 # execute actions (search or answer) and get observations
-                done, updated_history, next_obs = self.execute_response(
+                done, updated_history, next_obs = await self.execute_response(
                     action, self.config["num_docs"]
                 )
                 # end = time.time()
@@ -175,13 +236,13 @@ class LLMAgent:
                     print("=====final response======")
                     break
 
-                input = self._update_input(
-                    input, response_with_thought, next_obs, updated_history, prompt
-                )
+                input = self._update_input(thought, action, next_obs, updated_history)
             except Exception as e:
                 print(f"Error: {e}")
                 print(traceback.format_exc())
-                exit()
+                # Ends this run only; the server keeps serving the others
+                yield {"error": f"Research run failed: {e}"}
+                return
 
         answer = self._compose_final_output(action)
         yield {
@@ -191,7 +252,7 @@ class LLMAgent:
             "is_complete": True,
         }
 
-    def query_gemini(self, prompt):
+    async def query_gemini(self, prompt):
         # TODO: consider how to deal with a response without any action.
         """Query Gemini with action format check. Only return the response with correct format.
         Args:
@@ -208,32 +269,63 @@ class LLMAgent:
             thought = ""
             original_response = ""
 
+            contents, cache_config = await self.prompt_cache.prepare(
+                prompt, self.context.chars_per_token
+            )
+            start = time.perf_counter()
+            ttft = None
+            usage = None
             try:
-                gemini_response = self.client.models.generate_content(
+                stream = await self.client.aio.models.generate_content_stream(
                     model=self.model_name,
-                    contents=prompt,
-                    config=types.GenerateContentConfig(
-                        thinking_config=types.ThinkingConfig(include_thoughts=True)
-                    ),
+                    contents=contents,
+                    config={
+                        "thinking_config": {"include_thoughts": True},
+                        **cache_config,
+                    },
                 )
-
-                for part in gemini_response.candidates[0].content.parts:
-                    if not part.text:
+                async for chunk in stream:
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    if not chunk.candidates or not chunk.candidates[0].content:
                         continue
-                    if part.thought:
-                        thought = part.text
-                    else:
-                        original_response = part.text
+                    for part in chunk.candidates[0].content.parts or []:
+                        if not part.text:
+                            continue
+                        if part.thought:
+                            thought += part.text
+                        else:
+                            original_response += part.text
+                            if SPECULATIVE_SEARCH and self.prefetch is None:
+                                self.start_prefetch(original_response)
 
             except Exception as e:
                 print(f"Error: {e}")
+                await self.cancel_prefetch()
+                if cache_config:
+                    # The cache may have expired; send full inputs from now on
+                    await self.prompt_cache.invalidate()
                 continue
+
+            latency = time.perf_counter() - start
+            if self.prefetch is not None:
+                self.prefetch["generated"] = time.perf_counter()
+            self.context.calibrate(prompt, getattr(usage, "prompt_token_count", None))
+            stats = self.prompt_cache.record(
+                self.num_env_steps, usage, ttft or latency, latency
+            )
+            print(
+                f"Turn {self.num_env_steps}: {stats['prompt_tokens']} prompt tokens, "
+                f"{stats['cached_tokens']} cached, TTFT {stats['ttft_ms']} ms"
+            )
             # print("Original Response")
             # print(original_response)
             action = self.postprocess_response(original_response)
 
             if action is None:
                 print("response with wrong format!")
+                await self.cancel_prefetch()
 
                 # add format reminder prompt for next try
                 format_reminder_prompt = report_format_reminder_prompt
@@ -307,7 +399,7 @@ class LLMAgent:
 
         return None
 
-    def execute_response(self, response, num_docs, do_search=True):
+    async def execute_response(self, response, num_docs, do_search=True):
         """
         Args:
             response: response
@@ -321,28 +413,41 @@ class LLMAgent:
         next_obs = ""
         done = False
         updated_history = False
-        search_query = content if action == "search" else ""
+        queries = parse_search_queries(content) if action == "search" else []
+        if not queries:
+            await self.cancel_prefetch()
 
-        if do_search and search_query != "":
-            search_results, urls = self.search(search_query, num_docs)
+        if do_search and queries:
+            keys = await self.prefetched_search(queries, num_docs)
         else:
-            urls = []
+            keys = []
 
         if action == "answer":
             done = True
         elif action == "search":
             self.search_cnt += 1
             self.consecutive_search_cnt += 1
-            # observation = f'**Search Queries**  {1}.{search_query}  **Fetched URLS**  {1}.{urls[0].strip()}'
+            selected, repeated = self.documents.select_evidence(
+                queries, keys, self.num_env_steps, self.context.shown_observations()
+            )
+            evidence = passages.format_evidence(selected)
+            urls = self.documents.urls(keys)
             if len(urls) == 0:
                 urls.append("Did not return any URL")
             observation = f"""**Search Queries**
 
-1. {search_query}
+{numbered(queries)}
 
 **Fetched URLS**
 
-1. {urls[0].strip()}"""
+{numbered(url.strip() for url in urls)}"""
+            if evidence:
+                observation += f"\n\n{evidence}"
+            if repeated:
+                observation += (
+                    f"\n\n{repeated} more matching passages of these results are "
+                    "already in your history turns and are not repeated."
+                )
             next_obs = observation
         elif action == "plan":
             self.consecutive_search_cnt = 0
@@ -387,40 +492,34 @@ class LLMAgent:
 
         return action_type, content
 
-    def _update_input(
-        self, input, cur_response, next_obs, updated_history, original_prompt
-    ):
-        """Update the input with the history.
+    def _update_input(self, thought, action, next_obs, updated_history):
+        """Record this turn and build the input for the next one.
         Args:
-            input: input
-            cur_response: current response
-            next_obs: next observation
-            updated_history: whether update the history to agent summary
-            original_prompt: original prompt for the question
+            thought: thought of the model in this turn
+            action: action of this turn
+            next_obs: observation of this turn
+            updated_history: whether the history was replaced by an agent summary
         Returns:
-            updated input
+            input for the next turn, within the context token budget
         """
-
         if updated_history:
-            context = (
-                f"[Turn 1 - Turn {self.num_env_steps - 1}]:\n{self.summary_history}\n\n"
-            )
-            context += f"[Turn {self.num_env_steps}]:\n{next_obs}\n\n"
-            new_input = original_prompt + context
+            self.context.summarize(self.num_env_steps, self.summary_history, next_obs)
         else:
-            context = f"[Turn {self.num_env_steps}]:\n{cur_response}\n{next_obs}\n\n"
-            new_input = input + context
+            self.context.add_turn(self.num_env_steps, thought, action, next_obs)
 
         # add reminder for search and final report
+        reminders = []
         if self.consecutive_search_cnt > self.config["search_reminder_turn"]:
-            new_input += f"\n\nNote: You have performed {self.consecutive_search_cnt} search actions. Please consider update your report scripts or output the final report. If you still want to search, make sure you check history search results and DO NOT perform duplicate search."
+            reminders.append(
+                f"Note: You have performed {self.consecutive_search_cnt} search actions. Please consider update your report scripts or output the final report. If you still want to search, make sure you check history search results and DO NOT perform duplicate search."
+            )
         if self.num_env_steps > self.config["final_report_reminder_turn"]:
-            new_input += f"\n\nNote: You have performed {self.num_env_steps} turns. Please consider output the final report. If you still want to search, make sure you check history search results and DO NOT perform duplicate search."
-
-        input_length = len(new_input)
-        if input_length > MAX_CONTEXT_LENGTH:
-            new_input = new_input + summary_reminder_prompt
+            reminders.append(
+                f"Note: You have performed {self.num_env_steps} turns. Please consider output the final report. If you still want to search, make sure you check history search results and DO NOT perform duplicate search."
+            )
 
+        new_input, tokens = self.context.build_input(reminders)
+        self.input_tokens.append(tokens)
         return new_input
 
     def _compose_final_output(self, response):
@@ -429,12 +528,104 @@ class LLMAgent:
         else:
             return "did not find answer"
 
-    def search(self, query, num_docs):
-        print(f"Searching for: {query}")
-        documents, urls = query_clueweb(query, num_docs=num_docs)
-        info_retrieved = "\n\n".join(documents)
-        print(f"Search completed. Found {len(documents)} documents")
-        return info_retrieved, urls
+    def start_prefetch(self, response_so_far):
+        """Start the search of a <search> action that has just been closed."""
+        if "<summary>" in response_so_far:
+            return  # summaries quote earlier searches
+        match = re.search(r"<search>(.*?)</search>", response_so_far, re.DOTALL)
+        if match is None:
+            return
+        queries = parse_search_queries(match.group(1).strip())
+        if not queries:
+            return
+        self.prefetch = {
+            "queries": queries,
+            "task": asyncio.create_task(
+                self.timed_search(queries, self.config["num_docs"])
+            ),
+            "started": time.perf_counter(),
+            "generated": None,  # when the response was complete
+        }
+
+    async def cancel_prefetch(self):
+        if self.prefetch is None:
+            return
+        task = self.prefetch["task"]
+        self.prefetch = None
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    async def timed_search(self, queries, num_docs):
+        start = time.perf_counter()
+        result = await self.search(queries, num_docs)
+        return result, time.perf_counter() - start
+
+    async def prefetched_search(self, queries, num_docs):
+        """
+        The results of the speculative search when it ran these queries,
+        otherwise of a new search; records how much search time the
+        speculative one hid behind the model's generation.
+        """
+        prefetch = self.prefetch
+        if prefetch is None or prefetch["queries"] != queries:
+            await self.cancel_prefetch()
+            return await self.search(queries, num_docs)
+        self.prefetch = None
+        result, duration = await prefetch["task"]
+        # Generation time after the search started, up to the search's length
+        overlap = (prefetch["generated"] or prefetch["started"]) - prefetch["started"]
+        saved = min(duration, overlap)
+        self.prefetch_turns.append(
+            {
+                "turn": self.num_env_steps,
+                "search_ms": round(duration * 1000, 1),
+                "saved_ms": round(saved * 1000, 1),
+            }
+        )
+        print(
+            f"Turn {self.num_env_steps}: speculative search took "
+            f"{duration * 1000:.0f} ms, {saved * 1000:.0f} ms of it during generation"
+        )
+        return result
+
+    async def search(self, queries, num_docs):
+        """
+        Run the queries concurrently and merge their results in query order,
+        each document once. Queries that repeat an earlier search of the run
+        are answered from the document store. Returns the store keys of the
+        documents.
+        """
+        print(f"Searching for: {queries}")
+
+        async def run_query(query):
+            keys = self.documents.find_search(query, num_docs)
+            if keys is None:
+                documents, urls = await aquery_clueweb(
+                    query,
+                    num_docs=num_docs,
+                    use_cache=self.config.get("use_search_cache", True),
+                )
+                keys = self.documents.add(documents, urls)
+                self.documents.record_search(query, num_docs, keys)
+            return keys
+
+        results = await asyncio.gather(
+            *(run_query(query) for query in queries), return_exceptions=True
+        )
+        keys, seen = [], set()
+        for query, result in zip(queries, results):
+            if isinstance(result, Exception):
+                print(f"Search for {query!r} failed: {result}")
+                continue
+            for key in result:
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+        print(f"Search completed. Found {len(keys)} documents")
+        return keys
 
     def remove_markdown_blocks(self, text):
         text = re.sub(r"^```", "", text, flags=re.MULTILINE)
@@ -442,29 +633,45 @@ class LLMAgent:
         return text
 
 
-@app.route("/health", methods=["GET"])
-def health_check():
+@router.get("/health")
+async def health_check():
     """
     Basic health check endpoint
     """
-    return jsonify(
-        {
-            "status": "healthy",
-            "service": "Simple DeepResearch Server",
-            "port": 5003,
-            "endpoints": {
-                "/health": "Health check",
-                "/test-connections": "Test all API connections",
-                "/test-openai": "Test OpenAI API connection",
-                "/test-perplexity": "Test Perplexity API connection",
-                "/run": "Main research endpoint",
-            },
-        }
-    )
+    return {
+        "status": "healthy",
+        "service": "Simple DeepResearch Server",
+        "port": 5003,
+        "endpoints": {
+            "/health": "Health check",
+            "/test-connections": "Test all API connections",
+            "/test-openai": "Test OpenAI API connection",
+            "/test-perplexity": "Test Perplexity API connection",
+            "/run": "Main research endpoint",
+            "/search-cache": "Search result cache statistics",
+            "/retrieval-stats": "Search backend latency and retry statistics",
+        },
+    }
+
+
+@router.get("/search-cache")
+async def search_cache_stats():
+    """
+    Hits, misses and latency saved by the search result cache in this process
+    """
+    return search_cache.stats()
+
+
+@router.get("/retrieval-stats")
+async def retrieval_stats():
+    """
+    Requests, retries, errors, statuses and latency per search backend
+    """
+    return http_client.stats()
 
 
-@app.route("/test-connections", methods=["GET"])
-def test_api_connections():
+@router.get("/test-connections")
+async def test_api_connections():
     """
     Test endpoint to verify Gemini, Serper, OpenAI, and Perplexity API connections
     """
@@ -483,8 +690,8 @@ def test_api_connections():
             results["gemini"]["message"] = "GEMINI_API_KEY not set"
         else:
             # Test Gemini with a simple request
-            client = genai.Client(api_key=GEMINI_API_KEY)
-            test_response = client.models.generate_content(
+            client = get_genai_client()
+            test_response = await client.aio.models.generate_content(
                 model=MODEL_ID_Flash, contents="Say 'Hello' if you can read this."
             )
 
@@ -506,7 +713,9 @@ def test_api_connections():
             results["serper"]["message"] = "SERPER_API_KEY not set"
         else:
             # Test Serper with a simple search
-            documents, urls = query_serper("test search", num_docs=1)
+            documents, urls = await aquery_serper(
+                "test search", num_docs=1, use_cache=False
+            )
 
             if documents and len(documents) > 0:
                 results["serper"]["status"] = "success"
@@ -528,8 +737,10 @@ def test_api_connections():
             results["openai"]["message"] = "OPENAI_API_KEY not set"
         else:
             # Test OpenAI with a simple completion
-            client = openai.OpenAI(api_key=OPENAI_API_KEY)
-            response = client.chat.completions.create(
+            import openai
+
+            client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+            response = await client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "user", "content": "Say 'Hello' if you can read this."}
@@ -568,7 +779,7 @@ def test_api_connections():
                 "max_tokens": 10,
             }
 
-            response = requests.post(
+            response = await get_async_client().post(
                 "https://api.perplexity.ai/chat/completions",
                 headers=headers,
                 json=payload,
@@ -604,11 +815,11 @@ def test_api_connections():
     else:
         results["overall_status"] = "error"
 
-    return jsonify(results)
+    return results
 
 
-@app.route("/test-openai", methods=["GET"])
-def test_openai_connection():
+@router.get("/test-openai")
+async def test_openai_connection():
     """
     Test endpoint specifically for OpenAI API connection
     """
@@ -619,8 +830,10 @@ def test_openai_connection():
             result["status"] = "error"
             result["message"] = "OPENAI_API_KEY not set"
         else:
-            client = openai.OpenAI(api_key=OPENAI_API_KEY)
-            response = client.chat.completions.create(
+            import openai
+
+            client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+            response = await client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[{"role": "user", "content": "Test connection"}],
                 max_tokens=5,
@@ -638,11 +851,11 @@ def test_openai_connection():
         result["status"] = "error"
         result["message"] = f"Error: {str(e)}"
 
-    return jsonify(result)
+    return result
 
 
-@app.route("/test-perplexity", methods=["GET"])
-def test_perplexity_connection():
+@router.get("/test-perplexity")
+async def test_perplexity_connection():
     """
     Test endpoint specifically for Perplexity API connection
     """
@@ -664,7 +877,7 @@ def test_perplexity_connection():
                 "max_tokens": 5,
             }
 
-            response = requests.post(
+            response = await get_async_client().post(
                 "https://api.perplexity.ai/chat/completions",
                 headers=headers,
                 json=payload,
@@ -685,20 +898,25 @@ def test_perplexity_connection():
         result["status"] = "error"
         result["message"] = f"Error: {str(e)}"
 
-    return jsonify(result)
+    return result
 
 
-@app.route("/run", methods=["POST"])
-def return_model_response():
+@router.post("/run")
+async def return_model_response(request: Request):
+    data = await request.json()
 
     # Support both 'input' and 'question' parameter names for compatibility
-    question = request.json.get("question") or request.json.get("input")
+    question = data.get("question") or data.get("input")
+    if not question:
+        raise HTTPException(status_code=400, detail="Question is required.")
 
     prompt = report_prompt.format(question=question)
 
     config = {
         "max_turns": 30,  # max number of turns
-        "num_docs": 1,  # number of documents to retrieve
+        # number of documents to retrieve per query; only their passages that
+        # best match the queries go into the observation (see passages.py)
+        "num_docs": 5,
         "max_try_time": 5,  # max number of tries to generate a response
         # number of turns to remind the agent to stop search and revise the report
         # scripts or output the final report (only for long report)
@@ -706,36 +924,77 @@ def return_model_response():
         # number of turns to remind the agent to output the final report (only for
         # long report)
         "final_report_reminder_turn": 15,
+        # freshness-sensitive runs skip the search result cache
+        "use_search_cache": not data.get("bypass_search_cache", False),
     }
 
     agent = LLMAgent(config, is_flash=False)
 
     print(f"Model: {agent.model_name}")
 
-    def generate():
-        for step_data in agent.run_llm_loop(prompt):
-            yield f"data: {json.dumps(step_data)}\n\n"
+    media_type = codec.negotiate_media_type(
+        request.headers.get("accept"), codec.SSE_MEDIA_TYPE
+    )
+
+    async def generate():
+        async for step_data in agent.run_llm_loop(prompt):
+            yield codec.encode_frame(step_data, media_type)
 
-    response = Response(
+    return StreamingResponse(
         generate(),
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",  # Add if needed for CORS
-            "Access-Control-Allow-Headers": "Cache-Control",
-        },
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
     )
 
-    return response
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_environment()
+    if WARMUP_ON_STARTUP:
+        get_genai_client()
+    yield
+    await close_async_client()
+
+
+def create_app() -> FastAPI:
+    """
+    Build the service. The Gemini SDK is imported and its client created on
+    the first research run, or at startup when WARMUP_ON_STARTUP=true. Also
+    usable as ``uvicorn --factory main:create_app``.
+    """
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        allow_headers=[
+            "Content-Type",
+            "Authorization",
+            "Accept",
+            "Origin",
+            "X-Requested-With",
+            "Cache-Control",
+        ],
+    )
+    app.include_router(router)
+    return app
+
+
+app = create_app()
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     print("\n=== Starting Simple DeepResearch Server ===")
     print("Available endpoints:")
     print("  GET  /health - Health check")
     print("  GET  /test-connections - Test all API connections")
     print("  GET  /test-openai - Test OpenAI API connection")
     print("  GET  /test-perplexity - Test Perplexity API connection")
+    print("  GET  /search-cache - Search result cache statistics")
+    print("  GET  /retrieval-stats - Search backend latency statistics")
     print("  POST /run - Main research endpoint")
     print("===============================================\n")
-    app.run(debug=False, port=5003)
+    # One event loop serves all concurrent research runs (see LLMAgent)
+    uvicorn.run("main:app", host="0.0.0.0", port=5003)
@@ -0,0 +1,69 @@
+"""
+Markdown links for the outlinks of a ClueWeb document, built in one pass.
+
+Every outlink carries the anchor text it has in the document. Outlinks are
+given, in their order, the first occurrence of their anchor that no earlier
+outlink has claimed and that doesn't overlap a claimed one, so outlinks
+sharing an anchor link successive occurrences. The document is rebuilt once
+from its pieces; anchors that were not found are listed after it.
+
+Anchors are only matched in the original text, never inside a link inserted
+for an earlier outlink (its text or its URL), which would nest or break the
+markdown. An outlink whose anchor only occurs there is listed with the
+unmatched ones. An empty anchor links nothing: as before, its link is put
+at the start of the document and it doesn't count as not found.
+"""
+
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+
+def annotate_outlinks(outlinks: Sequence[Sequence], text: str) -> Tuple[str, int]:
+    """
+    ``text`` with the anchors of ``outlinks`` (ClueWeb tuples of url,
+    urlhash, anchor text, ...) linked, and the number of anchors not found.
+    """
+    searched: Dict[str, int] = {}  # anchor -> where to look for it next
+    starts: List[int] = []  # claimed spans, sorted by start
+    spans: Dict[int, Tuple[int, str]] = {}  # start -> (end, link)
+    leading: List[str] = []  # links of empty anchors, last one first
+    not_matched = []
+    for outlink in outlinks:
+        url, anchor = outlink[0], outlink[2]
+        link = f"[{anchor}]({url})"
+        if not anchor:
+            leading.insert(0, link)
+            continue
+        start = text.find(anchor, searched.get(anchor, 0))
+        while start != -1:
+            end = start + len(anchor)
+            position = bisect_left(starts, start)
+            overlaps = (position and spans[starts[position - 1]][0] > start) or (
+                position < len(starts) and starts[position] < end
+            )
+            if not overlaps:
+                starts.insert(position, start)
+                spans[start] = (end, link)
+                break
+            start = text.find(anchor, start + 1)
+        if start == -1:
+            searched[anchor] = len(text) + 1
+            not_matched.append(link)
+        else:
+            searched[anchor] = start + 1
+
+    pieces = leading
+    previous = 0
+    for start in starts:
+        end, link = spans[start]
+        pieces.append(text[previous:start])
+        pieces.append(link)
+        previous = end
+    pieces.append(text[previous:])
+    if not_matched:
+        pieces.append(
+            "\n\nHere are additional URLs and their anchor texts mentioned in "
+            "this document:\n"
+        )
+        pieces.append("\n".join(not_matched))
+    return "".join(pieces), len(not_matched)
@@ -0,0 +1,148 @@
+"""
+Query-relevant passages of retrieved documents, for the search observation.
+
+Documents are split into passages of about PASSAGE_WORDS words (paragraphs
+are packed together, longer ones split), and every passage is scored
+against each query with BM25, with the retrieved passages as the corpus.
+Scoring is vectorized with NumPy: only query terms are counted, as one
+passage x term matrix built with ``np.bincount``. A passage's score is its
+best score over the queries of the search action, so every query gets its
+evidence. The best passages are kept until EVIDENCE_TOKEN_BUDGET, and
+returned in score order with their URLs.
+
+Settings are read from the environment:
+
+- EVIDENCE_TOKEN_BUDGET: tokens of passages per search action (default 1500)
+- PASSAGE_WORDS: words per passage (default 120)
+"""
+
+import os
+import re
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+EVIDENCE_TOKEN_BUDGET = int(os.getenv("EVIDENCE_TOKEN_BUDGET", "1500"))
+PASSAGE_WORDS = int(os.getenv("PASSAGE_WORDS", "120"))
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+CHARS_PER_TOKEN = 4.0
+
+_TOKEN = re.compile(r"\w+")
+_PARAGRAPHS = re.compile(r"\n\s*\n")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that "
+    "the their this to was were what when where which who why will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def split_passages(document: str, max_words: int = PASSAGE_WORDS) -> List[str]:
+    """Paragraphs packed into passages of at most ``max_words`` words."""
+    passages: List[str] = []
+    current: List[str] = []
+    for paragraph in _PARAGRAPHS.split(document):
+        words = paragraph.split()
+        if not words:
+            continue
+        if current and len(current) + len(words) > max_words:
+            passages.append(" ".join(current))
+            current = []
+        while len(words) > max_words:
+            passages.append(" ".join(words[:max_words]))
+            words = words[max_words:]
+        current += words
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def bm25_scores(queries: Sequence[str], passages: Sequence[str]) -> np.ndarray:
+    """Best BM25 score of each passage over ``queries``."""
+    if not passages:
+        return np.zeros(0)
+    query_terms = [sorted(set(tokenize(query))) for query in queries]
+    vocabulary = {
+        t: i for i, t in enumerate(sorted({t for q in query_terms for t in q}))
+    }
+    if not vocabulary:
+        return np.zeros(len(passages))
+
+    lengths = np.empty(len(passages))
+    rows, columns = [], []
+    for row, passage in enumerate(passages):
+        tokens = tokenize(passage)
+        lengths[row] = len(tokens)
+        hits = [vocabulary[t] for t in tokens if t in vocabulary]
+        rows.extend([row] * len(hits))
+        columns.extend(hits)
+    size = len(vocabulary)
+    tf = np.bincount(
+        np.asarray(rows, dtype=np.int64) * size + np.asarray(columns, dtype=np.int64),
+        minlength=len(passages) * size,
+    ).reshape(len(passages), size)
+
+    n = len(passages)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+    norm = K1 * (1 - B + B * lengths / max(lengths.mean(), 1.0))
+    weights = idf * tf * (K1 + 1) / (tf + norm[:, None])  # passages x terms
+
+    best = np.zeros(n)
+    for terms in query_terms:
+        if terms:
+            columns = [vocabulary[t] for t in terms]
+            best = np.maximum(best, weights[:, columns].sum(axis=1))
+    return best
+
+
+def select_passages(
+    queries: Sequence[str],
+    documents: Sequence[str],
+    urls: Sequence[str],
+    token_budget: int = EVIDENCE_TOKEN_BUDGET,
+) -> List[Tuple[str, str, float]]:
+    """(passage, url, score) of the best passages, within ``token_budget``."""
+    passages, sources = [], []
+    for document, url in zip(documents, urls):
+        for passage in split_passages(document):
+            passages.append(passage)
+            sources.append(url)
+    return [
+        (passages[index], sources[index], score)
+        for index, score in rank_passages(queries, passages, token_budget)
+    ]
+
+
+def rank_passages(
+    queries: Sequence[str],
+    passages: Sequence[str],
+    token_budget: int = EVIDENCE_TOKEN_BUDGET,
+) -> List[Tuple[int, float]]:
+    """(index, score) of the best matching ``passages``, within ``token_budget``."""
+    scores = bm25_scores(queries, passages)
+    ranked = []
+    budget = token_budget * CHARS_PER_TOKEN
+    for index in np.argsort(-scores, kind="stable"):
+        if scores[index] <= 0:
+            break
+        if len(passages[index]) > budget:
+            continue
+        budget -= len(passages[index])
+        ranked.append((int(index), float(scores[index])))
+    return ranked
+
+
+def format_evidence(selected: Sequence[Tuple[str, str, float]]) -> str:
+    """Passages as the <information> block of a search observation."""
+    if not selected:
+        return ""
+    lines = [
+        f"[{i}] ({url}) {passage}" for i, (passage, url, _) in enumerate(selected, 1)
+    ]
+    return "<information>\n" + "\n\n".join(lines) + "\n</information>"
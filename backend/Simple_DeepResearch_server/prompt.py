@@ -60,7 +60,7 @@ IMPORTANT: You must strictly adhere to the following rules:
 4. **Do not always perform the search action. You must consider the history search results and update your report scripts.**
 
 Valid actions:
-1. <search> query </search>: search the web for information if you consider you lack some knowledge.
+1. <search> query </search>: search the web for information if you consider you lack some knowledge. To look up several independent things at once, put up to 4 queries in one search action, one query per line.
 2. <plan> plan </plan>: plan the report in your first turn.
 3. <scripts> revised or newly generated report scripts </scripts>: revise former report scripts, or newly generate report scripts.
 4. <summary> important parts of the history turns </summary>: summarize the history turns. Reflect the plan, scripts, search queries, and search results in you history turns, and keep the information you consider important for answering the question and generating your report. Still keep the tag structure, keep plan between <plan> and </plan>, keep scripts between <scripts> and </scripts>, keep search queries between <search> and </search>, and keep search results between <information> and </information>. The history turn information for your subsequent turns will be updated accoring to this summary action.
@@ -72,7 +72,7 @@ History Turns: (empty if this is the first turn)
 """
 
 report_format_reminder_prompt = """You should pay attention to the format of my response. You can choose one of the following actions:
-    - If You want to search, You should put the query between <search> and </search>.
+    - If You want to search, You should put the query (or up to 4 queries, one per line) between <search> and </search>.
     - If You want to make a plan, You should put the plan between <plan> and </plan>.
     - If You want to write scripts, You should put the scripts between <scripts> and </scripts>.
     - If You want to summarize the history turns, You should put the summary between <summary> and </summary>.
@@ -99,7 +99,7 @@ IMPORTANT: You must strictly adhere to the following rules:
 4. **Do not always perform the search action. You must consider the history search results and update your report scripts.**
 
 Valid actions:
-1. <search> query </search>: search the web for information if you consider you lack some knowledge.
+1. <search> query </search>: search the web for information if you consider you lack some knowledge. To look up several independent things at once, put up to 4 queries in one search action, one query per line.
 2. <plan> plan </plan>: plan the report in your first turn.
 3. <scripts> revised or newly generated report scripts </scripts>: revise former report scripts, or newly generate report scripts. You should add in-text citations in your scripts.
 4. <summary> important parts of the history turns </summary>: summarize the history turns. Reflect the plan, scripts, search queries, and search results in you history turns, and keep the information you consider important for answering the question and generating your report. Still keep the tag structure, keep plan between <plan> and </plan>, keep scripts between <scripts> and </scripts>, keep search queries between <search> and </search>, and keep search results between <information> and </information>. The history turn information for your subsequent turns will be updated accoring to this summary action.
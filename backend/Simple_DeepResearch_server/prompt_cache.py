@@ -0,0 +1,241 @@
+"""
+Reuse of the stable prompt prefix across the turns of a research run.
+
+Each turn's input starts with the research prompt and the history turns,
+most of which were already sent the turn before. PromptCache finds the part
+of the input that did not change over the last few turns and, once it is
+long enough, stores it as Gemini cached content (``client.aio.caches``);
+later turns then send only what follows it and reference the cache. When
+the history is compacted or summarized the prefix changes, and the cache is
+replaced by one for the new prefix.
+
+The research prompt alone is far below the model's minimum, so the cached
+prefix has to include history. Creating a cache pays for its tokens like a
+request does, and history that is compacted every turn would make each
+cache useless by the next one. A prefix is therefore only cached once the
+last PROMPT_CACHE_MIN_REUSE inputs all started with it, a cache is only
+replaced by a longer one after it served as many requests, and caches are
+created in the background: the request that triggers one is sent in full
+and later turns use it.
+
+Where explicit caching is unavailable the run falls back to sending the
+whole input, which Gemini 2.5 still serves from its implicit prefix cache.
+A prefix below the model's minimum or a model without caching turns explicit
+caching off for the run. Any other failure to create a cache (429, 5xx,
+timeouts) only pauses it: the next cache is tried after a cooldown of
+PROMPT_CACHE_RETRY_SECONDS, doubled after every consecutive failure. Either
+way the cached token count Gemini reports and the time to first token are
+recorded per turn.
+
+Settings are read from the environment:
+
+- PROMPT_CACHE: "explicit" (default) or "implicit" (never create caches)
+- PROMPT_CACHE_MIN_TOKENS: smallest prefix, and smallest growth of it, worth
+  a new cache (default 4096, the minimum of Gemini 2.5 Pro)
+- PROMPT_CACHE_TTL_SECONDS: lifetime of a cache in case a run never deletes
+  it (default 600)
+- PROMPT_CACHE_RETRY_SECONDS: first cooldown after a failed cache creation
+  (default 30, at most PROMPT_CACHE_TTL_SECONDS)
+- PROMPT_CACHE_MIN_REUSE: earlier requests that must have sent a prefix
+  before it is cached, and requests a cache serves before a longer prefix
+  replaces it (default 2)
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "explicit").lower()
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "4096"))
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "600"))
+PROMPT_CACHE_RETRY_SECONDS = float(os.getenv("PROMPT_CACHE_RETRY_SECONDS", "30"))
+PROMPT_CACHE_MIN_REUSE = int(os.getenv("PROMPT_CACHE_MIN_REUSE", "2"))
+
+# Error messages of caches.create that won't change for this run: the prefix
+# is below the model's minimum, or the model has no explicit caching
+_UNAVAILABLE_MARKERS = (
+    "too small",
+    "min_total_token_count",
+    "not supported",
+    "does not support",
+    "not found",
+)
+
+
+def cache_unavailable(error: Exception) -> bool:
+    """Whether a caches.create failure means caching can't work for the run."""
+    code = getattr(error, "code", None)
+    message = str(error).lower()
+    return code in (400, 404) and any(m in message for m in _UNAVAILABLE_MARKERS)
+
+
+def _stable_prefix(previous: str, current: str) -> str:
+    """Longest common prefix of two inputs, cut at a paragraph boundary."""
+    # Binary search on slice comparisons, which run in C
+    low, high = 0, min(len(previous), len(current))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if previous[:middle] == current[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    cut = current.rfind("\n\n", 0, low)
+    return current[: cut + 2] if cut != -1 else ""
+
+
+class PromptCache:
+    """Cached prefix of one research run, and the cache numbers per turn."""
+
+    def __init__(self, client, model: str, mode: str = PROMPT_CACHE):
+        self.client = client
+        self.model = model
+        self.explicit = mode == "explicit"
+        self.name: Optional[str] = None  # cached content in use
+        self.prefix = ""  # text stored in it
+        self.uses = 0  # requests that referenced it
+        self.previous = ""  # input of the previous request
+        self.recent: deque = deque(maxlen=max(PROMPT_CACHE_MIN_REUSE, 1))
+        self.creating: Optional[asyncio.Task] = None
+        self.retired: List[str] = []  # replaced caches, deleted before next use
+        self._deletions: Set[asyncio.Task] = set()
+        self.created = 0
+        self.failures = 0  # consecutive failed cache creations
+        self.retry_at = 0.0  # monotonic time before which none is attempted
+        self.turns: List[Dict[str, Any]] = []
+
+    async def _create(self, prefix: str) -> None:
+        try:
+            cached = await self.client.aio.caches.create(
+                model=self.model,
+                config={
+                    "contents": [{"role": "user", "parts": [{"text": prefix}]}],
+                    "ttl": f"{PROMPT_CACHE_TTL_SECONDS}s",
+                    "display_name": "deepresearch-prefix",
+                },
+            )
+        except Exception as e:
+            if cache_unavailable(e):
+                print(f"Prompt cache unavailable, sending full inputs: {e}")
+                self.explicit = False
+                return
+            self.failures += 1
+            cooldown = min(
+                PROMPT_CACHE_RETRY_SECONDS * 2 ** (self.failures - 1),
+                PROMPT_CACHE_TTL_SECONDS,
+            )
+            self.retry_at = time.monotonic() + cooldown
+            print(f"Prompt cache creation failed, retrying in {cooldown:.0f}s: {e!r}")
+            return
+        self.failures = 0
+        self.created += 1
+        if not self.previous.startswith(prefix):
+            # The history was compacted while the cache was being created
+            self.retired.append(cached.name)
+            return
+        if self.name is not None:
+            # A request may still be using it; prepare() deletes it
+            self.retired.append(self.name)
+        self.name, self.prefix, self.uses = cached.name, prefix, 0
+
+    async def _delete(self, name: Optional[str]) -> None:
+        if name is None:
+            return
+        try:
+            await self.client.aio.caches.delete(name=name)
+        except Exception as e:
+            print(f"Failed to delete prompt cache {name}: {e}")
+
+    async def prepare(
+        self, prompt: str, chars_per_token: float
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        The contents to send for ``prompt`` and the request config entries
+        that reference the cached prefix (empty when nothing is cached).
+        """
+        recent = list(self.recent)
+        self.previous = prompt
+        self.recent.append(prompt)
+        if not self.explicit:
+            return prompt, {}
+        if self.name and not prompt.startswith(self.prefix):
+            self.retired.append(self.name)
+            self.name, self.prefix = None, ""
+        # The previous request has finished, so nothing uses these any more
+        for name in self.retired:
+            task = asyncio.create_task(self._delete(name))
+            self._deletions.add(task)
+            task.add_done_callback(self._deletions.discard)
+        self.retired = []
+
+        # Only a prefix that survived the last few history changes is likely
+        # to outlive the cost of writing it
+        stable = prompt if len(recent) == self.recent.maxlen else ""
+        for earlier in recent:
+            stable = _stable_prefix(earlier, stable) if stable else ""
+        min_chars = PROMPT_CACHE_MIN_TOKENS * chars_per_token
+        if (
+            (self.creating is None or self.creating.done())
+            and len(stable) >= min_chars
+            and len(stable) - len(self.prefix) >= min_chars
+            and (self.name is None or self.uses >= PROMPT_CACHE_MIN_REUSE)
+            and time.monotonic() >= self.retry_at
+        ):
+            self.creating = asyncio.create_task(self._create(stable))
+        if self.name is None:
+            return prompt, {}
+        self.uses += 1
+        return prompt[len(self.prefix) :], {"cached_content": self.name}
+
+    async def invalidate(self) -> None:
+        """Stop using the cache, e.g. after a request that referenced it failed."""
+        name, self.name, self.prefix, self.uses = self.name, None, "", 0
+        await self._delete(name)
+
+    def record(self, turn: int, usage, ttft: float, latency: float) -> Dict:
+        """Store and return the numbers of one model request."""
+        prompt_tokens = getattr(usage, "prompt_token_count", None) or 0
+        cached_tokens = getattr(usage, "cached_content_token_count", None) or 0
+        entry = {
+            "turn": turn,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "cache_hit_rate": (
+                round(cached_tokens / prompt_tokens, 3) if prompt_tokens else None
+            ),
+            "explicit_cache": self.name is not None,
+            "ttft_ms": round(ttft * 1000, 1),
+            "latency_ms": round(latency * 1000, 1),
+        }
+        self.turns.append(entry)
+        return entry
+
+    def summary(self) -> Dict[str, Any]:
+        """Cache hit rate over the run and mean time to first token."""
+        prompt_tokens = sum(turn["prompt_tokens"] for turn in self.turns)
+        cached_tokens = sum(turn["cached_tokens"] for turn in self.turns)
+        return {
+            "requests": len(self.turns),
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "cache_hit_rate": (
+                round(cached_tokens / prompt_tokens, 3) if prompt_tokens else None
+            ),
+            "mean_ttft_ms": (
+                round(sum(t["ttft_ms"] for t in self.turns) / len(self.turns), 1)
+                if self.turns
+                else None
+            ),
+            "caches_created": self.created,
+        }
+
+    async def close(self) -> None:
+        """Delete every cache of the run, once a pending creation has finished."""
+        if self.creating is not None:
+            await asyncio.gather(self.creating, return_exceptions=True)
+        await self.invalidate()
+        await asyncio.gather(
+            *(self._delete(name) for name in self.retired), *self._deletions
+        )
+        self.retired = []
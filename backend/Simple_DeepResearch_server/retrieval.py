@@ -2,8 +2,10 @@ import base64
 import json
 import os
 
-import requests
+import http_client
+import search_cache
 from dotenv import load_dotenv
+from outlinks import annotate_outlinks
 
 # Load environment variables
 load_dotenv("../../.env")
@@ -13,38 +15,93 @@ CLUEWEB_API_KEY = os.getenv("CLUEWEB_API_KEY")
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
 
 
-def query_serper(query, num_docs=10):
+SERPER_URL = "https://google.serper.dev/search"
+CLUEWEB_URL = "https://clueweb22.us"
+
+
+def _serper_request(query, num_docs):
+    payload = {"q": query, "num": min(num_docs, 10)}  # Serper has a limit
+    headers = {"X-API-KEY": SERPER_API_KEY, "Content-Type": "application/json"}
+    return payload, headers
+
+
+def _parse_serper(data, num_docs):
+    documents = []
+    urls = []
+
+    # Extract organic results
+    organic = data.get("organic", [])
+    for result in organic[:num_docs]:
+        title = result.get("title", "")
+        snippet = result.get("snippet", "")
+        link = result.get("link", "")
+
+        # Combine title and snippet as document text
+        doc_text = f"Title: {title}\n\nContent: {snippet}"
+        documents.append(doc_text)
+        urls.append(link)
+
+    return documents, urls
+
+
+def query_serper(query, num_docs=10, use_cache=True):
     """
     Search using Serper API as fallback when ClueWeb is not available
     """
+    return search_cache.cached_search(
+        "serper",
+        query,
+        num_docs,
+        lambda: _query_serper(query, num_docs),
+        use_cache=use_cache,
+    )
+
+
+def _query_serper(query, num_docs):
     if not SERPER_API_KEY:
         print("No Serper API key found")
         return [], []
 
-    url = "https://google.serper.dev/search"
-    payload = {"q": query, "num": min(num_docs, 10)}  # Serper has a limit
-    headers = {"X-API-KEY": SERPER_API_KEY, "Content-Type": "application/json"}
+    payload, headers = _serper_request(query, num_docs)
+
+    try:
+        response = http_client.request(
+            "serper", "POST", SERPER_URL, headers=headers, json=payload
+        )
+        if response.status_code == 200:
+            return _parse_serper(response.json(), num_docs)
+        else:
+            print(f"Serper API request failed with status code: {response.status_code}")
+            return [], []
+    except Exception as e:
+        print(f"Error with Serper search: {e}")
+        return [], []
+
+
+async def aquery_serper(query, num_docs=10, use_cache=True):
+    """query_serper on the shared async client."""
+    return await search_cache.acached_search(
+        "serper",
+        query,
+        num_docs,
+        lambda: _aquery_serper(query, num_docs),
+        use_cache=use_cache,
+    )
+
+
+async def _aquery_serper(query, num_docs):
+    if not SERPER_API_KEY:
+        print("No Serper API key found")
+        return [], []
+
+    payload, headers = _serper_request(query, num_docs)
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = await http_client.arequest(
+            "serper", "POST", SERPER_URL, headers=headers, json=payload
+        )
         if response.status_code == 200:
-            data = response.json()
-            documents = []
-            urls = []
-
-            # Extract organic results
-            organic = data.get("organic", [])
-            for result in organic[:num_docs]:
-                title = result.get("title", "")
-                snippet = result.get("snippet", "")
-                link = result.get("link", "")
-
-                # Combine title and snippet as document text
-                doc_text = f"Title: {title}\n\nContent: {snippet}"
-                documents.append(doc_text)
-                urls.append(link)
-
-            return documents, urls
+            return _parse_serper(response.json(), num_docs)
         else:
             print(f"Serper API request failed with status code: {response.status_code}")
             return [], []
@@ -61,6 +118,7 @@ def query_clueweb(
     with_id=False,
     with_url=False,
     num_tries=3,
+    use_cache=True,
 ):
     """
     Args:
@@ -68,6 +126,7 @@ def query_clueweb(
         - num_docs, the number of documents to return
         - num_outlinks_per_doc is the maximum number of outlinks to
             return per document if the outlinked document is in clueweb22
+        - use_cache, False to skip the search cache and fetch fresh results
     Returns:
         - returned_cleaned_text: a dictionary, keys is the cluewebid, values is a tuple of (cleaned text, url)
         - returned_outlinks: a dictionary, keys is the cluewebid, values is a list of tuples (outlink, anchor-text)
@@ -76,39 +135,97 @@ def query_clueweb(
     # Check if ClueWeb API key is available, otherwise use Serper
     if not CLUEWEB_API_KEY or CLUEWEB_API_KEY == "YOUR_API_KEY":
         print("ClueWeb API key not available, using Serper search as fallback")
-        return query_serper(query, num_docs)
+        return query_serper(query, num_docs, use_cache=use_cache)
+
+    return search_cache.cached_search(
+        "clueweb",
+        query,
+        num_docs,
+        lambda: _query_clueweb(
+            query, num_docs, num_top_docs_to_read, with_id, with_url, num_tries
+        ),
+        options=(num_top_docs_to_read, with_id, with_url),
+        use_cache=use_cache,
+    )
 
-    num_docs = str(num_docs)
-    URL = "https://clueweb22.us"
 
+def _clueweb_request(query, num_docs, with_url):
+    params = {"query": query, "k": str(num_docs)}
     if with_url:
-        request_url = f"{URL}/search?query={query}&k={num_docs}&with_outlink=True"
-    else:
-        request_url = f"{URL}/search?query={query}&k={num_docs}"
-
+        params["with_outlink"] = "True"
     headers = {"X-API-Key": CLUEWEB_API_KEY}
+    return params, headers
 
-    try_count = 0
-    while try_count <= num_tries:
-        try:
-            try_count += 1
-            # print(f"Making API request to: {request_url}")
-            response = requests.get(request_url, headers=headers)
-        except Exception as e:
-            print(f"Request failed with exception: {e}")
-            if try_count < num_tries:
-                print("Retrying")
-                continue
-            else:
-                print("Reached max number of retries, returning empty data")
-                if with_url:
-                    return []
-                else:
-                    return [], []
-        else:
-            # print(f"Search works fine, status code: {response.status_code}")
-            break
 
+def _query_clueweb(query, num_docs, num_top_docs_to_read, with_id, with_url, num_tries):
+    params, headers = _clueweb_request(query, num_docs, with_url)
+    try:
+        response = http_client.request(
+            "clueweb",
+            "GET",
+            f"{CLUEWEB_URL}/search",
+            max_attempts=num_tries,
+            params=params,
+            headers=headers,
+        )
+    except Exception as e:
+        print(f"Request failed with exception: {e}")
+        print("Reached max number of retries, returning empty data")
+        return [] if with_url else ([], [])
+
+    return _parse_clueweb_response(response, num_top_docs_to_read, with_id, with_url)
+
+
+async def aquery_clueweb(
+    query,
+    num_docs=10,
+    num_top_docs_to_read=1,
+    num_outlinks_per_doc=None,
+    with_id=False,
+    with_url=False,
+    num_tries=3,
+    use_cache=True,
+):
+    """query_clueweb on the shared async client; same arguments and results."""
+    if not CLUEWEB_API_KEY or CLUEWEB_API_KEY == "YOUR_API_KEY":
+        print("ClueWeb API key not available, using Serper search as fallback")
+        return await aquery_serper(query, num_docs, use_cache=use_cache)
+
+    return await search_cache.acached_search(
+        "clueweb",
+        query,
+        num_docs,
+        lambda: _aquery_clueweb(
+            query, num_docs, num_top_docs_to_read, with_id, with_url, num_tries
+        ),
+        options=(num_top_docs_to_read, with_id, with_url),
+        use_cache=use_cache,
+    )
+
+
+async def _aquery_clueweb(
+    query, num_docs, num_top_docs_to_read, with_id, with_url, num_tries
+):
+    params, headers = _clueweb_request(query, num_docs, with_url)
+    try:
+        response = await http_client.arequest(
+            "clueweb",
+            "GET",
+            f"{CLUEWEB_URL}/search",
+            max_attempts=num_tries,
+            params=params,
+            headers=headers,
+        )
+    except Exception as e:
+        print(f"Request failed with exception: {e}")
+        print("Reached max number of retries, returning empty data")
+        return [] if with_url else ([], [])
+
+    return _parse_clueweb_response(response, num_top_docs_to_read, with_id, with_url)
+
+
+def _parse_clueweb_response(response, num_top_docs_to_read, with_id, with_url):
+    """Documents (and URLs) of a ClueWeb search response from requests or httpx."""
     # Check if the request was successful
     if response.status_code != 200:
         print(f"API request failed with status code: {response.status_code}")
@@ -171,9 +288,9 @@ def query_clueweb(
                 for outlink in parsed_outlinks["outlinks"]:
                     if outlink[-1] is not None and "clueweb22-en00" in outlink[-1]:
                         valid_outlinks.append(outlink)
-                    updated_doc_text, exact_match_not_found, total = (
-                        match_outlinks_to_doc(valid_outlinks, text)
-                    )
+                updated_doc_text, exact_match_not_found, total = match_outlinks_to_doc(
+                    valid_outlinks, text
+                )
 
                 if with_id:
                     return_cleaned_text.append((cweb_id, updated_doc_text, url))
@@ -201,25 +318,12 @@ def query_clueweb(
 
 
 def match_outlinks_to_doc(outlinks, doc_text):
-    exact_match_not_found = 0
-    not_matched_links = []
-    for outlink in outlinks:
-        url, urlhash, anchor_text, _, language, cweb_id = outlink
-        idx = doc_text.find(anchor_text)
-        if idx != -1:
-            doc_text = (
-                doc_text[:idx]
-                + f"[{anchor_text}]({url})"
-                + doc_text[idx + len(anchor_text) :]
-            )
-        else:
-            exact_match_not_found += 1
-            not_matched_links.append(f"[{anchor_text}]({url})")
-    doc_text += (
-        "Here are additional URLs and their anchor texts mentioned in this document:\n"
-        + "\n".join(not_matched_links)
-    )
-
+    """
+    Link the anchor texts of the outlinks in the document, in one pass over
+    it (see outlinks.py). Returns the document, the number of anchors not
+    found and the number of outlinks.
+    """
+    doc_text, exact_match_not_found = annotate_outlinks(outlinks, doc_text)
     return doc_text, exact_match_not_found, len(outlinks)
 
 
@@ -0,0 +1,353 @@
+"""
+Two-tier cache of search results for retrieval.py.
+
+Results are keyed by backend, normalized query (Unicode-normalized, case
+folded, whitespace collapsed), number of documents and the options that
+change the result shape. Lookups go through:
+
+1. an in-memory LRU of SEARCH_CACHE_MEMORY_ENTRIES results per process
+2. a SQLite file (WAL mode) shared by every worker on the node, holding
+   zlib-compressed JSON with an expiry time; once it grows past
+   SEARCH_CACHE_MAX_MB the least recently used entries are evicted
+
+Empty results (failed searches) are not cached. Each entry keeps how long
+the search took, so a hit reports the latency it saved. Callers that need
+fresh results pass ``use_cache=False``; the /run endpoint does so for
+requests with ``"bypass_search_cache": true``.
+
+Settings are read from the environment:
+
+- SEARCH_CACHE_ENABLED (default "true")
+- SEARCH_CACHE_PATH: SQLite file (default search_cache.sqlite3 in the
+  temporary directory; empty keeps the memory tier only)
+- SEARCH_CACHE_TTL_SECONDS: lifetime of an entry (default 86400)
+- SEARCH_CACHE_MAX_MB: size of the SQLite tier (default 256)
+- SEARCH_CACHE_MEMORY_ENTRIES: size of the LRU (default 1024)
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import codec
+
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+SEARCH_CACHE_PATH = os.getenv(
+    "SEARCH_CACHE_PATH", os.path.join(tempfile.gettempdir(), "search_cache.sqlite3")
+)
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "86400"))
+SEARCH_CACHE_MAX_MB = float(os.getenv("SEARCH_CACHE_MAX_MB", "256"))
+SEARCH_CACHE_MEMORY_ENTRIES = int(os.getenv("SEARCH_CACHE_MEMORY_ENTRIES", "1024"))
+
+# Writes between two checks of the SQLite tier's size
+EVICTION_CHECK_INTERVAL = 50
+# Eviction frees space down to this fraction of SEARCH_CACHE_MAX_MB
+EVICTION_TARGET = 0.9
+
+_WHITESPACE = re.compile(r"\s+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    fetch_ms REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_search_cache_last_used ON search_cache (last_used);
+"""
+
+
+def normalize_query(query: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query)).strip().casefold()
+
+
+def cache_key(backend: str, query: str, num_docs: int, options: Tuple = ()) -> str:
+    raw = "\x00".join([backend, str(num_docs), repr(options), normalize_query(query)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _encode(result) -> bytes:
+    # Remember whether the top level was a tuple, like (documents, urls)
+    return zlib.compress(
+        codec.dumps_bytes({"tuple": isinstance(result, tuple), "value": result}), 1
+    )
+
+
+def _decode(data: bytes):
+    document = codec.loads(zlib.decompress(data))
+    value = document["value"]
+    return tuple(value) if document["tuple"] else value
+
+
+def _is_empty(result) -> bool:
+    if isinstance(result, tuple):
+        return not any(result)
+    return not result
+
+
+class SearchCache:
+    """Memory LRU in front of a SQLite file, with hit and miss counters."""
+
+    def __init__(
+        self,
+        path: Optional[str] = SEARCH_CACHE_PATH,
+        ttl: float = SEARCH_CACHE_TTL_SECONDS,
+        max_bytes: float = SEARCH_CACHE_MAX_MB * 1024 * 1024,
+        memory_entries: int = SEARCH_CACHE_MEMORY_ENTRIES,
+    ):
+        self.path = path or None
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        # key -> (expires_at, fetch_ms, result)
+        self._memory: "OrderedDict[str, Tuple[float, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "disk_errors": 0,
+            "saved_ms": 0.0,
+        }
+
+    # SQLite tier
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """This thread's connection to the SQLite tier, None without one."""
+        if self.path is None:
+            return None
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, float, Any]]:
+        try:
+            connection = self._connection()
+            if connection is None:
+                return None
+            row = connection.execute(
+                "SELECT value, fetch_ms, expires_at FROM search_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or row[2] <= now:
+                return None
+            connection.execute(
+                "UPDATE search_cache SET last_used = ? WHERE key = ?", (now, key)
+            )
+            return row[2], row[1], _decode(row[0])
+        except (sqlite3.Error, ValueError, zlib.error) as e:
+            self._disk_error(e)
+            return None
+
+    def _disk_put(self, key: str, result, fetch_ms: float, now: float) -> None:
+        try:
+            connection = self._connection()
+            if connection is None:
+                return
+            value = _encode(result)
+            connection.execute(
+                "INSERT OR REPLACE INTO search_cache "
+                "(key, value, size, fetch_ms, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, len(value), fetch_ms, now + self.ttl, now),
+            )
+            with self._lock:
+                self._writes += 1
+                check = self._writes % EVICTION_CHECK_INTERVAL == 0
+            if check:
+                self._evict(connection, now)
+        except (sqlite3.Error, ValueError) as e:
+            self._disk_error(e)
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        evicted = connection.execute(
+            "DELETE FROM search_cache WHERE expires_at <= ?", (now,)
+        ).rowcount
+        size = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM search_cache"
+        ).fetchone()[0]
+        if size > self.max_bytes:
+            target = self.max_bytes * EVICTION_TARGET
+            while size > target:
+                rows = connection.execute(
+                    "SELECT key, size FROM search_cache ORDER BY last_used LIMIT 100"
+                ).fetchall()
+                if not rows:
+                    break
+                doomed = []
+                for key, row_size in rows:
+                    if size <= target:
+                        break
+                    doomed.append((key,))
+                    size -= row_size
+                connection.executemany("DELETE FROM search_cache WHERE key = ?", doomed)
+                evicted += len(doomed)
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _disk_error(self, error: Exception) -> None:
+        print(f"Search cache error: {error}")
+        self._count("disk_errors")
+
+    # Memory tier
+
+    def _memory_get(self, key: str, now: float) -> Optional[Tuple[float, float, Any]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry
+
+    def _memory_put(self, key: str, entry: Tuple[float, float, Any]) -> None:
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def _hit(self, tier: str, fetch_ms: float) -> None:
+        with self._lock:
+            self._stats[f"{tier}_hits"] += 1
+            self._stats["saved_ms"] += fetch_ms
+
+    # Lookups
+
+    def get(self, key: str):
+        """The cached result for ``key`` (shared, don't modify it), or None."""
+        now = time.time()
+        entry = self._memory_get(key, now)
+        if entry is not None:
+            self._hit("memory", entry[1])
+            return entry[2]
+        entry = self._disk_get(key, now)
+        if entry is not None:
+            self._memory_put(key, entry)
+            self._hit("disk", entry[1])
+            return entry[2]
+        self._count("misses")
+        return None
+
+    async def aget(self, key: str):
+        """get() with the SQLite lookup in a worker thread."""
+        now = time.time()
+        entry = self._memory_get(key, now)
+        if entry is not None:
+            self._hit("memory", entry[1])
+            return entry[2]
+        if self.path is not None:
+            entry = await asyncio.to_thread(self._disk_get, key, now)
+        if entry is not None:
+            self._memory_put(key, entry)
+            self._hit("disk", entry[1])
+            return entry[2]
+        self._count("misses")
+        return None
+
+    def put(self, key: str, result, fetch_ms: float) -> None:
+        if _is_empty(result):
+            return
+        now = time.time()
+        self._memory_put(key, (now + self.ttl, fetch_ms, result))
+        self._disk_put(key, result, fetch_ms, now)
+        self._count("stores")
+
+    async def aput(self, key: str, result, fetch_ms: float) -> None:
+        if _is_empty(result):
+            return
+        now = time.time()
+        self._memory_put(key, (now + self.ttl, fetch_ms, result))
+        if self.path is not None:
+            await asyncio.to_thread(self._disk_put, key, result, fetch_ms, now)
+        self._count("stores")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else None
+        stats["saved_ms"] = round(stats["saved_ms"], 1)
+        stats["path"] = self.path
+        stats["enabled"] = SEARCH_CACHE_ENABLED
+        return stats
+
+
+cache = SearchCache()
+
+
+def cached_search(
+    backend: str,
+    query: str,
+    num_docs: int,
+    fetch: Callable[[], Any],
+    options: Tuple = (),
+    use_cache: bool = True,
+):
+    """``fetch()``'s result for this search, from the cache when possible."""
+    if not SEARCH_CACHE_ENABLED or not use_cache:
+        cache._count("bypassed")
+        return fetch()
+    key = cache_key(backend, query, num_docs, options)
+    result = cache.get(key)
+    if result is not None:
+        return result
+    start = time.perf_counter()
+    result = fetch()
+    cache.put(key, result, (time.perf_counter() - start) * 1000)
+    return result
+
+
+async def acached_search(
+    backend: str,
+    query: str,
+    num_docs: int,
+    fetch: Callable[[], Awaitable[Any]],
+    options: Tuple = (),
+    use_cache: bool = True,
+):
+    """cached_search() for a coroutine ``fetch``."""
+    if not SEARCH_CACHE_ENABLED or not use_cache:
+        cache._count("bypassed")
+        return await fetch()
+    key = cache_key(backend, query, num_docs, options)
+    result = await cache.aget(key)
+    if result is not None:
+        return result
+    start = time.perf_counter()
+    result = await fetch()
+    await cache.aput(key, result, (time.perf_counter() - start) * 1000)
+    return result
+
+
+def stats() -> Dict[str, Any]:
+    return cache.stats()
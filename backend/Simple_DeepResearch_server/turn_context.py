@@ -0,0 +1,181 @@
+"""
+Token-budgeted turn history for the research loop.
+
+The model's input each turn is the research prompt followed by the history
+turns. Instead of appending every turn to one ever-growing string, the turns
+are kept as structured records (thought, action, observation) and the input
+is rendered from them, so old turns can be compacted once the input would
+exceed CONTEXT_TOKEN_BUDGET:
+
+1. turns older than the CONTEXT_KEEP_RECENT_TURNS most recent lose their
+   thought and observation and keep only their action
+2. the actions of those turns are clipped to COMPACT_ACTION_TOKENS
+3. the oldest turns are dropped, leaving a marker with the range
+
+Compaction goes down to COMPACT_TARGET of the budget rather than just below
+it, so the next few turns only append to an unchanged prefix, which the
+prompt cache (prompt_cache.py) can then reuse.
+
+Whenever history had to be compacted, the summary reminder asks the model
+for a summary action; a summary replaces every earlier turn, as before.
+
+Tokens are estimated from characters, calibrated with the prompt token counts
+Gemini reports for the inputs actually sent (``usage_metadata``), so no
+tokenizer or extra count request is needed.
+
+Settings are read from the environment:
+
+- CONTEXT_TOKEN_BUDGET: input tokens per turn (default 12000)
+- CONTEXT_KEEP_RECENT_TURNS: turns always kept in full (default 3)
+"""
+
+import math
+import os
+from typing import List, Optional, Sequence, Set, Tuple
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
+CONTEXT_KEEP_RECENT_TURNS = int(os.getenv("CONTEXT_KEEP_RECENT_TURNS", "3"))
+COMPACT_ACTION_TOKENS = 200
+COMPACT_TARGET = 0.75
+
+# Characters per token before any calibration; typical for English prose
+DEFAULT_CHARS_PER_TOKEN = 4.0
+
+FULL, ACTION_ONLY, CLIPPED = 0, 1, 2
+
+
+class Turn:
+    """One history turn and how far it has been compacted."""
+
+    __slots__ = ("number", "thought", "action", "observation", "level", "_text")
+
+    def __init__(self, number: int, thought: str, action: str, observation: str):
+        self.number = number
+        self.thought = thought
+        self.action = action
+        self.observation = observation
+        self.level = FULL
+        self._text: Optional[str] = None
+
+    def compact(self, level: int) -> None:
+        if level > self.level:
+            self.level = level
+            self._text = None
+
+    def text(self, chars_per_token: float) -> str:
+        if self._text is None:
+            if self.level == FULL:
+                body = f"<think>{self.thought}</think>\n\n{self.action}\n{self.observation}"
+            elif self.level == ACTION_ONLY:
+                body = self.action
+            else:
+                body = _clip_action(
+                    self.action, int(COMPACT_ACTION_TOKENS * chars_per_token)
+                )
+            self._text = f"[Turn {self.number}]:\n{body}\n\n"
+        return self._text
+
+
+def _clip_action(action: str, max_chars: int) -> str:
+    if len(action) <= max_chars:
+        return action
+    close = action.rfind("</")
+    if close == -1:
+        return action[:max_chars] + " ..."
+    return f"{action[:max_chars]} ...(shortened){action[close:]}"
+
+
+class TurnContext:
+    """History of one research run, rendered into the model input each turn."""
+
+    def __init__(
+        self,
+        prompt: str,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        keep_recent: int = CONTEXT_KEEP_RECENT_TURNS,
+        compaction_reminder: str = "",
+    ):
+        self.prompt = prompt
+        self.compaction_reminder = compaction_reminder
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.chars_per_token = DEFAULT_CHARS_PER_TOKEN
+        self.summary: Optional[str] = None
+        self.summary_through = 0
+        self.turns: List[Turn] = []
+        self.dropped_through = 0  # last turn number dropped from the history
+        self.compacted = False  # whether the last input had to be compacted
+
+    def calibrate(self, sent: str, prompt_tokens: Optional[int]) -> None:
+        """Fold in the token count the model reported for input ``sent``."""
+        if not prompt_tokens or not sent:
+            return
+        measured = len(sent) / prompt_tokens
+        # Moving average, so one odd input doesn't swing the estimate
+        self.chars_per_token = 0.7 * self.chars_per_token + 0.3 * measured
+
+    def add_turn(self, number: int, thought: str, action: str, observation: str):
+        self.turns.append(Turn(number, thought, action, observation))
+
+    def summarize(self, number: int, summary: str, observation: str) -> None:
+        """Replace the turns before ``number`` with the model's ``summary``."""
+        self.summary = summary
+        self.summary_through = number - 1
+        self.dropped_through = 0
+        # The summary action itself is not repeated, only what it returned
+        turn = Turn(number, "", observation.rstrip("\n"), "")
+        turn.compact(ACTION_ONLY)
+        self.turns = [turn]
+
+    def shown_observations(self) -> Set[int]:
+        """Numbers of the turns whose observation is still in the input."""
+        return {turn.number for turn in self.turns if turn.level == FULL}
+
+    def _header(self) -> str:
+        header = self.prompt
+        if self.summary is not None:
+            header += f"[Turn 1 - Turn {self.summary_through}]:\n{self.summary}\n\n"
+        if self.dropped_through:
+            first = self.summary_through + 1
+            header += (
+                f"[Turn {first} - Turn {self.dropped_through}]:\n"
+                "(omitted to stay within the context budget)\n\n"
+            )
+        return header
+
+    def _tokens(self, reminders: str) -> int:
+        cpt = self.chars_per_token
+        chars = len(self._header()) + len(reminders)
+        chars += sum(len(turn.text(cpt)) for turn in self.turns)
+        return math.ceil(chars / cpt)
+
+    def build_input(self, reminders: Sequence[str] = ()) -> Tuple[str, int]:
+        """
+        The model input for the next turn and its estimated tokens, compacted
+        to fit the budget when needed; then the compaction reminder is added.
+        """
+        reminder_text = "".join(f"\n\n{reminder}" for reminder in reminders)
+        tokens = self._tokens(reminder_text)
+        self.compacted = tokens > self.token_budget
+        if self.compacted and self.compaction_reminder:
+            reminder_text += f"\n\n{self.compaction_reminder}"
+            tokens = self._tokens(reminder_text)
+        target = int(self.token_budget * COMPACT_TARGET)
+        old = len(self.turns) - self.keep_recent
+        for level in (ACTION_ONLY, CLIPPED):
+            for turn in self.turns[: max(old, 0)]:
+                if not self.compacted or tokens <= target:
+                    break
+                turn.compact(level)
+                tokens = self._tokens(reminder_text)
+        while self.compacted and tokens > target and len(self.turns) > self.keep_recent:
+            self.dropped_through = self.turns.pop(0).number
+            tokens = self._tokens(reminder_text)
+
+        cpt = self.chars_per_token
+        text = (
+            self._header()
+            + "".join(turn.text(cpt) for turn in self.turns)
+            + reminder_text
+        )
+        return text, tokens
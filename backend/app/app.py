@@ -1,31 +1,49 @@
 import asyncio
+import datetime
 import json
 import logging
 import os
 import secrets
+import threading
 import time
 import uuid
-from contextlib import contextmanager
-from typing import Any, AsyncGenerator, Dict
-
-import httpx
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Dict, List, Optional, Set, Tuple
+
+import codec
+import conversation_search
+import database
+import db_metrics
+import history_archive
+import history_export
+import leaderboard
+import migrations
 import uvicorn
+import vote_rollups
+from blob_store import get_blobs, put_blobs, retain_blobs
+from database import get_session, web_concurrency, worker_pool_settings
 from db_schema import (
     AnswerSpanVote,
-    ConversationHistory,
+    Conversation,
+    ConversationAgentResponse,
     DeepResearchAgent,
     DeepResearchUserResponse,
     IntermediateStepVote,
 )
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, status
+from fastapi.concurrency import iterate_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
+from http_compression import compressed_json_response, compressed_streaming_response
+from run_state import (
+    RUN_STATE_URL,
+    WORKER_ID,
+    RunStateBackend,
+    create_run_state_backend,
+)
+from sqlalchemy import exists, func, select
 
 # Simple Deepresearch (Gemini 2.5 Flash) is referred to as baseline
 
@@ -65,76 +83,121 @@ GPT_RESEARCHER_URL = os.getenv("GPT_RESEARCHER_URL")
 PERPLEXITY_URL = os.getenv("PERPLEXITY_URL")
 BASELINE_URL = os.getenv("BASELINE_URL")
 
-DB_USERNAME = os.getenv("DB_USERNAME")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_ENDPOINT = os.getenv("DB_ENDPOINT")
-DB_PORT = 5432
-DB_NAME = os.getenv("DB_NAME")
-
-# Log environment variable status
-print("=== Main App Environment Variables ===")
-print(f"GPT_RESEARCHER_URL: {'✓ SET' if GPT_RESEARCHER_URL else '✗ NOT SET'}")
-print(f"PERPLEXITY_URL: {'✓ SET' if PERPLEXITY_URL else '✗ NOT SET'}")
-print(f"BASELINE_URL: {'✓ SET' if BASELINE_URL else '✗ NOT SET'}")
-print(f"DB_USERNAME: {'✓ SET' if DB_USERNAME else '✗ NOT SET'}")
-print(f"DB_PASSWORD: {'✓ SET' if DB_PASSWORD else '✗ NOT SET'}")
-print(f"DB_ENDPOINT: {'✓ SET' if DB_ENDPOINT else '✗ NOT SET'}")
-print(f"DB_NAME: {'✓ SET' if DB_NAME else '✗ NOT SET'}")
-print("======================================")
-
-DB_URI = (
-    f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_ENDPOINT}:"
-    f"{DB_PORT}/{DB_NAME}?keepalives=1&keepalives_idle=30"
-    f"&keepalives_interval=10&keepalives_count=5"
+RUN_POLL_INTERVAL = float(os.getenv("RUN_POLL_INTERVAL", "0.5"))
+RUN_REGISTER_GRACE_SECONDS = 5.0
+# Runs keep going after their client disconnects, for at most this long
+RUN_MAX_SECONDS = float(os.getenv("RUN_MAX_SECONDS", "3600"))
+# Other workers' choices only reach this worker's leaderboard on reload
+LEADERBOARD_RELOAD_SECONDS = float(
+    os.getenv("LEADERBOARD_RELOAD_SECONDS", "300" if web_concurrency() > 1 else "0")
 )
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+
+
+def log_environment():
+    """Log environment variable status."""
+    pool_size, max_overflow = worker_pool_settings()
+    print("=== Main App Environment Variables ===")
+    print(f"GPT_RESEARCHER_URL: {'✓ SET' if GPT_RESEARCHER_URL else '✗ NOT SET'}")
+    print(f"PERPLEXITY_URL: {'✓ SET' if PERPLEXITY_URL else '✗ NOT SET'}")
+    print(f"BASELINE_URL: {'✓ SET' if BASELINE_URL else '✗ NOT SET'}")
+    if database.is_sqlite():
+        print(f"DATABASE_URL: {database.database_url()} (embedded SQLite)")
+    else:
+        print(f"DB_USERNAME: {'✓ SET' if os.getenv('DB_USERNAME') else '✗ NOT SET'}")
+        print(f"DB_PASSWORD: {'✓ SET' if os.getenv('DB_PASSWORD') else '✗ NOT SET'}")
+        print(f"DB_ENDPOINT: {'✓ SET' if os.getenv('DB_ENDPOINT') else '✗ NOT SET'}")
+        print(f"DB_NAME: {'✓ SET' if os.getenv('DB_NAME') else '✗ NOT SET'}")
+    print(
+        f"FRAME_CODEC: {codec.JSON_BACKEND}, msgpack {'✓' if codec.MSGPACK_AVAILABLE else '✗'}"
+    )
+    print(f"WEB_CONCURRENCY: {web_concurrency()} (pool {pool_size}+{max_overflow})")
+    print(f"RUN_STATE_URL: {RUN_STATE_URL.split('@')[-1]}")
+    print("======================================")
 
 
-engine = create_engine(
-    DB_URI,
-    echo=False,
-    poolclass=QueuePool,
-    pool_size=5,  # Number of connections to keep open
-    max_overflow=10,  # Max extra connections when pool is full
-    pool_timeout=30,  # Seconds to wait for a connection from pool
-    pool_recycle=1800,  # Recycle connections after 30 minutes
-    pool_pre_ping=True,
-)
+_run_state: Optional[RunStateBackend] = None
 
-db_Session = sessionmaker(bind=engine)
 
+# Runs executing on this worker: run id -> event set when a frame is published,
+# so local subscribers wait on it instead of polling the buffer
+_local_runs: Dict[str, asyncio.Event] = {}
+_run_tasks: Set[asyncio.Task] = set()
 
-@contextmanager
-def get_session():
-    session = db_Session()
-    try:
-        yield session
-        session.commit()
-    except Exception:
-        session.rollback()
-        raise
-    finally:
-        session.close()
 
+def get_run_state() -> RunStateBackend:
+    """Return the run state backend, connecting to it on first use."""
+    global _run_state
+    if _run_state is None:
+        _run_state = create_run_state_backend(RUN_STATE_URL)
+        if web_concurrency() > 1 and not _run_state.shared:
+            logger.warning(
+                "WEB_CONCURRENCY > 1 with a process-local RUN_STATE_URL: resume "
+                "and dedup only work on the worker that started a run, so route "
+                "requests with a load balancer sticky on the dr_worker cookie."
+            )
+    return _run_state
 
-Base = declarative_base()
 
+_leaderboard: Optional[leaderboard.Leaderboard] = None
+_leaderboard_loaded_at = 0.0
+_leaderboard_lock = threading.Lock()
 
-app = FastAPI()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization"],
-)
+def get_leaderboard() -> leaderboard.Leaderboard:
+    """
+    Return the in-memory leaderboard, loading it from the stored choices on
+    first use and again every LEADERBOARD_RELOAD_SECONDS (if set).
+    """
+    global _leaderboard, _leaderboard_loaded_at
+    with _leaderboard_lock:
+        stale = (
+            LEADERBOARD_RELOAD_SECONDS > 0
+            and time.time() - _leaderboard_loaded_at > LEADERBOARD_RELOAD_SECONDS
+        )
+        if _leaderboard is None or stale:
+            with get_session() as db_session:
+                board = leaderboard.load_leaderboard(db_session)
+            board.refresh(bootstrap=True)
+            _leaderboard, _leaderboard_loaded_at = board, time.time()
+            logger.info(f"Loaded leaderboard from {board.count} choices")
+        return _leaderboard
 
 
-@app.get("/health")
+def warmup():
+    """Build the DB pool and run state backend before the first request."""
+    database.warmup()
+    get_run_state()
+
+
+router = APIRouter()
+
+
+@router.get("/health")
 async def health_check():
     return {"status": "ok"}
 
 
+@router.get("/api/debug/db")
+async def debug_database(
+    top: int = 20,
+    order_by: str = "total_ms",
+    reset: bool = False,
+    username: str = Depends(authenticate),
+):
+    """
+    Pool state, checkout waits and per-statement timings of this worker (see
+    db_metrics.py). ``order_by`` is one of total_ms, count, mean_ms, p95_ms
+    or max_ms; ``reset=true`` clears the numbers after reading them.
+    """
+    if order_by not in ("total_ms", "count", "mean_ms", "p95_ms", "max_ms"):
+        raise HTTPException(status_code=400, detail="Invalid order_by")
+    report = db_metrics.report(database.get_engine(), top=top, order_by=order_by)
+    if reset:
+        db_metrics.metrics.reset()
+    return {"status": "success", "pid": os.getpid(), **report}
+
+
 def get_all_deep_research_agents():
     """Get all available deep research agents with their names."""
     with get_session() as dbSession:
@@ -168,7 +231,7 @@ def return_system_name(agent_id):
     return rows[0][0]
 
 
-@app.get("/")
+@router.get("/")
 async def index():
     # This route previously used render_template, which is Flask-specific.
     # If serving an HTML file is needed, use FileResponse from
@@ -184,7 +247,7 @@ async def index():
     }
 
 
-@app.get("/api/deepresearch-agents")
+@router.get("/api/deepresearch-agents")
 async def get_deep_research_agents_async():
     """Get all available deep research agents."""
     all_agents = get_all_deep_research_agents()
@@ -202,23 +265,36 @@ async def streaming_service_producer_gen(
     Generic producer for streaming services that return normalized responses.
     Calls the specified service URL and yields standardized updates.
     """
+    # httpx is only needed once a run starts; keep it out of worker startup
+    import httpx
+
     try:
         async with httpx.AsyncClient(timeout=2000.0) as client:
             logger.info(
                 f"Connecting to {service_name} service for question: " f"{question}"
             )
             async with client.stream(
-                "POST", url, json={"question": question}
+                "POST",
+                url,
+                json={"question": question},
+                headers={"Accept": codec.upstream_accept_header()},
             ) as response:
                 response.raise_for_status()
+                if codec.is_msgpack(response.headers.get("content-type")):
+                    decoder = codec.MsgpackFrameDecoder()
+                    async for chunk in response.aiter_bytes():
+                        for data in decoder.feed(chunk):
+                            yield data
+                    return
+
                 async for line in response.aiter_lines():
                     if line.startswith("data:"):
                         data_str = line[len("data:") :].strip()
                         if data_str:
                             try:
-                                data = json.loads(data_str)
+                                data = codec.loads(data_str)
                                 yield data
-                            except json.JSONDecodeError:
+                            except ValueError:
                                 logger.error(
                                     f"Failed to decode json from "
                                     f"{service_name} stream: '{data_str}'"
@@ -315,14 +391,15 @@ async def agent_task_worker(
         await q.put((agent_id_str, None))  # Signal that this worker is done
 
 
-@app.post("/api/deepresearch-question")
+@router.post("/api/deepresearch-question")
 async def deep_research_question(
     request: Request, username: str = Depends(authenticate)
 ):
     """
     Handles a deep research question by making calls to all three agents.
     Supports both streaming (Perplexity) and non-streaming (baseline)
-    responses.
+    responses. The agents run detached from this request (see start_run);
+    the response streams the run's buffer, like a resume does.
     """
     data = await request.json()
     question = data.get("question", "Tell me a fun fact about space.")
@@ -336,177 +413,332 @@ async def deep_research_question(
             detail="Not enough agents available. Need at least 3 agents.",
         )
 
+    media_type = codec.negotiate_media_type(
+        request.headers.get("accept"), codec.NDJSON_MEDIA_TYPE
+    )
+
+    run_state = get_run_state()
+    run_id = str(uuid.uuid4())
+
+    # A retried request with the same idempotency key joins the original run;
+    # only the request that wins the claim registers and starts one
+    dedup_key = request.headers.get("idempotency-key") or data.get("request_id")
+    if dedup_key:
+        existing_run_id = await run_state.claim_request(dedup_key, run_id)
+        if existing_run_id:
+            logger.info(f"Request {dedup_key} joins existing run {existing_run_id}")
+            return run_streaming_response(request, existing_run_id, 0, media_type)
+
+    await run_state.register_run(run_id, data.get("session_id"))
+    start_run(run_id, question, all_agents)
+    return run_streaming_response(request, run_id, 0, media_type)
+
+
+async def publish_frame(run_id: str, payload: Dict[str, Any]) -> None:
+    """Append a frame to the run's buffer and wake this worker's subscribers."""
+    await get_run_state().append_frame(run_id, codec.dumps_bytes(payload))
+    # Swap in a fresh event so waiters that arrive later block again
+    event = _local_runs.get(run_id)
+    if event is not None:
+        _local_runs[run_id] = asyncio.Event()
+        event.set()
+
+
+def start_run(run_id: str, question: str, all_agents: List[Dict]) -> None:
+    """
+    Run the agents in a task of their own, detached from the request that
+    started them: it writes every frame to the run buffer and HTTP responses
+    only subscribe to that buffer, so the run outlives client disconnects.
+    """
+    _local_runs[run_id] = asyncio.Event()
+    task = asyncio.create_task(execute_run(run_id, question, all_agents))
+    _run_tasks.add(task)
+    task.add_done_callback(run_done)
+
+
+def run_done(task: asyncio.Task) -> None:
+    _run_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Deep research run failed", exc_info=task.exception())
+
+
+async def execute_run(run_id: str, question: str, all_agents: List[Dict]) -> None:
+    """Call the three agents and publish their combined state frame by frame."""
+    run_state = get_run_state()
     q = asyncio.Queue()
+    logger.info(
+        f"Starting deep research for question: '{question}' using all "
+        f"available agents: {[agent['agent_id'] for agent in all_agents]}"
+    )
 
-    async def generate_agent_responses() -> AsyncGenerator[str, None]:
-        logger.info(
-            f"Starting deep research for question: '{question}' using all "
-            f"available agents: {[agent['agent_id'] for agent in all_agents]}"
-        )
+    initial_metadata = {
+        "metadata": {
+            "all_agents": all_agents,
+            "run_id": run_id,
+            "worker_id": WORKER_ID,
+        },
+        "agentA_intermediate_steps": None,
+        "agentB_intermediate_steps": None,
+        "agentC_intermediate_steps": None,
+        "agentA_final_report": None,
+        "agentB_final_report": None,
+        "agentC_final_report": None,
+        "agentA_is_intermediate": False,
+        "agentB_is_intermediate": False,
+        "agentC_is_intermediate": False,
+        "agentA_is_complete": False,
+        "agentB_is_complete": False,
+        "agentC_is_complete": False,
+        "agentA_citations": [],
+        "agentB_citations": [],
+        "agentC_citations": [],
+        "agentA_updated": False,
+        "agentB_updated": False,
+        "agentC_updated": False,
+        "final": False,
+    }
+    await publish_frame(run_id, initial_metadata)
 
-        initial_metadata = {
-            "metadata": {
-                "all_agents": all_agents,
-            },
-            "agentA_intermediate_steps": None,
-            "agentB_intermediate_steps": None,
-            "agentC_intermediate_steps": None,
-            "agentA_final_report": None,
-            "agentB_final_report": None,
-            "agentC_final_report": None,
-            "agentA_is_intermediate": False,
-            "agentB_is_intermediate": False,
-            "agentC_is_intermediate": False,
-            "agentA_is_complete": False,
-            "agentB_is_complete": False,
-            "agentC_is_complete": False,
-            "agentA_citations": [],
-            "agentB_citations": [],
-            "agentC_citations": [],
-            "agentA_updated": False,
-            "agentB_updated": False,
-            "agentC_updated": False,
-            "final": False,
-        }
-        yield json.dumps(initial_metadata) + "\n"
+    # Create worker tasks for each agent
+    tasks = []
+    agent_labels = ["agentA", "agentB", "agentC"]
 
-        # Create worker tasks for each agent
-        tasks = []
-        agent_labels = ["agentA", "agentB", "agentC"]
+    for i, agent in enumerate(all_agents[:3]):
+        task = asyncio.create_task(
+            agent_task_worker(agent["agent_id"], agent_labels[i], question, q)
+        )
+        tasks.append(task)
+
+    active_producers = len(tasks)
+
+    combined_state = {
+        "agentA_intermediate_steps": None,
+        "agentB_intermediate_steps": None,
+        "agentC_intermediate_steps": None,
+        "agentA_final_report": None,
+        "agentB_final_report": None,
+        "agentC_final_report": None,
+        "agentA_is_intermediate": False,
+        "agentB_is_intermediate": False,
+        "agentC_is_intermediate": False,
+        "agentA_is_complete": False,
+        "agentB_is_complete": False,
+        "agentC_is_complete": False,
+        "agentA_citations": [],
+        "agentB_citations": [],
+        "agentC_citations": [],
+    }
 
-        for i, agent in enumerate(all_agents[:3]):
-            task = asyncio.create_task(
-                agent_task_worker(agent["agent_id"], agent_labels[i], question, q)
-            )
-            tasks.append(task)
-
-        active_producers = len(tasks)
-
-        combined_state = {
-            "agentA_intermediate_steps": None,
-            "agentB_intermediate_steps": None,
-            "agentC_intermediate_steps": None,
-            "agentA_final_report": None,
-            "agentB_final_report": None,
-            "agentC_final_report": None,
-            "agentA_is_intermediate": False,
-            "agentB_is_intermediate": False,
-            "agentC_is_intermediate": False,
-            "agentA_is_complete": False,
-            "agentB_is_complete": False,
-            "agentC_is_complete": False,
-            "agentA_citations": [],
-            "agentB_citations": [],
-            "agentC_citations": [],
-        }
+    deadline = time.monotonic() + RUN_MAX_SECONDS
+    try:
+        while active_producers > 0:
+            # Subscribers send the heartbeats while the agents are silent
+            try:
+                source_agent_id, chunk_data = await asyncio.wait_for(
+                    q.get(), timeout=max(deadline - time.monotonic(), 0)
+                )
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"Run {run_id} exceeded RUN_MAX_SECONDS, cancelling its agents"
+                )
+                break
+            q.task_done()
 
-        try:
-            while active_producers > 0:
-                try:
-                    # Wait for an item from the queue, but with a timeout
-                    source_agent_id, chunk_data = await asyncio.wait_for(
-                        q.get(), timeout=15.0
-                    )
-                except asyncio.TimeoutError:
-                    # Send heartbeat to keep connection alive
-                    logger.debug("No agent output for 15s, sending heartbeat.")
-                    yield json.dumps(
-                        {"heartbeat": True, "timestamp": time.time()}
-                    ) + "\n"
-                    continue
-
-                q.task_done()
-
-                if chunk_data is None:
-                    active_producers -= 1
-                    if source_agent_id == "agentA":
-                        combined_state["agentA_is_complete"] = True
-                    elif source_agent_id == "agentB":
-                        combined_state["agentB_is_complete"] = True
-                    elif source_agent_id == "agentC":
-                        combined_state["agentC_is_complete"] = True
-
-                    payload = combined_state.copy()
-                    payload["agentA_updated"] = source_agent_id == "agentA"
-                    payload["agentB_updated"] = source_agent_id == "agentB"
-                    payload["agentC_updated"] = source_agent_id == "agentC"
-                    payload["final"] = active_producers == 0
-
-                    yield json.dumps(payload) + "\n"
-                    continue
-
-                # Update combined state from chunk_data
-                for step_key in [
-                    "agentA_intermediate_steps",
-                    "agentB_intermediate_steps",
-                    "agentC_intermediate_steps",
-                ]:
-                    if step_key in chunk_data:
-                        combined_state[step_key] = chunk_data[step_key]
-
-                for report_key in [
-                    "agentA_final_report",
-                    "agentB_final_report",
-                    "agentC_final_report",
-                ]:
-                    if report_key in chunk_data:
-                        combined_state[report_key] = chunk_data[report_key]
-                        # Mark as no longer intermediate when final report arrives
-                        agent_prefix = report_key.split("_")[0]
-                        combined_state[f"{agent_prefix}_is_intermediate"] = False
-
-                for intermediate_key in [
-                    "agentA_is_intermediate",
-                    "agentB_is_intermediate",
-                    "agentC_is_intermediate",
-                ]:
-                    if intermediate_key in chunk_data:
-                        combined_state[intermediate_key] = chunk_data[intermediate_key]
-
-                for citation_key in [
-                    "agentA_citations",
-                    "agentB_citations",
-                    "agentC_citations",
-                ]:
-                    if citation_key in chunk_data:
-                        combined_state[citation_key] = chunk_data[citation_key]
-                        agent_letter = citation_key.split("_")[0][-1]  # Get A, B, or C
-                        logger.info(
-                            f"Forwarding {len(chunk_data[citation_key])} citations for agent {agent_letter}."
-                        )
+            if chunk_data is None:
+                active_producers -= 1
+                if source_agent_id == "agentA":
+                    combined_state["agentA_is_complete"] = True
+                elif source_agent_id == "agentB":
+                    combined_state["agentB_is_complete"] = True
+                elif source_agent_id == "agentC":
+                    combined_state["agentC_is_complete"] = True
 
                 payload = combined_state.copy()
                 payload["agentA_updated"] = source_agent_id == "agentA"
                 payload["agentB_updated"] = source_agent_id == "agentB"
                 payload["agentC_updated"] = source_agent_id == "agentC"
-                payload["is_final"] = False
-
-                yield json.dumps(payload) + "\n"
-
-            # Final yield to ensure frontend knows all are complete
-            final_state = combined_state.copy()
-            final_state["is_final"] = True
-            final_state["agentA_is_complete"] = True
-            final_state["agentB_is_complete"] = True
-            final_state["agentC_is_complete"] = True
-            final_state["agentA_updated"] = False
-            final_state["agentB_updated"] = False
-            final_state["agentC_updated"] = False
-            yield json.dumps(final_state) + "\n"
-        finally:
-            logger.info("Cleaning up deep research tasks.")
-            for task in tasks:
-                if not task.done():
-                    task.cancel()
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
-
-    return StreamingResponse(
-        generate_agent_responses(), media_type="application/x-ndjson"
+                payload["final"] = active_producers == 0
+
+                await publish_frame(run_id, payload)
+                continue
+
+            # Update combined state from chunk_data
+            for step_key in [
+                "agentA_intermediate_steps",
+                "agentB_intermediate_steps",
+                "agentC_intermediate_steps",
+            ]:
+                if step_key in chunk_data:
+                    combined_state[step_key] = chunk_data[step_key]
+
+            for report_key in [
+                "agentA_final_report",
+                "agentB_final_report",
+                "agentC_final_report",
+            ]:
+                if report_key in chunk_data:
+                    combined_state[report_key] = chunk_data[report_key]
+                    # Mark as no longer intermediate when final report arrives
+                    agent_prefix = report_key.split("_")[0]
+                    combined_state[f"{agent_prefix}_is_intermediate"] = False
+
+            for intermediate_key in [
+                "agentA_is_intermediate",
+                "agentB_is_intermediate",
+                "agentC_is_intermediate",
+            ]:
+                if intermediate_key in chunk_data:
+                    combined_state[intermediate_key] = chunk_data[intermediate_key]
+
+            for citation_key in [
+                "agentA_citations",
+                "agentB_citations",
+                "agentC_citations",
+            ]:
+                if citation_key in chunk_data:
+                    combined_state[citation_key] = chunk_data[citation_key]
+                    agent_letter = citation_key.split("_")[0][-1]  # Get A, B, or C
+                    logger.info(
+                        f"Forwarding {len(chunk_data[citation_key])} citations for agent {agent_letter}."
+                    )
+
+            payload = combined_state.copy()
+            payload["agentA_updated"] = source_agent_id == "agentA"
+            payload["agentB_updated"] = source_agent_id == "agentB"
+            payload["agentC_updated"] = source_agent_id == "agentC"
+            payload["is_final"] = False
+
+            await publish_frame(run_id, payload)
+
+        # Final yield to ensure frontend knows all are complete
+        final_state = combined_state.copy()
+        final_state["is_final"] = True
+        final_state["agentA_is_complete"] = True
+        final_state["agentB_is_complete"] = True
+        final_state["agentC_is_complete"] = True
+        final_state["agentA_updated"] = False
+        final_state["agentB_updated"] = False
+        final_state["agentC_updated"] = False
+        await publish_frame(run_id, final_state)
+    finally:
+        await run_state.finish_run(run_id)
+        # Wake the subscribers, so they see the run has finished
+        _local_runs.pop(run_id).set()
+        logger.info("Cleaning up deep research tasks.")
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_headers(run_id: str) -> Dict[str, str]:
+    """
+    Headers identifying a run and the worker that owns it. The cookie lets a
+    sticky load balancer send follow-up requests back to the same worker.
+    """
+    return {
+        "X-Run-Id": run_id,
+        "X-Worker-Id": WORKER_ID,
+        "Set-Cookie": f"dr_worker={WORKER_ID}; Path=/; HttpOnly; SameSite=Lax",
+    }
+
+
+async def replay_run_frames(
+    run_id: str, start: int, media_type: str
+) -> AsyncGenerator[bytes, None]:
+    """Replay buffered frames of a run, then follow it until it finishes."""
+    run_state = get_run_state()
+    next_frame = start
+    idle_since = time.time()
+    # A joined run can be claimed but not registered yet
+    registered_by = time.time() + RUN_REGISTER_GRACE_SECONDS
+    while True:
+        # Taken before reading, so a frame published meanwhile still wakes us
+        published = _local_runs.get(run_id)
+        frames, next_frame = await run_state.get_frames(run_id, next_frame)
+        for frame in frames:
+            if media_type == codec.NDJSON_MEDIA_TYPE:
+                yield frame + b"\n"
+            else:
+                yield codec.encode_frame(codec.loads(frame), media_type)
+        if frames:
+            idle_since = time.time()
+            continue
+
+        run = await run_state.get_run(run_id)
+        if run is None and next_frame == start and time.time() < registered_by:
+            await asyncio.sleep(RUN_POLL_INTERVAL)
+            continue
+        if run is None or run["finished"] == "1":
+            break
+        if time.time() - idle_since > 15.0:
+            yield codec.encode_frame(
+                {"heartbeat": True, "timestamp": time.time()}, media_type
+            )
+            idle_since = time.time()
+        if published is None:
+            # Run executing on another worker: poll the shared buffer
+            await asyncio.sleep(RUN_POLL_INTERVAL)
+            continue
+        try:
+            await asyncio.wait_for(published.wait(), timeout=15.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+def run_streaming_response(
+    request: Request, run_id: str, start: int, media_type: str
+) -> StreamingResponse:
+    return compressed_streaming_response(
+        request,
+        replay_run_frames(run_id, start, media_type),
+        media_type,
+        run_headers(run_id),
+    )
+
+
+@router.get("/api/deepresearch-runs/{run_id}")
+async def get_deep_research_run(run_id: str, username: str = Depends(authenticate)):
+    """Status of a run: owning worker, session and whether it has finished."""
+    run = await get_run_state().get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return JSONResponse(
+        {
+            "status": "success",
+            "run": {
+                "run_id": run_id,
+                "owner": run["owner"],
+                "session_id": run["session_id"] or None,
+                "finished": run["finished"] == "1",
+                "shared_state": get_run_state().shared,
+            },
+        }
+    )
+
+
+@router.get("/api/deepresearch-runs/{run_id}/stream")
+async def resume_deep_research_run(
+    run_id: str,
+    request: Request,
+    from_frame: int = 0,
+    username: str = Depends(authenticate),
+):
+    """
+    Reconnect to a run: replays buffered frames from ``from_frame`` and keeps
+    streaming until the run finishes. Any worker can serve this when run state
+    is shared; otherwise the request has to reach the owning worker.
+    """
+    if await get_run_state().get_run(run_id) is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    media_type = codec.negotiate_media_type(
+        request.headers.get("accept"), codec.NDJSON_MEDIA_TYPE
     )
+    return run_streaming_response(request, run_id, from_frame, media_type)
 
 
-@app.post("/api/deepresearch-choice")
+@router.post("/api/deepresearch-choice")
 async def deep_research_choice(request: Request):
     """Process user's deep research agent choice and stores it in the database."""
     data = await request.json()
@@ -554,23 +786,29 @@ async def deep_research_choice(request: Request):
         # Generate the UUID before creating the database object
         response_id = str(uuid.uuid4())
 
-        new_response = DeepResearchUserResponse(
-            id=response_id,
-            session_id=session_id,
-            agentid_a=agent_a_id,
-            agentid_b=agent_b_id,
-            question=question,
-            conversation_a=json.dumps(conversation_a),
-            conversation_b=json.dumps(conversation_b),
-            userresponse=choice,
-        )
-
         with get_session() as dbSession:
-            dbSession.add(new_response)
+            conversation_a_hash, conversation_b_hash = put_blobs(
+                dbSession, [json.dumps(conversation_a), json.dumps(conversation_b)]
+            )
+            dbSession.add(
+                DeepResearchUserResponse(
+                    id=response_id,
+                    session_id=session_id,
+                    agentid_a=agent_a_id,
+                    agentid_b=agent_b_id,
+                    question=question,
+                    conversation_a_hash=conversation_a_hash,
+                    conversation_b_hash=conversation_b_hash,
+                    userresponse=choice,
+                )
+            )
 
         # Use the local variable `response_id` for logging to avoid accessing the
         # detached instance
         logger.info(f"Stored deep research choice. ID: {response_id}")
+        if _leaderboard is not None:
+            # Not loaded yet means the first load will read this row
+            _leaderboard.record(agent_a_id, agent_b_id, choice)
         agent_a_name = return_system_name(agent_a_id)
         agent_b_name = return_system_name(agent_b_id)
         logger.debug(f"Agent a name : {agent_a_name}")
@@ -590,7 +828,62 @@ async def deep_research_choice(request: Request):
         raise HTTPException(status_code=500, detail="Failed to record choice.")
 
 
-@app.post("/api/answer-span-vote")
+@router.get("/api/leaderboard")
+async def get_agent_leaderboard(request: Request):
+    """
+    Agent ratings from the pairwise choices: Bradley-Terry rating with a 95%
+    bootstrap interval (null until the agent is bootstrapped, ci_stale when
+    it played since), the online Elo rating and the number of votes.
+    """
+    try:
+        board = await asyncio.to_thread(get_leaderboard)
+        rows = await asyncio.to_thread(board.snapshot)
+        names = {
+            agent["agent_id"]: agent["name"]
+            for agent in await asyncio.to_thread(get_all_deep_research_agents)
+        }
+    except Exception as e:
+        logger.error(f"Failed to compute leaderboard: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to compute leaderboard.")
+
+    for row in rows:
+        row["name"] = names.get(row["agent_id"], row["agent_id"])
+    return compressed_json_response(
+        request,
+        {
+            "status": "success",
+            "leaderboard": rows,
+            "total_votes": board.count,
+            "updated_at": board.updated_at,
+        },
+    )
+
+
+@router.get("/api/vote-stats")
+async def get_vote_stats(
+    request: Request,
+    days: int = 30,
+    agent_id: Optional[str] = None,
+    username: str = Depends(authenticate),
+):
+    """
+    Span and step vote totals per agent and the most downvoted step types,
+    read from the rollup counters (up to the last rollup run).
+    """
+
+    def read_stats():
+        with get_session() as db_session:
+            return vote_rollups.vote_stats(db_session, days=days, agent_id=agent_id)
+
+    try:
+        stats = await asyncio.to_thread(read_stats)
+    except Exception as e:
+        logger.error(f"Failed to read vote stats: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to read vote stats.")
+    return compressed_json_response(request, {"status": "success", **stats})
+
+
+@router.post("/api/answer-span-vote")
 async def answer_span_vote(request: Request):
     """Logs a user's vote on a specific span of text in the answer_span_votes table."""
     data = await request.json()
@@ -613,11 +906,18 @@ async def answer_span_vote(request: Request):
     try:
         with get_session() as db_session:
             new_vote = AnswerSpanVote(
-                session_id=session_id,
-                agent_id=agent_id,
-                vote=vote,
-                highlighted_text=highlighted_text,
+                session_id=session_id, agent_id=agent_id, vote=vote
             )
+            span = locate_span_in_saved_response(
+                db_session, session_id, agent_id, highlighted_text
+            )
+            if span:
+                new_vote.response_hash, new_vote.span_start, new_vote.span_end = span
+                retain_blobs(db_session, [new_vote.response_hash])
+            else:
+                (new_vote.highlighted_text_hash,) = put_blobs(
+                    db_session, [highlighted_text]
+                )
             db_session.add(new_vote)
 
         logger.info(f"Stored answer span vote for agent_id: {agent_id}, vote: {vote}.")
@@ -631,7 +931,7 @@ async def answer_span_vote(request: Request):
     )
 
 
-@app.post("/api/intermediate-step-vote")
+@router.post("/api/intermediate-step-vote")
 async def intermediate_step_vote(request: Request):
     """Logs a user's vote on a specific intermediate step."""
     data = await request.json()
@@ -653,11 +953,13 @@ async def intermediate_step_vote(request: Request):
 
     try:
         with get_session() as db_session:
+            (step_hash,) = put_blobs(db_session, [step_text])
             new_vote = IntermediateStepVote(
                 session_id=session_id,
                 agent_id=agent_id,
                 vote=vote,
-                intermediate_step=step_text,
+                intermediate_step_hash=step_hash,
+                step_type=vote_rollups.normalize_step_type(step_text),
             )
             db_session.add(new_vote)
 
@@ -678,59 +980,207 @@ async def intermediate_step_vote(request: Request):
     )
 
 
-@app.post("/api/save-conversation")
-async def save_conversation(request: Request, username: str = Depends(authenticate)):
+# Agent A/B/C field prefixes accepted by /api/save-conversation
+LEGACY_AGENT_LABELS = ("a", "b", "c")
+
+# Per-agent texts stored in content_blobs (see blob_store.py)
+RESPONSE_TEXT_FIELDS = ("response", "intermediate_steps", "citations")
+
+
+def agents_from_payload(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
-    Save a complete conversation with all three agents to the database.
+    Read the agent answers of a save-conversation payload, either from an
+    ``agents`` list or from the agent_a_* / agent_b_* / agent_c_* fields.
     """
-    data = await request.json()
+    if "agents" in data:
+        agents = data["agents"]
+        if not isinstance(agents, list) or not agents:
+            raise HTTPException(status_code=400, detail="agents must be a list")
+        for agent in agents:
+            for field in ("id", "name", "response"):
+                if field not in agent:
+                    raise HTTPException(
+                        status_code=400, detail=f"Missing required agent field: {field}"
+                    )
+        return agents
+
+    agents = []
+    for label in LEGACY_AGENT_LABELS:
+        for field in ("id", "name", "response"):
+            if f"agent_{label}_{field}" not in data:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Missing required field: agent_{label}_{field}",
+                )
+        agents.append(
+            {
+                "id": data[f"agent_{label}_id"],
+                "name": data[f"agent_{label}_name"],
+                "response": data[f"agent_{label}_response"],
+                "intermediate_steps": data.get(f"agent_{label}_intermediate_steps"),
+                "citations": data.get(f"agent_{label}_citations"),
+            }
+        )
+    return agents
+
 
-    required_fields = [
-        "session_id",
-        "question",
-        "agent_a_id",
-        "agent_a_name",
-        "agent_a_response",
-        "agent_b_id",
-        "agent_b_name",
-        "agent_b_response",
-        "agent_c_id",
-        "agent_c_name",
-        "agent_c_response",
+def fetch_agent_responses(
+    db_session, conversation_ids: List[uuid.UUID], summary: bool = False
+) -> Dict[uuid.UUID, List[Dict[str, Any]]]:
+    """
+    Load the agent answers of several conversations, grouped by conversation
+    id in display order: one query for the response rows and one for the
+    texts they reference. With ``summary`` the texts are not read at all.
+    """
+    columns = [
+        ConversationAgentResponse.conversation_id,
+        ConversationAgentResponse.agent_id,
+        ConversationAgentResponse.agent_name,
     ]
+    if not summary:
+        columns += [
+            getattr(ConversationAgentResponse, f"{field}{suffix}")
+            for field in RESPONSE_TEXT_FIELDS
+            for suffix in ("_hash", "")
+        ]
+
+    agents: Dict[uuid.UUID, List[Dict[str, Any]]] = {
+        conversation_id: [] for conversation_id in conversation_ids
+    }
+    if not conversation_ids:
+        return agents
+
+    rows = db_session.execute(
+        select(*columns)
+        .where(ConversationAgentResponse.conversation_id.in_(conversation_ids))
+        .order_by(
+            ConversationAgentResponse.conversation_id,
+            ConversationAgentResponse.position,
+        )
+    ).all()
+    texts = {}
+    if not summary:
+        texts = get_blobs(
+            db_session,
+            (
+                getattr(row, f"{field}_hash")
+                for row in rows
+                for field in RESPONSE_TEXT_FIELDS
+            ),
+        )
+    for row in rows:
+        agent = {"id": row.agent_id, "name": row.agent_name}
+        if not summary:
+            for field in RESPONSE_TEXT_FIELDS:
+                # Legacy rows keep the text inline instead of a blob hash
+                digest = getattr(row, f"{field}_hash")
+                agent[field] = texts.get(digest) if digest else getattr(row, field)
+        agents[row.conversation_id].append(agent)
+    return agents
+
+
+def locate_span_in_saved_response(
+    db_session, session_id: str, agent_id: str, span: str
+) -> Optional[Tuple[str, int, int]]:
+    """
+    Find ``span`` in the latest saved response of ``agent_id`` for the
+    session. Returns (response blob hash, start, end) or None.
+    """
+    response_hash = db_session.execute(
+        select(ConversationAgentResponse.response_hash)
+        .join(
+            Conversation, Conversation.id == ConversationAgentResponse.conversation_id
+        )
+        .where(
+            Conversation.session_id == uuid.UUID(str(session_id)),
+            ConversationAgentResponse.agent_id == agent_id,
+            ConversationAgentResponse.response_hash.is_not(None),
+        )
+        .order_by(Conversation.timestamp.desc())
+        .limit(1)
+    ).scalar()
+    if not response_hash:
+        return None
+    response = get_blobs(db_session, [response_hash]).get(response_hash, "")
+    start = response.find(span)
+    if start < 0:
+        return None
+    return response_hash, start, start + len(span)
+
+
+def conversation_to_dict(conversation, agents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "id": str(conversation.id),
+        "session_id": str(conversation.session_id),
+        "timestamp": conversation.timestamp.isoformat(),
+        "question": conversation.question,
+        "agents": agents,
+    }
+
 
-    for field in required_fields:
+@router.post("/api/save-conversation")
+async def save_conversation(request: Request, username: str = Depends(authenticate)):
+    """
+    Save a complete conversation, one response row per agent.
+    """
+    data = await request.json()
+
+    for field in ("session_id", "question"):
         if field not in data:
             raise HTTPException(
                 status_code=400, detail=f"Missing required field: {field}"
             )
+    agents = agents_from_payload(data)
+    try:
+        session_uuid = uuid.UUID(str(data["session_id"]))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid session ID format")
 
     try:
         with get_session() as db_session:
-            conversation = ConversationHistory(
-                session_id=data["session_id"],
-                question=data["question"],
-                agent_a_id=data["agent_a_id"],
-                agent_a_name=data["agent_a_name"],
-                agent_a_response=data["agent_a_response"],
-                agent_a_intermediate_steps=data.get("agent_a_intermediate_steps"),
-                agent_a_citations=data.get("agent_a_citations"),
-                agent_b_id=data["agent_b_id"],
-                agent_b_name=data["agent_b_name"],
-                agent_b_response=data["agent_b_response"],
-                agent_b_intermediate_steps=data.get("agent_b_intermediate_steps"),
-                agent_b_citations=data.get("agent_b_citations"),
-                agent_c_id=data["agent_c_id"],
-                agent_c_name=data["agent_c_name"],
-                agent_c_response=data["agent_c_response"],
-                agent_c_intermediate_steps=data.get("agent_c_intermediate_steps"),
-                agent_c_citations=data.get("agent_c_citations"),
+            conversation_id = uuid.uuid4()
+            db_session.add(
+                Conversation(
+                    id=conversation_id,
+                    session_id=session_uuid,
+                    question=data["question"],
+                    search_vector=conversation_search.search_vector(
+                        db_session,
+                        data["question"],
+                        (agent.get("response") for agent in agents),
+                    ),
+                )
+            )
+            hashes = iter(
+                put_blobs(
+                    db_session,
+                    (
+                        agent.get(field)
+                        for agent in agents
+                        for field in RESPONSE_TEXT_FIELDS
+                    ),
+                )
+            )
+            db_session.add_all(
+                ConversationAgentResponse(
+                    conversation_id=conversation_id,
+                    position=position,
+                    agent_id=agent["id"],
+                    agent_name=agent["name"],
+                    response_hash=next(hashes),
+                    intermediate_steps_hash=next(hashes),
+                    citations_hash=next(hashes),
+                )
+                for position, agent in enumerate(agents)
             )
-            db_session.add(conversation)
 
         logger.info(f"Saved conversation for session {data['session_id']}")
         return JSONResponse(
-            {"status": "success", "message": "Conversation saved successfully"}
+            {
+                "status": "success",
+                "message": "Conversation saved successfully",
+                "conversation_id": str(conversation_id),
+            }
         )
 
     except Exception as e:
@@ -738,74 +1188,90 @@ async def save_conversation(request: Request, username: str = Depends(authentica
         raise HTTPException(status_code=500, detail="Failed to save conversation")
 
 
-@app.get("/api/conversation-history")
+@router.get("/api/conversation-history")
 async def get_conversation_history(
-    page: int = 1, page_size: int = 10, username: str = Depends(authenticate)
+    request: Request,
+    page: int = 1,
+    page_size: int = 10,
+    fields: str = "full",
+    agent_id: Optional[str] = None,
+    include_archived: bool = False,
+    username: str = Depends(authenticate),
 ):
     """
     Get paginated conversation history.
+
+    ``fields=summary`` returns only agent ids and names, without the response,
+    intermediate step and citation texts. ``agent_id`` limits the history to
+    conversations that include that agent. ``include_archived`` continues the
+    history past the database into the archive files (see history_archive.py);
+    archived conversations are marked with ``"archived": true``.
     """
+    if fields not in ("full", "summary"):
+        raise HTTPException(status_code=400, detail="fields must be full or summary")
     offset = (page - 1) * page_size
 
     try:
         with get_session() as db_session:
-            conversations = (
-                db_session.query(ConversationHistory)
-                .order_by(ConversationHistory.timestamp.desc())
-                .offset(offset)
-                .limit(page_size)
-                .all()
+            conversations_query = select(
+                Conversation.id,
+                Conversation.session_id,
+                Conversation.timestamp,
+                Conversation.question,
             )
-
-            total_count = db_session.query(ConversationHistory).count()
-
-            result = []
-            for conv in conversations:
-                result.append(
-                    {
-                        "id": str(conv.id),
-                        "session_id": str(conv.session_id),
-                        "timestamp": conv.timestamp.isoformat(),
-                        "question": conv.question,
-                        "agents": [
-                            {
-                                "id": conv.agent_a_id,
-                                "name": conv.agent_a_name,
-                                "response": conv.agent_a_response,
-                                "intermediate_steps": conv.agent_a_intermediate_steps,
-                                "citations": conv.agent_a_citations,
-                            },
-                            {
-                                "id": conv.agent_b_id,
-                                "name": conv.agent_b_name,
-                                "response": conv.agent_b_response,
-                                "intermediate_steps": conv.agent_b_intermediate_steps,
-                                "citations": conv.agent_b_citations,
-                            },
-                            {
-                                "id": conv.agent_c_id,
-                                "name": conv.agent_c_name,
-                                "response": conv.agent_c_response,
-                                "intermediate_steps": conv.agent_c_intermediate_steps,
-                                "citations": conv.agent_c_citations,
-                            },
-                        ],
-                    }
+            count_query = select(func.count()).select_from(Conversation)
+            if agent_id:
+                has_agent = exists().where(
+                    (ConversationAgentResponse.conversation_id == Conversation.id)
+                    & (ConversationAgentResponse.agent_id == agent_id)
                 )
+                conversations_query = conversations_query.where(has_agent)
+                count_query = count_query.where(has_agent)
 
-            return JSONResponse(
-                {
-                    "status": "success",
-                    "conversations": result,
-                    "pagination": {
-                        "page": page,
-                        "page_size": page_size,
-                        "total_count": total_count,
-                        "total_pages": (total_count + page_size - 1) // page_size,
-                    },
-                }
+            conversations = db_session.execute(
+                conversations_query.order_by(Conversation.timestamp.desc())
+                .offset(offset)
+                .limit(page_size)
+            ).all()
+            total_count = db_session.execute(count_query).scalar_one()
+
+            agents = fetch_agent_responses(
+                db_session,
+                [conv.id for conv in conversations],
+                summary=fields == "summary",
             )
+            result = [
+                conversation_to_dict(conv, agents[conv.id]) for conv in conversations
+            ]
+
+        if include_archived:
+            # Archived conversations are all older than the ones in the database
+            archived, archived_count = await asyncio.to_thread(
+                history_archive.read_archived_conversations,
+                offset=max(0, offset - total_count),
+                limit=page_size - len(result),
+                agent_id=agent_id,
+                summary=fields == "summary",
+            )
+            result += archived
+            total_count += archived_count
 
+        return compressed_json_response(
+            request,
+            {
+                "status": "success",
+                "conversations": result,
+                "pagination": {
+                    "page": page,
+                    "page_size": page_size,
+                    "total_count": total_count,
+                    "total_pages": (total_count + page_size - 1) // page_size,
+                },
+            },
+        )
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving conversation history: {e}", exc_info=True)
         raise HTTPException(
@@ -813,10 +1279,13 @@ async def get_conversation_history(
         )
 
 
-@app.get("/api/conversation/{conversation_id}")
-async def get_conversation_by_id(conversation_id: str):
+@router.get("/api/conversation/{conversation_id}")
+async def get_conversation_by_id(
+    conversation_id: str, request: Request, include_archived: bool = False
+):
     """
-    Get a specific conversation by ID.
+    Get a specific conversation by ID, looking in the archive files as well
+    with ``include_archived``.
     """
     try:
         conversation_uuid = uuid.UUID(conversation_id)
@@ -825,46 +1294,30 @@ async def get_conversation_by_id(conversation_id: str):
 
     try:
         with get_session() as db_session:
-            conversation = (
-                db_session.query(ConversationHistory)
-                .filter(ConversationHistory.id == conversation_uuid)
-                .first()
+            conversation = db_session.execute(
+                select(
+                    Conversation.id,
+                    Conversation.session_id,
+                    Conversation.timestamp,
+                    Conversation.question,
+                ).where(Conversation.id == conversation_uuid)
+            ).first()
+
+            result = None
+            if conversation:
+                agents = fetch_agent_responses(db_session, [conversation.id])
+                result = conversation_to_dict(conversation, agents[conversation.id])
+
+        if result is None and include_archived:
+            result = await asyncio.to_thread(
+                history_archive.get_archived_conversation, str(conversation_uuid)
             )
+        if not result:
+            raise HTTPException(status_code=404, detail="Conversation not found")
 
-            if not conversation:
-                raise HTTPException(status_code=404, detail="Conversation not found")
-
-            result = {
-                "id": str(conversation.id),
-                "session_id": str(conversation.session_id),
-                "timestamp": conversation.timestamp.isoformat(),
-                "question": conversation.question,
-                "agents": [
-                    {
-                        "id": conversation.agent_a_id,
-                        "name": conversation.agent_a_name,
-                        "response": conversation.agent_a_response,
-                        "intermediate_steps": conversation.agent_a_intermediate_steps,
-                        "citations": conversation.agent_a_citations,
-                    },
-                    {
-                        "id": conversation.agent_b_id,
-                        "name": conversation.agent_b_name,
-                        "response": conversation.agent_b_response,
-                        "intermediate_steps": conversation.agent_b_intermediate_steps,
-                        "citations": conversation.agent_b_citations,
-                    },
-                    {
-                        "id": conversation.agent_c_id,
-                        "name": conversation.agent_c_name,
-                        "response": conversation.agent_c_response,
-                        "intermediate_steps": conversation.agent_c_intermediate_steps,
-                        "citations": conversation.agent_c_citations,
-                    },
-                ],
-            }
-
-            return JSONResponse({"status": "success", "conversation": result})
+        return compressed_json_response(
+            request, {"status": "success", "conversation": result}
+        )
 
     except HTTPException:
         raise
@@ -873,6 +1326,151 @@ async def get_conversation_by_id(conversation_id: str):
         raise HTTPException(status_code=500, detail="Failed to retrieve conversation")
 
 
+@router.get("/api/conversation-search")
+async def search_conversations(
+    request: Request,
+    q: str,
+    page: int = 1,
+    page_size: int = 10,
+    agent_id: Optional[str] = None,
+    username: str = Depends(authenticate),
+):
+    """
+    Full-text search over questions and agent responses, best match first.
+    Each result carries HTML-escaped snippets of the question and of every
+    agent's response, with the matches in ``<b>`` (see conversation_search.py).
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q must not be empty")
+    page = max(1, page)
+    page_size = min(max(1, page_size), 100)
+
+    def run_search():
+        with get_session() as db_session:
+            return conversation_search.search_conversations(
+                db_session,
+                q,
+                offset=(page - 1) * page_size,
+                limit=page_size,
+                agent_id=agent_id,
+            )
+
+    try:
+        found = await asyncio.to_thread(run_search)
+    except Exception as e:
+        logger.error(f"Error searching conversations: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to search conversations")
+    return compressed_json_response(
+        request,
+        {"status": "success", "page": page, "page_size": page_size, **found},
+    )
+
+
+@router.get("/api/export")
+async def export_history(
+    request: Request,
+    table: str,
+    format: str = "ndjson",
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    username: str = Depends(authenticate),
+):
+    """
+    Stream every row of ``table`` (conversations, choices, answer_span_votes
+    or intermediate_step_votes) with ``since <= time < until`` as NDJSON or
+    as a Parquet file, without holding the result in memory.
+    """
+    if table not in history_export.EXPORT_TABLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"table must be one of {', '.join(history_export.EXPORT_TABLES)}",
+        )
+    if format not in history_export.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or parquet")
+    if format == "parquet" and history_export.pa is None:
+        raise HTTPException(status_code=501, detail="Parquet export is not available")
+
+    chunks = history_export.export(
+        database.get_engine(), table, format, since=since, until=until
+    )
+    media_type = history_export.EXPORT_FORMATS[format]
+    headers = {"Content-Disposition": f'attachment; filename="{table}.{format}"'}
+    if format == "parquet":
+        # Already compressed column by column
+        return StreamingResponse(chunks, media_type=media_type, headers=headers)
+    return compressed_streaming_response(
+        request, iterate_in_threadpool(chunks), media_type, headers=headers
+    )
+
+
+def fold_vote_rollups():
+    with database.get_engine().begin() as connection:
+        return vote_rollups.run_rollups(connection)
+
+
+async def vote_rollup_loop():
+    """Fold new votes into the rollup counters every ROLLUP_INTERVAL_SECONDS."""
+    while True:
+        await asyncio.sleep(vote_rollups.ROLLUP_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(fold_vote_rollups)
+        except Exception as e:
+            logger.error(f"Vote rollup run failed: {e}", exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_environment()
+    if database.is_sqlite():
+        # Embedded databases are created and upgraded by the app itself; every
+        # worker does it, serialized by migrations.migration_lock
+        await asyncio.to_thread(migrations.run_migrations, database.get_engine())
+    if WARMUP_ON_STARTUP:
+        await asyncio.to_thread(warmup)
+    rollup_task = None
+    if vote_rollups.ROLLUP_INTERVAL_SECONDS > 0:
+        rollup_task = asyncio.create_task(vote_rollup_loop())
+    yield
+    if rollup_task:
+        rollup_task.cancel()
+    for task in list(_run_tasks):
+        task.cancel()
+    await asyncio.gather(*_run_tasks, return_exceptions=True)
+    if _run_state is not None:
+        await _run_state.close()
+
+
+def create_app() -> FastAPI:
+    """
+    Build the orchestrator app. Nothing expensive happens here: the DB engine
+    and run state backend are created on first use, or at startup when
+    WARMUP_ON_STARTUP=true. Also usable as ``uvicorn --factory app:create_app``.
+    """
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization"],
+    )
+    app.include_router(router)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
     # To run with uvicorn: uvicorn app_cw:app --host 0.0.0.0 --port 5001 --reload
-    uvicorn.run("app:app", host="0.0.0.0", port=5001, reload=True)
+    # Auto-reload is a development convenience and cannot be combined with
+    # multiple workers.
+    workers = web_concurrency()
+    reload = workers == 1 and os.getenv("APP_RELOAD", "true") == "true"
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=5001,
+        reload=reload,
+        workers=workers,
+    )
@@ -0,0 +1,159 @@
+"""
+Content-addressed storage for large, often repeated text.
+
+Agent reports, intermediate steps, citation JSON and voted spans are stored
+once in ``content_blobs`` under the sha256 of their UTF-8 bytes; responses
+and votes keep only the hash. Each stored reference adds one to the blob's
+refcount and ``release_blobs`` takes it back, so ``collect_garbage`` can
+delete blobs nothing points at any more.
+
+All functions take a Session or Connection and run inside the caller's
+transaction.
+"""
+
+import hashlib
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from db_schema import ContentBlob
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+blobs = ContentBlob.__table__
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _dialect_name(executor) -> str:
+    dialect = getattr(executor, "dialect", None) or executor.get_bind().dialect
+    return dialect.name
+
+
+def put_blobs(executor, texts: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """
+    Store ``texts`` and add one reference per text. Returns their hashes in
+    order (None for None), ready to be written next to the referencing row.
+    """
+    hashes: List[Optional[str]] = []
+    references: Counter = Counter()
+    contents: Dict[str, str] = {}
+    for text in texts:
+        if text is None:
+            hashes.append(None)
+            continue
+        digest = content_hash(text)
+        hashes.append(digest)
+        references[digest] += 1
+        contents[digest] = text
+    if not references:
+        return hashes
+
+    # Sorted so concurrent writers lock rows in the same order
+    rows = [
+        {
+            "hash": digest,
+            "content": contents[digest],
+            "size": len(contents[digest].encode("utf-8")),
+            "refcount": references[digest],
+        }
+        for digest in sorted(references)
+    ]
+    dialect_name = _dialect_name(executor)
+    if dialect_name in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+        statement = insert(blobs)
+        executor.execute(
+            statement.on_conflict_do_update(
+                index_elements=[blobs.c.hash],
+                set_={"refcount": blobs.c.refcount + statement.excluded.refcount},
+            ),
+            rows,
+        )
+    else:
+        existing = set(
+            executor.execute(
+                select(blobs.c.hash).where(blobs.c.hash.in_(list(references)))
+            ).scalars()
+        )
+        for row in rows:
+            if row["hash"] in existing:
+                executor.execute(
+                    update(blobs)
+                    .where(blobs.c.hash == row["hash"])
+                    .values(refcount=blobs.c.refcount + row["refcount"])
+                )
+            else:
+                executor.execute(blobs.insert().values(**row))
+    return hashes
+
+
+def get_blobs(executor, hashes: Iterable[Optional[str]]) -> Dict[str, str]:
+    """Texts of ``hashes`` (None entries skipped), fetched in one query."""
+    wanted = {digest for digest in hashes if digest}
+    if not wanted:
+        return {}
+    return dict(
+        executor.execute(
+            select(blobs.c.hash, blobs.c.content).where(blobs.c.hash.in_(wanted))
+        ).all()
+    )
+
+
+class BlobTextCache:
+    """
+    Texts already read by a long scan (export, archival), so blobs that recur
+    across batches are fetched and decompressed once. Blobs never change once
+    stored, so entries stay valid; the least recently used ones are dropped
+    beyond ``max_chars`` characters.
+    """
+
+    def __init__(self, max_chars: int = 64 * 1024 * 1024):
+        self.max_chars = max_chars
+        self._texts: "OrderedDict[str, str]" = OrderedDict()
+        self._chars = 0
+
+    def get_blobs(self, executor, hashes: Iterable[Optional[str]]) -> Dict[str, str]:
+        """Like ``get_blobs``, querying only the hashes not cached yet."""
+        wanted = {digest for digest in hashes if digest}
+        found = {}
+        for digest in wanted:
+            text = self._texts.get(digest)
+            if text is not None:
+                self._texts.move_to_end(digest)
+                found[digest] = text
+        fetched = get_blobs(executor, wanted - found.keys())
+        found.update(fetched)
+        for digest, text in fetched.items():
+            self._texts[digest] = text
+            self._chars += len(text)
+        while self._chars > self.max_chars and self._texts:
+            _, text = self._texts.popitem(last=False)
+            self._chars -= len(text)
+        return found
+
+
+def _add_references(executor, hashes, sign: int) -> None:
+    references = Counter(digest for digest in hashes if digest)
+    for digest in sorted(references):
+        executor.execute(
+            update(blobs)
+            .where(blobs.c.hash == digest)
+            .values(refcount=blobs.c.refcount + sign * references[digest])
+        )
+
+
+def retain_blobs(executor, hashes: Iterable[Optional[str]]) -> None:
+    """Add one reference per hash to blobs that are already stored."""
+    _add_references(executor, hashes, 1)
+
+
+def release_blobs(executor, hashes: Iterable[Optional[str]]) -> None:
+    """Drop one reference per hash, e.g. when the referencing rows are deleted."""
+    _add_references(executor, hashes, -1)
+
+
+def collect_garbage(executor) -> int:
+    """Delete blobs that are no longer referenced. Returns the number deleted."""
+    return executor.execute(delete(blobs).where(blobs.c.refcount <= 0)).rowcount
@@ -0,0 +1,197 @@
+"""
+Backfill and reporting tool for the compressed text columns (see
+compressed_text.py and migration 0004).
+
+- --report: stored size, share of compressed rows and read latency (fetch +
+  decompress) of every compressed text column. Run it before and after the
+  backfill to compare.
+- --train-dict PATH: train a zstd dictionary on a sample of stored reports
+  and write it to PATH. Point TEXT_COMPRESSION_DICT at it (and restart)
+  before backfilling so new and backfilled values use it.
+- default: compress every value that is still plain UTF-8, in small keyset
+  batches each committed on its own, so it can run next to live traffic and
+  be resumed.
+
+Usage:
+    python compress_text_columns.py --report
+    python compress_text_columns.py --train-dict reports.zdict [--samples 2000]
+    python compress_text_columns.py [--batch-size 500]
+"""
+
+import argparse
+import time
+
+import compressed_text
+from compressed_text import ZSTD_MAGIC, compress_text, decompress_text
+from db_schema import ContentBlob, ConversationAgentResponse, DeepResearchUserResponse
+from sqlalchemy import LargeBinary, column, func, select, table, text, update
+
+# (table, primary key, columns) of every CompressedText column
+COMPRESSED_COLUMNS = [
+    (
+        DeepResearchUserResponse.__tablename__,
+        "id",
+        ["conversation_a", "conversation_b"],
+    ),
+    (
+        ConversationAgentResponse.__tablename__,
+        "id",
+        ["response", "intermediate_steps", "citations"],
+    ),
+    (ContentBlob.__tablename__, "hash", ["content"]),
+]
+
+
+def raw_table(name, primary_key, columns):
+    """Lightweight table whose columns read the stored bytes undecoded."""
+    return table(name, column(primary_key), *(column(c, LargeBinary) for c in columns))
+
+
+def _stored_bytes(value) -> bytes:
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return bytes(value)
+
+
+def report(engine, sample: int) -> None:
+    with engine.connect() as connection:
+        size = func.octet_length if engine.dialect.name == "postgresql" else func.length
+        for name, primary_key, columns in COMPRESSED_COLUMNS:
+            raw = raw_table(name, primary_key, columns)
+            if engine.dialect.name == "postgresql":
+                total = connection.execute(
+                    text("SELECT pg_total_relation_size(:name)"), {"name": name}
+                ).scalar_one()
+                print(f"{name}: {total / 1e6:.1f} MB on disk (with TOAST, indexes)")
+            else:
+                print(f"{name}:")
+            for c in columns:
+                rows, stored, compressed = connection.execute(
+                    select(
+                        func.count(raw.c[c]),
+                        func.coalesce(func.sum(size(raw.c[c])), 0),
+                        func.count(raw.c[c]).filter(
+                            func.substr(raw.c[c], 1, 4) == ZSTD_MAGIC
+                        ),
+                    )
+                ).one()
+
+                start = time.perf_counter()
+                values = connection.execute(
+                    select(raw.c[c])
+                    .where(raw.c[c].is_not(None))
+                    .order_by(raw.c[primary_key].desc())
+                    .limit(sample)
+                ).scalars()
+                read_bytes = decoded_chars = fetched = 0
+                for value in values:
+                    data = _stored_bytes(value)
+                    read_bytes += len(data)
+                    decoded_chars += len(decompress_text(data))
+                    fetched += 1
+                elapsed = time.perf_counter() - start
+                line = (
+                    f"  {c:<20} {rows:>9} rows {stored / 1e6:>9.1f} MB stored "
+                    f"{compressed / max(rows, 1):>6.1%} compressed"
+                )
+                if fetched:
+                    line += (
+                        f" | read {fetched} rows: {read_bytes / 1e6:.2f} MB fetched, "
+                        f"{decoded_chars / 1e6:.2f} M chars, "
+                        f"{elapsed / fetched * 1e3:.3f} ms/row"
+                    )
+                print(line)
+
+
+def train_dictionary(engine, path: str, samples: int, dict_size: int) -> None:
+    zstandard = compressed_text.zstandard
+    if zstandard is None:
+        raise SystemExit("zstandard is required to train a dictionary")
+    texts = []
+    with engine.connect() as connection:
+        for name, primary_key, columns in COMPRESSED_COLUMNS:
+            raw = raw_table(name, primary_key, columns)
+            for c in columns:
+                values = connection.execute(
+                    select(raw.c[c])
+                    .where(raw.c[c].is_not(None))
+                    .order_by(func.random())
+                    .limit(samples)
+                ).scalars()
+                texts.extend(
+                    decompress_text(_stored_bytes(v)).encode("utf-8") for v in values
+                )
+    dictionary = zstandard.train_dictionary(dict_size, texts)
+    with open(path, "wb") as f:
+        f.write(dictionary.as_bytes())
+    print(
+        f"Trained dictionary {dictionary.dict_id()} ({dict_size} bytes) on "
+        f"{len(texts)} samples: {path}\n"
+        f"Set TEXT_COMPRESSION_DICT={path} before backfilling."
+    )
+
+
+def backfill(engine, batch_size: int) -> None:
+    for name, primary_key, columns in COMPRESSED_COLUMNS:
+        raw = raw_table(name, primary_key, columns)
+        last_key = None
+        before = after = updated = 0
+        while True:
+            query = select(raw).order_by(raw.c[primary_key]).limit(batch_size)
+            if last_key is not None:
+                query = query.where(raw.c[primary_key] > last_key)
+            with engine.begin() as connection:
+                rows = connection.execute(query).all()
+                for row in rows:
+                    values = {}
+                    for c in columns:
+                        value = getattr(row, c)
+                        if value is None:
+                            continue
+                        data = _stored_bytes(value)
+                        if data[:4] == ZSTD_MAGIC:
+                            continue
+                        compressed = compress_text(data.decode("utf-8"))
+                        if compressed != data:
+                            values[c] = compressed
+                            before += len(data)
+                            after += len(compressed)
+                    if values:
+                        connection.execute(
+                            update(raw)
+                            .where(raw.c[primary_key] == row[0])
+                            .values(**values)
+                        )
+                        updated += 1
+            if not rows:
+                break
+            last_key = rows[-1][0]
+        print(
+            f"{name}: compressed {updated} rows, "
+            f"{before / 1e6:.1f} MB -> {after / 1e6:.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    from database import get_engine
+    from dotenv import load_dotenv
+
+    load_dotenv("../../.env")  # Load from parent directory .env file
+    load_dotenv()  # Load from .env file and environment variables
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--report", action="store_true")
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--train-dict", metavar="PATH")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--dict-size", type=int, default=112640)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.report:
+        report(engine, args.sample)
+    elif args.train_dict:
+        train_dictionary(engine, args.train_dict, args.samples, args.dict_size)
+    else:
+        backfill(engine, args.batch_size)
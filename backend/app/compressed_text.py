@@ -0,0 +1,143 @@
+"""
+Column type that stores large text (agent reports, intermediate steps,
+citation JSON) as zstd-compressed bytes.
+
+Values are compressed on write and decompressed when the column is loaded;
+the big columns are also mapped as deferred in db_schema.py, so ORM queries
+that do not touch them never read or decompress them. Reads recognise the
+zstd frame header, so rows that still hold plain UTF-8 (written before the
+column was converted, or below the size threshold) are returned unchanged
+and the backfill can run while the app is serving.
+
+Settings are read from the environment:
+
+- TEXT_COMPRESSION_ENABLED (default "true"; "false" writes plain UTF-8)
+- TEXT_COMPRESSION_LEVEL (default 3)
+- TEXT_COMPRESSION_MIN_SIZE: smallest value worth compressing (default 256)
+- TEXT_COMPRESSION_DICT: comma-separated paths of zstd dictionaries trained
+  with compress_text_columns.py --train-dict. The first one is used for new
+  values; all of them are loaded so older values stay readable.
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional compression
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+TEXT_COMPRESSION_ENABLED = (
+    os.getenv("TEXT_COMPRESSION_ENABLED", "true").lower() == "true"
+)
+TEXT_COMPRESSION_LEVEL = int(os.getenv("TEXT_COMPRESSION_LEVEL", "3"))
+TEXT_COMPRESSION_MIN_SIZE = int(os.getenv("TEXT_COMPRESSION_MIN_SIZE", "256"))
+TEXT_COMPRESSION_DICT = os.getenv("TEXT_COMPRESSION_DICT", "")
+
+# Every zstd frame starts with this magic number. A UTF-8 string can never
+# start with it (0xB5 is a continuation byte), so plain rows are unambiguous.
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+_dictionaries: Optional[Dict[int, "zstandard.ZstdCompressionDict"]] = None
+_write_dictionary_id = 0
+_dictionary_lock = threading.Lock()
+_local = threading.local()
+
+
+def load_dictionaries() -> Dict[int, "zstandard.ZstdCompressionDict"]:
+    """Dictionaries from TEXT_COMPRESSION_DICT keyed by dictionary id."""
+    global _dictionaries, _write_dictionary_id
+    if _dictionaries is None:
+        with _dictionary_lock:
+            if _dictionaries is None:
+                dictionaries = {}
+                paths = [p.strip() for p in TEXT_COMPRESSION_DICT.split(",")]
+                for i, path in enumerate(p for p in paths if p):
+                    with open(path, "rb") as f:
+                        dictionary = zstandard.ZstdCompressionDict(f.read())
+                    dictionaries[dictionary.dict_id()] = dictionary
+                    if i == 0:
+                        _write_dictionary_id = dictionary.dict_id()
+                _dictionaries = dictionaries
+    return _dictionaries
+
+
+def _compressor() -> "zstandard.ZstdCompressor":
+    # zstd contexts are not thread safe; keep one per thread
+    compressor = getattr(_local, "compressor", None)
+    if compressor is None:
+        dictionary = load_dictionaries().get(_write_dictionary_id)
+        compressor = zstandard.ZstdCompressor(
+            level=TEXT_COMPRESSION_LEVEL, dict_data=dictionary
+        )
+        _local.compressor = compressor
+    return compressor
+
+
+def _decompressor(dictionary_id: int) -> "zstandard.ZstdDecompressor":
+    decompressors = getattr(_local, "decompressors", None)
+    if decompressors is None:
+        decompressors = _local.decompressors = {}
+    decompressor = decompressors.get(dictionary_id)
+    if decompressor is None:
+        dictionary = load_dictionaries().get(dictionary_id) if dictionary_id else None
+        if dictionary_id and dictionary is None:
+            raise ValueError(
+                f"Value was compressed with zstd dictionary {dictionary_id}, "
+                "which is not listed in TEXT_COMPRESSION_DICT"
+            )
+        decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+        decompressors[dictionary_id] = decompressor
+    return decompressor
+
+
+def is_compressed(data: bytes) -> bool:
+    return data[:4] == ZSTD_MAGIC
+
+
+def compress_text(value: str) -> bytes:
+    """Encode ``value`` for storage: zstd when worthwhile, else plain UTF-8."""
+    data = value.encode("utf-8")
+    if (
+        not TEXT_COMPRESSION_ENABLED
+        or zstandard is None
+        or len(data) < TEXT_COMPRESSION_MIN_SIZE
+    ):
+        return data
+    compressed = _compressor().compress(data)
+    return compressed if len(compressed) < len(data) else data
+
+
+def decompress_text(data: bytes) -> str:
+    if not is_compressed(data):
+        return data.decode("utf-8")
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to read compressed text columns")
+    dictionary_id = zstandard.get_frame_parameters(data).dict_id
+    return _decompressor(dictionary_id).decompress(data).decode("utf-8")
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored as (usually zstd-compressed) bytes."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # Column not converted to bytes yet (see migration 0004)
+            return value
+        return decompress_text(bytes(value))
@@ -0,0 +1,361 @@
+"""
+Full-text search over saved conversations.
+
+On Postgres every conversation carries a ``search_vector`` tsvector (migration
+0008) built when it is saved: the question with weight A and the agents'
+responses with weight B. Responses live compressed in content_blobs, so the
+document is assembled in Python and handed to ``to_tsvector``. Searches use
+``websearch_to_tsquery`` (quoted phrases, ``or``, ``-term``) against the GIN
+index, rank with ``ts_rank_cd`` and highlight the question and the responses
+of the returned page with ``ts_headline``.
+
+Other databases fall back to a scan: every conversation's question and
+responses are matched in Python against the query words, ranked by how often
+they occur, and snippets are cut around the first match.
+
+Questions and responses are user and model text, so highlights are returned
+HTML-escaped, with only the ``<b>`` tags around the matches left as markup.
+
+Settings are read from the environment:
+
+- SEARCH_CONFIG: text search configuration (default "english")
+- SEARCH_MAX_CHARS: characters of each response that are indexed and
+  highlighted (default 100000; a tsvector is limited to 1 MB)
+
+Usage:
+    python conversation_search.py --backfill [--batch-size 200]
+    python conversation_search.py "query words"
+"""
+
+import argparse
+import heapq
+import html
+import math
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from blob_store import BlobTextCache
+from db_schema import Conversation, ConversationAgentResponse
+from sqlalchemy import exists, func, literal_column, select, text, update
+
+SEARCH_CONFIG = os.getenv("SEARCH_CONFIG", "english")
+SEARCH_MAX_CHARS = int(os.getenv("SEARCH_MAX_CHARS", "100000"))
+
+HEADLINE_OPTIONS = (
+    "MaxFragments=2, MaxWords=30, MinWords=12, FragmentDelimiter= ... , "
+    "StartSel=<b>, StopSel=</b>"
+)
+SNIPPET_WORDS = 30
+
+_WORD = re.compile(r"\w+")
+_WORD_SPLIT = re.compile(r"(\w+)")
+
+
+def _dialect_name(executor) -> str:
+    dialect = getattr(executor, "dialect", None) or executor.get_bind().dialect
+    return dialect.name
+
+
+def _responses_document(responses: Iterable[Optional[str]]) -> str:
+    return "\n\n".join(
+        response[:SEARCH_MAX_CHARS] for response in responses if response
+    )
+
+
+def search_vector(executor, question: str, responses: Iterable[Optional[str]]):
+    """
+    SQL expression for a conversation's ``search_vector``, to assign when it
+    is saved, or None on databases without tsvector.
+    """
+    if _dialect_name(executor) != "postgresql":
+        return None
+    return func.setweight(
+        func.to_tsvector(SEARCH_CONFIG, question), literal_column("'A'")
+    ).op("||")(
+        func.setweight(
+            func.to_tsvector(SEARCH_CONFIG, _responses_document(responses)),
+            literal_column("'B'"),
+        )
+    )
+
+
+def _agent_responses(
+    executor, conversation_ids: Sequence, cache: BlobTextCache
+) -> Dict[Any, List[Dict[str, Any]]]:
+    """id, name and response text of each agent, grouped by conversation."""
+    responses = ConversationAgentResponse
+    rows = executor.execute(
+        select(
+            responses.conversation_id,
+            responses.agent_id,
+            responses.agent_name,
+            responses.response_hash,
+            responses.response,
+        )
+        .where(responses.conversation_id.in_(conversation_ids))
+        .order_by(responses.conversation_id, responses.position)
+    ).all()
+    texts = cache.get_blobs(executor, (row.response_hash for row in rows))
+    agents: Dict[Any, List[Dict[str, Any]]] = {key: [] for key in conversation_ids}
+    for row in rows:
+        agents[row.conversation_id].append(
+            {
+                "id": row.agent_id,
+                "name": row.agent_name,
+                "response": (
+                    texts.get(row.response_hash) if row.response_hash else row.response
+                )
+                or "",
+            }
+        )
+    return agents
+
+
+def _result(row, agents: List[Dict[str, Any]], rank: float, highlights) -> Dict:
+    question_highlight, response_highlights = highlights
+    return {
+        "id": str(row.id),
+        "session_id": str(row.session_id),
+        "timestamp": row.timestamp.isoformat(),
+        "question": row.question,
+        "rank": round(float(rank), 6),
+        "highlight": question_highlight,
+        "agents": [
+            {"id": agent["id"], "name": agent["name"], "highlight": highlight}
+            for agent, highlight in zip(agents, response_highlights)
+        ],
+    }
+
+
+# Postgres
+
+
+def _postgres_search(executor, query, offset, limit, agent_id):
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    matches = Conversation.search_vector.bool_op("@@")(tsquery)
+    if agent_id:
+        matches = matches & exists().where(
+            (ConversationAgentResponse.conversation_id == Conversation.id)
+            & (ConversationAgentResponse.agent_id == agent_id)
+        )
+    rank = func.ts_rank_cd(Conversation.search_vector, tsquery).label("rank")
+    rows = executor.execute(
+        select(
+            Conversation.id,
+            Conversation.session_id,
+            Conversation.timestamp,
+            Conversation.question,
+            rank,
+        )
+        .where(matches)
+        .order_by(rank.desc(), Conversation.timestamp.desc())
+        .offset(offset)
+        .limit(limit)
+    ).all()
+    total = executor.execute(
+        select(func.count()).select_from(Conversation).where(matches)
+    ).scalar_one()
+    if not rows:
+        return [], total
+
+    agents = _agent_responses(executor, [row.id for row in rows], BlobTextCache())
+    documents = []
+    for row in rows:
+        documents.append(html.escape(row.question))
+        documents += [
+            html.escape(agent["response"][:SEARCH_MAX_CHARS])
+            for agent in agents[row.id]
+        ]
+    # One round trip for all the highlights of the page. The documents are
+    # escaped, so the StartSel/StopSel tags are the only markup in them
+    headlines = iter(
+        executor.execute(
+            text(
+                "SELECT ts_headline(CAST(:config AS regconfig), document, "
+                "websearch_to_tsquery(CAST(:config AS regconfig), :query), :options) "
+                "FROM unnest(CAST(:documents AS text[])) WITH ORDINALITY "
+                "AS d(document, n) ORDER BY n"
+            ),
+            {
+                "config": SEARCH_CONFIG,
+                "query": query,
+                "options": HEADLINE_OPTIONS,
+                "documents": documents,
+            },
+        ).scalars()
+    )
+    results = []
+    for row in rows:
+        question_highlight = next(headlines)
+        response_highlights = [next(headlines) for _ in agents[row.id]]
+        results.append(
+            _result(
+                row, agents[row.id], row.rank, (question_highlight, response_highlights)
+            )
+        )
+    return results, total
+
+
+# Fallback scan
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _snippet(text: str, terms: set) -> str:
+    words = list(_WORD.finditer(text))
+    first = next(
+        (i for i, match in enumerate(words) if match.group().lower() in terms), None
+    )
+    if first is None:
+        return ""
+    window = words[max(0, first - SNIPPET_WORDS // 3) :][:SNIPPET_WORDS]
+    start, end = window[0].start(), window[-1].end()
+    # Words at odd indexes, the text between them at even ones
+    pieces = _WORD_SPLIT.split(text[start:end])
+    snippet = "".join(
+        f"<b>{piece}</b>" if i % 2 and piece.lower() in terms else html.escape(piece)
+        for i, piece in enumerate(pieces)
+    )
+    return snippet.replace("\n", " ")
+
+
+def _fallback_search(executor, query, offset, limit, agent_id, batch_size=500):
+    terms = set(_words(query))
+    if not terms:
+        return [], 0
+    cache = BlobTextCache()
+    conversations = executor.execute(
+        select(
+            Conversation.id,
+            Conversation.session_id,
+            Conversation.timestamp,
+            Conversation.question,
+        ).execution_options(yield_per=batch_size)
+    )
+    best: List = []  # min-heap of the offset + limit best matches
+    total = 0
+    for rows in conversations.partitions():
+        agents = _agent_responses(executor, [row.id for row in rows], cache)
+        for row in rows:
+            if agent_id and not any(a["id"] == agent_id for a in agents[row.id]):
+                continue
+            question_words = _words(row.question)
+            response_words = _words(
+                " ".join(
+                    agent["response"][:SEARCH_MAX_CHARS] for agent in agents[row.id]
+                )
+            )
+            found = set(question_words) | set(response_words)
+            if not terms <= found:
+                continue
+            total += 1
+            # Question hits count double, like weight A over B in Postgres
+            hits = 2 * sum(word in terms for word in question_words) + sum(
+                word in terms for word in response_words
+            )
+            rank = hits / math.log(len(question_words) + len(response_words) + 2)
+            entry = (rank, row.timestamp, str(row.id), row, agents[row.id])
+            if len(best) < offset + limit:
+                heapq.heappush(best, entry)
+            else:
+                heapq.heappushpop(best, entry)
+
+    page = sorted(best, reverse=True)[offset : offset + limit]
+    return [
+        _result(
+            row,
+            row_agents,
+            rank,
+            (
+                _snippet(row.question, terms),
+                [_snippet(agent["response"], terms) for agent in row_agents],
+            ),
+        )
+        for rank, _, _, row, row_agents in page
+    ], total
+
+
+def search_conversations(
+    executor,
+    query: str,
+    offset: int = 0,
+    limit: int = 10,
+    agent_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Conversations matching ``query``, best first, with highlighted snippets
+    of the question and each agent's response, and the number of matches.
+    """
+    if _dialect_name(executor) == "postgresql":
+        results, total = _postgres_search(executor, query, offset, limit, agent_id)
+    else:
+        results, total = _fallback_search(executor, query, offset, limit, agent_id)
+    return {"results": results, "total_count": total}
+
+
+def backfill_search_vectors(engine, batch_size: int = 200) -> int:
+    """
+    Fill ``search_vector`` for conversations saved before migration 0008, in
+    keyset batches each committed on its own. Returns the number updated.
+    """
+    if engine.dialect.name != "postgresql":
+        return 0
+    updated = 0
+    last_id = None
+    cache = BlobTextCache()
+    while True:
+        query = (
+            select(Conversation.id, Conversation.question)
+            .where(Conversation.search_vector.is_(None))
+            .order_by(Conversation.id)
+            .limit(batch_size)
+        )
+        if last_id is not None:
+            query = query.where(Conversation.id > last_id)
+        with engine.begin() as connection:
+            rows = connection.execute(query).all()
+            agents = _agent_responses(connection, [row.id for row in rows], cache)
+            for row in rows:
+                connection.execute(
+                    update(Conversation)
+                    .where(Conversation.id == row.id)
+                    .values(
+                        search_vector=search_vector(
+                            connection,
+                            row.question,
+                            (agent["response"] for agent in agents[row.id]),
+                        )
+                    )
+                )
+        if not rows:
+            return updated
+        updated += len(rows)
+        last_id = rows[-1].id
+
+
+if __name__ == "__main__":
+    import json
+
+    from database import get_engine
+    from dotenv import load_dotenv
+
+    load_dotenv("../../.env")  # Load from parent directory .env file
+    load_dotenv()  # Load from .env file and environment variables
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("query", nargs="?")
+    parser.add_argument("--backfill", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.backfill:
+        print(
+            f"Indexed {backfill_search_vectors(engine, args.batch_size)} conversations"
+        )
+    if args.query:
+        with engine.connect() as connection:
+            print(json.dumps(search_conversations(connection, args.query), indent=2))
@@ -1,36 +1,17 @@
-import os
-
-from db_schema import (
-    AnswerSpanVote,
-    ConversationHistory,
-    DeepResearchAgent,
-    DeepResearchUserResponse,
-    IntermediateStepVote,
-)
+from database import get_engine
 from dotenv import load_dotenv
-from sqlalchemy import MetaData, create_engine
-from sqlalchemy.ext.declarative import declarative_base
+from migrations import run_migrations
+from sqlalchemy import MetaData
 
 load_dotenv("../../.env")  # Load from parent directory .env file
 load_dotenv()  # Load from .env file and environment variables
 
-DB_USERNAME = os.getenv("DB_USERNAME")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_ENDPOINT = os.getenv("DB_ENDPOINT")
-DB_PORT = 5432
-DB_NAME = os.getenv("DB_NAME")
-
-DB_URI = f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_ENDPOINT}:{DB_PORT}/{DB_NAME}"
-print(DB_URI)
-engine = create_engine(DB_URI, echo=False)
-
-Base = declarative_base()
+# Postgres from the DB_* settings, or DATABASE_URL (e.g. sqlite:///orchestrator.db)
+engine = get_engine()
+print(engine.url.render_as_string(hide_password=True))
 
-DeepResearchAgent.__table__.create(bind=engine, checkfirst=True)
-DeepResearchUserResponse.__table__.create(bind=engine, checkfirst=True)
-AnswerSpanVote.__table__.create(bind=engine, checkfirst=True)
-IntermediateStepVote.__table__.create(bind=engine, checkfirst=True)
-ConversationHistory.__table__.create(bind=engine, checkfirst=True)
+# Create the tables and apply pending schema migrations (see migrations.py)
+print("Applied migrations:", run_migrations(engine))
 
 
 md = MetaData()
@@ -0,0 +1,135 @@
+"""
+Database engine and session handling for the orchestrator.
+
+The engine is built on first use instead of at import time, so importing the
+app (uvicorn workers, scripts, benchmarks) neither loads the database driver
+nor depends on the environment having been loaded yet.
+
+DATABASE_URL selects the database; without it the Postgres URL is built from
+DB_USERNAME, DB_PASSWORD, DB_ENDPOINT and DB_NAME. A ``sqlite:///path.db``
+URL runs the orchestrator on an embedded SQLite file in WAL mode (readers do
+not block the writer), for single-node deployments, local runs and load tests
+without a database server; ``sqlite://`` keeps everything in memory. SQLite
+waits up to SQLITE_BUSY_TIMEOUT_MS (default 5000) for another writer.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+from db_metrics import TimedQueuePool, instrument
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+DB_PORT = 5432
+
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+_lock = threading.Lock()
+
+
+def web_concurrency() -> int:
+    """Number of worker processes running on this node."""
+    return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def worker_pool_settings() -> Tuple[int, int]:
+    """
+    Pool size and overflow for this worker. DB_POOL_SIZE and DB_MAX_OVERFLOW
+    are the connection budget for the whole node and are split between workers.
+    """
+    workers = web_concurrency()
+    pool_size = int(os.getenv("DB_POOL_SIZE", "5"))
+    max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    return max(1, pool_size // workers), max(0, max_overflow // workers)
+
+
+def database_url() -> str:
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    return (
+        f"postgresql://{os.getenv('DB_USERNAME')}:{os.getenv('DB_PASSWORD')}@"
+        f"{os.getenv('DB_ENDPOINT')}:{DB_PORT}/{os.getenv('DB_NAME')}"
+        f"?keepalives=1&keepalives_idle=30"
+        f"&keepalives_interval=10&keepalives_count=5"
+    )
+
+
+def is_sqlite(url: Optional[str] = None) -> bool:
+    return make_url(url or database_url()).get_backend_name() == "sqlite"
+
+
+def _configure_sqlite(dbapi_connection, connection_record) -> None:
+    busy_timeout = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    cursor = dbapi_connection.cursor()
+    # In-memory databases answer "memory" and stay in their own mode
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # Durable at checkpoints rather than at every commit, as WAL allows
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+    cursor.close()
+
+
+def create_database_engine(url: Optional[str] = None, **pool_options) -> Engine:
+    """
+    Engine for ``url`` (default: database_url()). Postgres engines get
+    ``pool_options``; SQLite engines are set up for WAL and shared between
+    threads, with a single shared connection when in memory.
+    """
+    url = url or database_url()
+    if not is_sqlite(url):
+        return create_engine(url, echo=False, **pool_options)
+
+    database = make_url(url).database
+    if not database or database == ":memory:":
+        pool_options = {"poolclass": StaticPool}
+    engine = create_engine(
+        url, echo=False, connect_args={"check_same_thread": False}, **pool_options
+    )
+    event.listen(engine, "connect", _configure_sqlite)
+    return engine
+
+
+def get_engine() -> Engine:
+    """Return the process-wide engine, creating it on first call."""
+    global _engine, _session_factory
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                pool_size, max_overflow = worker_pool_settings()
+                engine = create_database_engine(
+                    poolclass=TimedQueuePool,  # QueuePool timing checkout waits
+                    pool_size=pool_size,  # Number of connections to keep open
+                    max_overflow=max_overflow,  # Max extra connections when full
+                    pool_timeout=30,  # Seconds to wait for a connection from pool
+                    pool_recycle=1800,  # Recycle connections after 30 minutes
+                    pool_pre_ping=True,
+                )
+                instrument(engine)  # see db_metrics.py
+                _session_factory = sessionmaker(bind=engine)
+                _engine = engine
+    return _engine
+
+
+@contextmanager
+def get_session() -> Iterator[Session]:
+    get_engine()
+    session = _session_factory()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def warmup() -> None:
+    """Create the engine and open one pooled connection ahead of traffic."""
+    with get_engine().connect():
+        pass
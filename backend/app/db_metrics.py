@@ -0,0 +1,269 @@
+"""
+Connection pool and query instrumentation for the orchestrator's engine.
+
+SQLAlchemy event hooks record, per worker process:
+
+- how long each pool checkout waited for a connection (TimedQueuePool), and
+  how many checkouts timed out
+- connections in use (current and highest seen), new and invalidated
+  connections
+- the duration of every statement, in a histogram per normalized statement
+  (literals, parameters and IN lists replaced by ``?``), so the same query
+  with different values lands in one row
+
+Statements slower than SLOW_QUERY_MS are logged as warnings (without their
+parameters). ``GET /api/debug/db`` returns the pool state and these numbers.
+
+Settings are read from the environment:
+
+- DB_METRICS_ENABLED (default "true")
+- SLOW_QUERY_MS: slow-query log threshold (default 500, 0 disables the log)
+- DB_METRICS_MAX_STATEMENTS: distinct statements tracked; later ones are
+  counted under "(other)" (default 500)
+"""
+
+import bisect
+import functools
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+DB_METRICS_ENABLED = os.getenv("DB_METRICS_ENABLED", "true").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+MAX_STATEMENTS = int(os.getenv("DB_METRICS_MAX_STATEMENTS", "500"))
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+OTHER_STATEMENTS = "(other)"
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_PARAMETER = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\$\d+")
+_IN_LIST = re.compile(
+    r"\bIN\s*\(\s*(?:__\[POSTCOMPILE_\w+\]|\?(?:\s*,\s*\?)*)\s*\)", re.I
+)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.I)
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_statement(statement: str) -> str:
+    """
+    ``statement`` with whitespace collapsed, literals and parameters replaced
+    by ``?`` and IN / multi-row VALUES lists folded into one.
+    """
+    normalized = _WHITESPACE.sub(" ", statement).strip()
+    normalized = _STRING.sub("?", normalized)
+    normalized = _PARAMETER.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _IN_LIST.sub("IN (?)", normalized)
+    return _VALUES_LIST.sub(r"VALUES \1", normalized)
+
+
+class Histogram:
+    """Count, total, maximum and bucket counts of durations in milliseconds."""
+
+    __slots__ = ("count", "total_ms", "max_ms", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)  # the last one is open-ended
+
+    def observe(self, ms: float) -> None:
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the bucket holding the ``fraction`` quantile."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return round(min(float(bound), self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {
+                **{f"le_{bound}": n for bound, n in zip(BUCKETS_MS, self.buckets)},
+                "inf": self.buckets[-1],
+            },
+        }
+
+
+class DatabaseMetrics:
+    """Pool and statement numbers of one process, safe to update from threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """Start over; connections currently in use stay counted."""
+        with self._lock:
+            self.checkout_wait = Histogram()
+            self.checkout_timeouts = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.max_in_use = self.in_use
+            self.slow_queries = 0
+            self.statements: Dict[str, Histogram] = {}
+            self.started_at = time.time()
+
+    def checkout_waited(self, ms: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.checkout_wait.observe(ms)
+            self.checkout_timeouts += timed_out
+
+    def checked_out(self) -> None:
+        with self._lock:
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def checked_in(self) -> None:
+        with self._lock:
+            self.in_use -= 1
+
+    def connected(self) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def invalidated(self) -> None:
+        with self._lock:
+            self.invalidations += 1
+
+    def statement_ran(self, statement: str, ms: float) -> None:
+        key = normalize_statement(statement)
+        with self._lock:
+            histogram = self.statements.get(key)
+            if histogram is None:
+                if len(self.statements) >= MAX_STATEMENTS:
+                    key = OTHER_STATEMENTS
+                histogram = self.statements.setdefault(key, Histogram())
+            histogram.observe(ms)
+            if SLOW_QUERY_MS and ms >= SLOW_QUERY_MS:
+                self.slow_queries += 1
+
+    def snapshot(self, top: int = 20, order_by: str = "total_ms") -> Dict[str, Any]:
+        """Pool counters and the ``top`` statements by ``order_by``."""
+        with self._lock:
+            statements = [
+                {"statement": statement, **histogram.summary()}
+                for statement, histogram in self.statements.items()
+            ]
+            pool = {
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "checkout_timeouts": self.checkout_timeouts,
+                "checkout_wait": self.checkout_wait.summary(),
+            }
+            slow_queries = self.slow_queries
+            since = self.started_at
+        statements.sort(key=lambda row: row[order_by] or 0, reverse=True)
+        return {
+            "since": since,
+            "pool": pool,
+            "slow_query_ms": SLOW_QUERY_MS,
+            "slow_queries": slow_queries,
+            "distinct_statements": len(statements),
+            "statements": statements[:top],
+        }
+
+
+metrics = DatabaseMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    # Log under sqlalchemy.pool like QueuePool, not under this module
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.TimedQueuePool"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            metrics.checkout_waited((time.perf_counter() - start) * 1000, True)
+            raise
+        metrics.checkout_waited((time.perf_counter() - start) * 1000)
+        return connection
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    ms = (time.perf_counter() - start) * 1000
+    metrics.statement_ran(statement, ms)
+    if SLOW_QUERY_MS and ms >= SLOW_QUERY_MS:
+        text = _WHITESPACE.sub(" ", statement).strip()
+        logger.warning(f"Slow query ({ms:.0f} ms): {text[:2000]}")
+
+
+def instrument(engine: Engine) -> Engine:
+    """Attach the metric hooks to ``engine`` (once) and return it."""
+    if not DB_METRICS_ENABLED or event.contains(
+        engine, "before_cursor_execute", _before_cursor_execute
+    ):
+        return engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine.pool, "checkout", lambda *args: metrics.checked_out())
+    event.listen(engine.pool, "checkin", lambda *args: metrics.checked_in())
+    event.listen(engine.pool, "connect", lambda *args: metrics.connected())
+    event.listen(engine.pool, "invalidate", lambda *args: metrics.invalidated())
+    return engine
+
+
+def pool_state(engine: Engine) -> Dict[str, Any]:
+    """Current state of ``engine``'s pool as the pool itself reports it."""
+    pool = engine.pool
+    state: Dict[str, Any] = {"class": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        state.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+        )
+    return state
+
+
+def report(engine: Engine, top: int = 20, order_by: str = "total_ms") -> Dict:
+    """Pool state plus the collected metrics, for the debug endpoint."""
+    return {"pool_state": pool_state(engine), **metrics.snapshot(top, order_by)}
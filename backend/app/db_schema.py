@@ -1,17 +1,73 @@
 import uuid
 
 import sqlalchemy
-from sqlalchemy import Column, String, Text
-from sqlalchemy.dialects.postgresql import UUID as pgUUID
+from compressed_text import CompressedText
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    TypeDecorator,
+    Uuid,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
+from sqlalchemy.sql.functions import FunctionElement
 
 Base = declarative_base()
 
+# The schema runs on Postgres and on SQLite (see database.py). Uuid is a native
+# uuid column in Postgres and 32 hex characters elsewhere; ids are generated
+# in Python for ORM inserts, and by the database for raw SQL ones.
+
+
+class UUIDType(TypeDecorator):
+    """Uuid that also accepts ids given as strings, as request payloads do."""
+
+    impl = Uuid
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        return uuid.UUID(str(value))
+
+
+class random_uuid(FunctionElement):
+    """Server-side default for uuid primary keys."""
+
+    type = UUIDType()
+    inherit_cache = True
+
+
+@compiles(random_uuid)
+def _random_uuid_default(element, compiler, **kw):
+    return "gen_random_uuid()"
+
+
+@compiles(random_uuid, "sqlite")
+def _random_uuid_sqlite(element, compiler, **kw):
+    # Same text as Uuid stores on SQLite (hex, no dashes)
+    return "(lower(hex(randomblob(16))))"
+
+
+class SchemaMigration(Base):
+    """Versions applied by migrations.py, one row per migration."""
+
+    __tablename__ = "schema_migrations"
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(128), nullable=False)
+    applied_at = Column(sqlalchemy.TIMESTAMP, server_default=func.now())
+
 
 class DeepResearchAgent(Base):
     __tablename__ = "deepresearch_agents"
-    agent_uuid = Column(pgUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    agent_uuid = Column(UUIDType, primary_key=True, default=uuid.uuid4)
     agent_id = Column(String(64), nullable=False, unique=True)
     agent_name = Column(Text)
 
@@ -19,46 +75,191 @@ class DeepResearchAgent(Base):
 class DeepResearchUserResponse(Base):
     __tablename__ = "deepresearch_user_response"
     id = Column(String(128), primary_key=True)
-    session_id = Column(pgUUID(as_uuid=True), nullable=False, unique=True)
+    session_id = Column(UUIDType, nullable=False, unique=True)
     agentid_a = Column(String(128))
     agentid_b = Column(String(128))
     question = Column(String(65535))
-    conversation_a = Column(Text)
-    conversation_b = Column(Text)
+    # Legacy inline copies; new rows reference content_blobs by hash instead
+    conversation_a = deferred(Column(CompressedText))
+    conversation_b = deferred(Column(CompressedText))
+    conversation_a_hash = Column(String(64))
+    conversation_b_hash = Column(String(64))
     userresponse = Column(String(128))
     lastupdated = Column(sqlalchemy.TIMESTAMP, server_default=func.now())
 
+    __table_args__ = (
+        Index(
+            "ix_deepresearch_user_response_agentid_a_lastupdated",
+            "agentid_a",
+            "lastupdated",
+        ),
+        Index(
+            "ix_deepresearch_user_response_agentid_b_lastupdated",
+            "agentid_b",
+            "lastupdated",
+        ),
+        Index("ix_deepresearch_user_response_lastupdated", "lastupdated"),
+    )
+
 
 class AnswerSpanVote(Base):
     __tablename__ = "answer_span_votes"
     id = Column(
-        pgUUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid()
+        UUIDType, primary_key=True, default=uuid.uuid4, server_default=random_uuid()
     )
-    session_id = Column(pgUUID(as_uuid=True), nullable=False)
+    session_id = Column(UUIDType, nullable=False)
     timestamp = Column(sqlalchemy.TIMESTAMP, server_default=func.now())
     agent_id = Column(String(128), nullable=False)
     vote = Column(String(10), nullable=False)
-    highlighted_text = Column(Text, nullable=False)
+    # New votes point into the agent's saved response blob (response_hash +
+    # span offsets) or, if the span cannot be located, into a blob of their own
+    # (highlighted_text_hash). highlighted_text is only set on legacy rows.
+    highlighted_text = Column(Text)
+    highlighted_text_hash = Column(String(64))
+    response_hash = Column(String(64))
+    span_start = Column(Integer)
+    span_end = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_answer_span_votes_session_id", "session_id"),
+        Index("ix_answer_span_votes_agent_id_timestamp", "agent_id", "timestamp"),
+        Index("ix_answer_span_votes_timestamp", "timestamp"),
+    )
 
 
 class IntermediateStepVote(Base):
     __tablename__ = "intermediate_step_votes"
     id = Column(
-        pgUUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid()
+        UUIDType, primary_key=True, default=uuid.uuid4, server_default=random_uuid()
     )
-    session_id = Column(pgUUID(as_uuid=True), nullable=False)
+    session_id = Column(UUIDType, nullable=False)
     timestamp = Column(sqlalchemy.TIMESTAMP, server_default=func.now())
     agent_id = Column(String(128), nullable=False)
     vote = Column(String(10), nullable=False)
-    intermediate_step = Column(Text, nullable=False)
+    intermediate_step = Column(Text)  # legacy inline copy
+    intermediate_step_hash = Column(String(64))
+    step_type = Column(String(64))  # see vote_rollups.normalize_step_type
+
+    __table_args__ = (
+        Index("ix_intermediate_step_votes_session_id", "session_id"),
+        Index("ix_intermediate_step_votes_agent_id_timestamp", "agent_id", "timestamp"),
+        Index("ix_intermediate_step_votes_timestamp", "timestamp"),
+    )
+
+
+# Conversations, agent responses and both vote tables are partitioned by month
+# on timestamp in Postgres (migration 0007): their primary key there is
+# (id, timestamp), unique indexes include timestamp and the foreign key from
+# conversation_agent_responses is not enforced.
+
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+    id = Column(
+        UUIDType, primary_key=True, default=uuid.uuid4, server_default=random_uuid()
+    )
+    session_id = Column(UUIDType, nullable=False)
+    timestamp = Column(sqlalchemy.TIMESTAMP, server_default=func.now())
+    question = Column(Text, nullable=False)
+    # Weighted question + responses for full-text search, GIN-indexed in
+    # Postgres (migration 0008, see conversation_search.py); unused elsewhere
+    search_vector = deferred(
+        Column(Text().with_variant(postgresql.TSVECTOR(), "postgresql"))
+    )
+
+    __table_args__ = (
+        Index("ix_conversations_session_id", "session_id"),
+        Index("ix_conversations_timestamp", "timestamp"),
+    )
+
+
+class ConversationAgentResponse(Base):
+    """One agent's answer within a conversation (one row per agent)."""
+
+    __tablename__ = "conversation_agent_responses"
+    id = Column(
+        UUIDType, primary_key=True, default=uuid.uuid4, server_default=random_uuid()
+    )
+    conversation_id = Column(
+        UUIDType,
+        ForeignKey("conversations.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    position = Column(Integer, nullable=False)  # display order, 0 = agent A
+    timestamp = Column(sqlalchemy.TIMESTAMP, server_default=func.now())
+    agent_id = Column(String(128), nullable=False)  # agent_id like 'perplexity'
+    agent_name = Column(String(255), nullable=False)  # human readable name
+    # Texts live in content_blobs; the inline columns only hold legacy rows
+    response_hash = Column(String(64))
+    intermediate_steps_hash = Column(String(64))
+    citations_hash = Column(String(64))  # JSON string of citations
+    response = deferred(Column(CompressedText))
+    intermediate_steps = deferred(Column(CompressedText))
+    citations = deferred(Column(CompressedText))
+
+    __table_args__ = (
+        Index(
+            "ix_conversation_agent_responses_conversation_position",
+            "conversation_id",
+            "position",
+            unique=True,
+        ),
+        Index(
+            "ix_conversation_agent_responses_agent_id_timestamp",
+            "agent_id",
+            "timestamp",
+        ),
+        Index("ix_conversation_agent_responses_timestamp", "timestamp"),
+    )
+
+
+class ContentBlob(Base):
+    """
+    Deduplicated text (reports, intermediate steps, citation JSON, voted
+    spans) keyed by the sha256 of its UTF-8 bytes. refcount counts the rows
+    pointing at it; see blob_store.py.
+    """
+
+    __tablename__ = "content_blobs"
+    hash = Column(String(64), primary_key=True)
+    content = deferred(Column(CompressedText, nullable=False))
+    size = Column(Integer, nullable=False)  # UTF-8 bytes before compression
+    refcount = Column(Integer, nullable=False, server_default="1")
+    created_at = Column(sqlalchemy.TIMESTAMP, server_default=func.now())
+
+
+class VoteRollup(Base):
+    """Vote counters per day, agent, vote kind, step type and vote."""
+
+    __tablename__ = "vote_rollups"
+    day = Column(sqlalchemy.Date, primary_key=True)
+    agent_id = Column(String(128), primary_key=True)
+    vote_kind = Column(String(16), primary_key=True)  # 'span' or 'step'
+    step_type = Column(String(64), primary_key=True)  # '' for span votes
+    vote = Column(String(10), primary_key=True)
+    count = Column(sqlalchemy.BigInteger, nullable=False)
+
+
+class RollupWatermark(Base):
+    """Timestamp up to which each raw vote table is folded into vote_rollups."""
+
+    __tablename__ = "rollup_watermarks"
+    name = Column(String(64), primary_key=True)
+    last_timestamp = Column(sqlalchemy.TIMESTAMP, nullable=False)
 
 
 class ConversationHistory(Base):
+    """
+    Legacy wide table with fixed agent A/B/C columns. Superseded by
+    Conversation + ConversationAgentResponse; kept only as the source for
+    migrate_conversation_history.py.
+    """
+
     __tablename__ = "conversation_history"
     id = Column(
-        pgUUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid()
+        UUIDType, primary_key=True, default=uuid.uuid4, server_default=random_uuid()
     )
-    session_id = Column(pgUUID(as_uuid=True), nullable=False)
+    session_id = Column(UUIDType, nullable=False)
     timestamp = Column(sqlalchemy.TIMESTAMP, server_default=func.now())
     question = Column(Text, nullable=False)
     agent_a_id = Column(String(128), nullable=False)  # agent_id like 'perplexity'
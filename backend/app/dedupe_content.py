@@ -0,0 +1,106 @@
+"""
+Move inline text copies written before migration 0005 into content_blobs.
+
+For every row that still holds an inline copy (conversation JSON of a choice,
+a voted span or step, an agent's response texts) the text is stored as a
+blob, its hash is written to the row and the inline column is cleared. Runs
+in keyset batches each committed on its own, so it can run next to live
+traffic and be resumed. Span votes are moved as their own blobs; offsets
+into responses are only recorded for new votes.
+
+Usage:
+    python dedupe_content.py [--batch-size 500] [--collect-garbage]
+"""
+
+import argparse
+
+from blob_store import collect_garbage, put_blobs
+from db_schema import (
+    AnswerSpanVote,
+    ConversationAgentResponse,
+    DeepResearchUserResponse,
+    IntermediateStepVote,
+)
+from sqlalchemy import or_, select, update
+
+# model -> [(inline text column, hash column)]
+INLINE_COLUMNS = [
+    (
+        DeepResearchUserResponse,
+        [
+            ("conversation_a", "conversation_a_hash"),
+            ("conversation_b", "conversation_b_hash"),
+        ],
+    ),
+    (AnswerSpanVote, [("highlighted_text", "highlighted_text_hash")]),
+    (IntermediateStepVote, [("intermediate_step", "intermediate_step_hash")]),
+    (
+        ConversationAgentResponse,
+        [
+            ("response", "response_hash"),
+            ("intermediate_steps", "intermediate_steps_hash"),
+            ("citations", "citations_hash"),
+        ],
+    ),
+]
+
+
+def dedupe_table(engine, model, columns, batch_size: int) -> None:
+    table = model.__table__
+    primary_key = table.primary_key.columns.values()[0]
+    inline = [table.c[text_column] for text_column, _ in columns]
+    last_key = None
+    moved_rows = moved_bytes = 0
+    while True:
+        query = (
+            select(primary_key, *inline)
+            .where(or_(*(c.is_not(None) for c in inline)))
+            .order_by(primary_key)
+            .limit(batch_size)
+        )
+        if last_key is not None:
+            query = query.where(primary_key > last_key)
+        with engine.begin() as connection:
+            rows = connection.execute(query).all()
+            for row in rows:
+                texts = list(row[1:])
+                hashes = put_blobs(connection, texts)
+                values = {}
+                for (text_column, hash_column), text, digest in zip(
+                    columns, texts, hashes
+                ):
+                    if digest:
+                        values[hash_column] = digest
+                        values[text_column] = None
+                        moved_bytes += len(text.encode("utf-8"))
+                connection.execute(
+                    update(table).where(primary_key == row[0]).values(**values)
+                )
+                moved_rows += 1
+        if not rows:
+            break
+        last_key = rows[-1][0]
+    print(
+        f"{table.name}: moved {moved_rows} rows "
+        f"({moved_bytes / 1e6:.1f} MB of inline text) into content_blobs"
+    )
+
+
+if __name__ == "__main__":
+    from database import get_engine
+    from dotenv import load_dotenv
+
+    load_dotenv("../../.env")  # Load from parent directory .env file
+    load_dotenv()  # Load from .env file and environment variables
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--collect-garbage", action="store_true")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    for model, columns in INLINE_COLUMNS:
+        dedupe_table(engine, model, columns, args.batch_size)
+    if args.collect_garbage:
+        with engine.begin() as connection:
+            print(f"Deleted {collect_garbage(connection)} unreferenced blobs")
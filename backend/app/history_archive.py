@@ -0,0 +1,805 @@
+"""
+Monthly partitioning, retention and Parquet archival of conversation and vote
+history.
+
+On Postgres, migration 0007 turns conversations, conversation_agent_responses,
+answer_span_votes and intermediate_step_votes into tables range-partitioned
+by month on ``timestamp``: one ``<table>_pYYYYMM`` partition per month plus a
+``<table>_default`` catch-all. Removing a month then detaches and drops a
+partition instead of a DELETE that leaves dead rows for vacuum.
+
+The archival job, meant to run from cron:
+
+- creates partitions for the current and the next PARTITION_MONTHS_AHEAD
+  months,
+- writes each whole month older than ARCHIVE_AFTER_MONTHS to
+  ``ARCHIVE_DIR/<table>/YYYY-MM.parquet`` (zstd, one row group per batch),
+  removes it from the database and releases its content_blobs references.
+  Conversations are archived with their agent responses nested, and blob
+  references are resolved into text, so the files are self-contained. A file
+  is written under a staging name and only published once the delete has
+  committed, so a month is never both in the database and in the archive,
+- removes months older than RETENTION_MONTHS without archiving them, and
+  deletes their archive files.
+
+Archived conversations stay readable: ``read_archived_conversations`` and
+``get_archived_conversation`` back the ``include_archived`` option of the
+history endpoints. Other databases have no partitions; there the job deletes
+archived months by timestamp range.
+
+Settings are read from the environment:
+
+- ARCHIVE_DIR (default "archive")
+- ARCHIVE_AFTER_MONTHS: months kept in the database (default 12, 0 disables
+  archival)
+- RETENTION_MONTHS: months kept at all, archive included (default 0, keep
+  forever)
+- PARTITION_MONTHS_AHEAD (default 3)
+
+Usage:
+    python history_archive.py            # partitions, archival and retention
+    python history_archive.py --dry-run  # only list what would be done
+"""
+
+import argparse
+import datetime
+import glob
+import logging
+import os
+import re
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import sqlalchemy
+from blob_store import BlobTextCache, collect_garbage, release_blobs
+from db_schema import (
+    AnswerSpanVote,
+    Conversation,
+    ConversationAgentResponse,
+    IntermediateStepVote,
+)
+from sqlalchemy import delete, exists, func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - archival is optional
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "12"))
+RETENTION_MONTHS = int(os.getenv("RETENTION_MONTHS", "0"))
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+PARTITIONED_TABLES = (
+    Conversation,
+    ConversationAgentResponse,
+    AnswerSpanVote,
+    IntermediateStepVote,
+)
+
+RESPONSE_TEXT_FIELDS = ("response", "intermediate_steps", "citations")
+
+
+def month_start(value: datetime.date) -> datetime.date:
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month: datetime.date, count: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def _month_range(model, month: datetime.date):
+    return (model.timestamp >= month) & (model.timestamp < add_months(month, 1))
+
+
+# Partitions (Postgres only)
+
+
+def partition_name(table: str, month: datetime.date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(connection: Connection, table: str) -> bool:
+    return connection.execute(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass(:table))"
+        ),
+        {"table": table},
+    ).scalar()
+
+
+def list_partitions(connection: Connection, table: str) -> Dict[datetime.date, str]:
+    """Monthly partitions of ``table`` by month (the default one excluded)."""
+    names = connection.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table)"
+        ),
+        {"table": table},
+    ).scalars()
+    pattern = re.compile(rf"{re.escape(table)}_p(\d{{4}})(\d{{2}})")
+    partitions = {}
+    for name in names:
+        match = pattern.fullmatch(name)
+        if match:
+            partitions[datetime.date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_partition(connection: Connection, table: str, month: datetime.date) -> None:
+    name = partition_name(table, month)
+    default = f"{table}_default"
+    bounds = f"FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+    in_month = "timestamp >= :start AND timestamp < :end"
+    params = {"start": month, "end": add_months(month, 1)}
+    stranded = connection.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})"), params
+    ).scalar()
+    # Postgres refuses to create a partition for rows that are already in the
+    # default partition, so those are moved over while it is detached
+    if stranded:
+        connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    connection.execute(
+        text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}")
+    )
+    if stranded:
+        connection.execute(
+            text(f"INSERT INTO {table} SELECT * FROM {default} WHERE {in_month}"),
+            params,
+        )
+        connection.execute(text(f"DELETE FROM {default} WHERE {in_month}"), params)
+        connection.execute(
+            text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT")
+        )
+
+
+def ensure_partitions(
+    connection: Connection, table: str, first: datetime.date, last: datetime.date
+) -> List[str]:
+    """Create the missing monthly partitions from ``first`` to ``last``."""
+    existing = list_partitions(connection, table)
+    created = []
+    month = month_start(first)
+    while month <= last:
+        if month not in existing:
+            create_partition(connection, table, month)
+            created.append(partition_name(table, month))
+        month = add_months(month, 1)
+    return created
+
+
+def partition_table(connection: Connection, model) -> bool:
+    """
+    Rebuild ``model``'s table as a table partitioned by month and copy its
+    rows over. The primary key becomes (id, timestamp) and unique indexes get
+    the timestamp appended, as Postgres requires the partition key in both;
+    foreign keys pointing at the table are dropped. Returns False if the
+    table is already partitioned.
+    """
+    table = model.__tablename__
+    if is_partitioned(connection, table):
+        return False
+    old = f"{table}_unpartitioned"
+    connection.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+    connection.execute(
+        text(f"UPDATE {old} SET timestamp = now() WHERE timestamp IS NULL")
+    )
+    connection.execute(
+        text(
+            f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE (timestamp)"
+        )
+    )
+    connection.execute(text(f"ALTER TABLE {table} ALTER COLUMN timestamp SET NOT NULL"))
+    connection.execute(
+        text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    )
+
+    current = month_start(datetime.date.today())
+    first = connection.execute(text(f"SELECT min(timestamp) FROM {old}")).scalar()
+    ensure_partitions(
+        connection,
+        table,
+        month_start(first) if first else current,
+        add_months(current, PARTITION_MONTHS_AHEAD),
+    )
+    connection.execute(text(f"INSERT INTO {table} SELECT * FROM {old}"))
+    connection.execute(text(f"DROP TABLE {old} CASCADE"))
+
+    connection.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, timestamp)"))
+    for index in model.__table__.indexes:
+        columns = [column.name for column in index.columns]
+        if index.unique and "timestamp" not in columns:
+            columns.append("timestamp")
+        connection.execute(
+            text(
+                f"CREATE {'UNIQUE ' if index.unique else ''}INDEX IF NOT EXISTS "
+                f"{index.name} ON {table} ({', '.join(columns)})"
+            )
+        )
+    return True
+
+
+# Archive files
+
+
+def archive_files(table: str) -> List[Tuple[datetime.date, str]]:
+    """(month, path) of the archive files of ``table``, newest first."""
+    files = []
+    for path in glob.glob(os.path.join(ARCHIVE_DIR, table, "*.parquet")):
+        name = os.path.basename(path)
+        match = re.match(r"(\d{4})-(\d{2})", name)
+        if match:
+            files.append((datetime.date(int(match[1]), int(match[2]), 1), path))
+    return sorted(files, reverse=True)
+
+
+def _new_archive_path(table: str, month: datetime.date) -> str:
+    directory = os.path.join(ARCHIVE_DIR, table)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{month:%Y-%m}.parquet")
+    suffix = 1
+    # A month archived again (rows inserted late) gets an extra file
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{month:%Y-%m}.{suffix}.parquet")
+        suffix += 1
+    return path
+
+
+def _staged_archive_path(table: str, month: datetime.date) -> str:
+    """Where a month's file waits for its rows' delete to commit."""
+    directory = os.path.join(ARCHIVE_DIR, table)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{month:%Y-%m}.staged")
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("pyarrow is required to read or write history archives")
+
+
+def arrow_type(column):
+    if isinstance(column.type, sqlalchemy.Integer):
+        return pa.int64()
+    if isinstance(column.type, sqlalchemy.DateTime):
+        return pa.timestamp("us")
+    if isinstance(column.type, sqlalchemy.Date):
+        return pa.date32()
+    return pa.string()
+
+
+def arrow_value(value):
+    if value is None or isinstance(
+        value, (str, int, float, datetime.date, datetime.datetime)
+    ):
+        return value
+    return str(value)  # UUIDs
+
+
+def write_parquet(path: str, schema, batches: Iterator[List[Dict[str, Any]]]) -> int:
+    """
+    Write each batch of records as a row group of a zstd-compressed Parquet
+    file. The file only appears under ``path`` once it is complete, and not at
+    all if there were no records. Returns the number of records written.
+    """
+    _require_pyarrow()
+    partial = f"{path}.partial"
+    writer = None
+    written = 0
+    try:
+        for records in batches:
+            if not records:
+                continue
+            if writer is None:
+                writer = pq.ParquetWriter(partial, schema, compression="zstd")
+            writer.write_table(pa.Table.from_pylist(records, schema=schema))
+            written += len(records)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            os.remove(partial)
+        raise
+    if writer is not None:
+        writer.close()
+        os.replace(partial, path)
+    return written
+
+
+# Archived tables
+
+
+def conversation_schema():
+    agent = pa.struct(
+        [("id", pa.string()), ("name", pa.string())]
+        + [(field, pa.string()) for field in RESPONSE_TEXT_FIELDS]
+    )
+    return pa.schema(
+        [
+            ("id", pa.string()),
+            ("session_id", pa.string()),
+            ("timestamp", pa.timestamp("us")),
+            ("question", pa.string()),
+            ("agents", pa.list_(agent)),
+        ]
+    )
+
+
+def conversation_batches(
+    connection: Connection,
+    condition,
+    batch_size: int,
+    hashes: Optional[List[str]] = None,
+    newest_first: bool = False,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Conversations matching ``condition`` with their agent answers nested and
+    blob references resolved to text, streamed in batches of ``batch_size``.
+    The resolved blob hashes are appended to ``hashes`` if given.
+    """
+    conversations = Conversation.__table__
+    responses = ConversationAgentResponse.__table__
+    timestamp = conversations.c.timestamp
+    cache = BlobTextCache()
+    result = connection.execute(
+        select(
+            conversations.c.id,
+            conversations.c.session_id,
+            timestamp,
+            conversations.c.question,
+        )
+        .where(condition)
+        .order_by(timestamp.desc() if newest_first else timestamp)
+        .execution_options(yield_per=batch_size)
+    )
+    for rows in result.partitions():
+        agents = defaultdict(list)
+        response_rows = connection.execute(
+            select(responses)
+            .where(responses.c.conversation_id.in_([row.id for row in rows]))
+            .order_by(responses.c.conversation_id, responses.c.position)
+        ).all()
+        references = [
+            getattr(row, f"{field}_hash")
+            for row in response_rows
+            for field in RESPONSE_TEXT_FIELDS
+        ]
+        texts = cache.get_blobs(connection, references)
+        if hashes is not None:
+            hashes.extend(digest for digest in references if digest)
+        for row in response_rows:
+            agent = {"id": row.agent_id, "name": row.agent_name}
+            for field in RESPONSE_TEXT_FIELDS:
+                digest = getattr(row, f"{field}_hash")
+                agent[field] = texts.get(digest) if digest else getattr(row, field)
+            agents[row.conversation_id].append(agent)
+        yield [
+            {
+                "id": str(row.id),
+                "session_id": str(row.session_id),
+                "timestamp": row.timestamp,
+                "question": row.question,
+                "agents": agents[row.id],
+            }
+            for row in rows
+        ]
+
+
+def _span_text(row, texts: Dict[str, str]) -> Optional[str]:
+    if row.highlighted_text is not None:
+        return row.highlighted_text
+    if row.highlighted_text_hash:
+        return texts.get(row.highlighted_text_hash)
+    response = texts.get(row.response_hash) if row.response_hash else None
+    return response[row.span_start : row.span_end] if response is not None else None
+
+
+def _step_text(row, texts: Dict[str, str]) -> Optional[str]:
+    if row.intermediate_step is not None:
+        return row.intermediate_step
+    return texts.get(row.intermediate_step_hash)
+
+
+# vote table -> (model, blob hash columns, text column, text resolver)
+ARCHIVED_VOTES: Dict[str, Tuple[Any, List[str], str, Callable]] = {
+    "answer_span_votes": (
+        AnswerSpanVote,
+        ["highlighted_text_hash", "response_hash"],
+        "highlighted_text",
+        _span_text,
+    ),
+    "intermediate_step_votes": (
+        IntermediateStepVote,
+        ["intermediate_step_hash"],
+        "intermediate_step",
+        _step_text,
+    ),
+}
+
+
+def vote_schema(table: str):
+    model, hash_columns, _, _ = ARCHIVED_VOTES[table]
+    return pa.schema(
+        [
+            (column.name, arrow_type(column))
+            for column in model.__table__.columns
+            if column.name not in hash_columns
+        ]
+    )
+
+
+def vote_batches(
+    connection: Connection,
+    table: str,
+    condition,
+    batch_size: int,
+    hashes: Optional[List[str]] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Like ``conversation_batches``, for one of the ARCHIVED_VOTES tables."""
+    model, hash_columns, text_column, resolve = ARCHIVED_VOTES[table]
+    votes = model.__table__
+    uuid_columns = [c.name for c in votes.columns if getattr(c.type, "as_uuid", False)]
+    cache = BlobTextCache()
+    result = connection.execute(
+        select(votes)
+        .where(condition)
+        .order_by(votes.c.timestamp)
+        .execution_options(yield_per=batch_size)
+    )
+    for rows in result.partitions():
+        references = [getattr(row, c) for row in rows for c in hash_columns]
+        texts = cache.get_blobs(connection, references)
+        if hashes is not None:
+            hashes.extend(digest for digest in references if digest)
+        records = []
+        for row in rows:
+            record = row._asdict()
+            for name in uuid_columns:
+                record[name] = arrow_value(record[name])
+            for name in hash_columns:
+                del record[name]
+            record[text_column] = resolve(row, texts)
+            records.append(record)
+        yield records
+
+
+def _archived_model(table: str):
+    return Conversation if table == "conversations" else ARCHIVED_VOTES[table][0]
+
+
+def _month_hashes(connection: Connection, table: str, month: datetime.date) -> List:
+    """Blob references held by a month that is dropped without archiving."""
+    if table == "conversations":
+        conversations = Conversation.__table__
+        responses = ConversationAgentResponse.__table__
+        columns = [responses.c[f"{field}_hash"] for field in RESPONSE_TEXT_FIELDS]
+        query = select(*columns).where(
+            exists().where(
+                (conversations.c.id == responses.c.conversation_id)
+                & _month_range(conversations.c, month)
+            )
+        )
+    else:
+        model, hash_columns, _, _ = ARCHIVED_VOTES[table]
+        query = select(*(model.__table__.c[c] for c in hash_columns)).where(
+            _month_range(model.__table__.c, month)
+        )
+    return [digest for row in connection.execute(query) for digest in row if digest]
+
+
+def _drop_month(connection: Connection, model, month: datetime.date) -> None:
+    table = model.__tablename__
+    if connection.dialect.name == "postgresql" and is_partitioned(connection, table):
+        partition = list_partitions(connection, table).get(month)
+        if partition:
+            connection.execute(
+                text(f"ALTER TABLE {table} DETACH PARTITION {partition}")
+            )
+            connection.execute(text(f"DROP TABLE {partition}"))
+    # Rows of the month left in the default partition, or the whole month on
+    # a table without partitions
+    connection.execute(delete(model.__table__).where(_month_range(model, month)))
+
+
+def archive_month(
+    engine: Engine,
+    table: str,
+    month: datetime.date,
+    keep_archive: bool = True,
+    batch_size: int = 5000,
+) -> int:
+    """
+    Move one month of ``table`` (conversations or a vote table) out of the
+    database, into an archive file unless ``keep_archive`` is False. Returns
+    the number of rows archived (or dropped).
+    """
+    model = _archived_model(table)
+    staged = _staged_archive_path(table, month) if keep_archive else None
+    if staged:
+        _require_pyarrow()
+        _resolve_staged(engine, model, table, month, staged)
+    try:
+        count = _archive_rows(engine, model, table, month, staged, batch_size)
+    except BaseException:
+        if staged and os.path.exists(staged):
+            os.remove(staged)
+        raise
+    if staged and count:
+        os.replace(staged, _new_archive_path(table, month))
+    return count
+
+
+def _resolve_staged(engine: Engine, model, table: str, month: datetime.date, staged):
+    """
+    Publish or discard the staged file of an earlier run that stopped between
+    committing the delete and publishing: its rows are gone from the database
+    only if the delete committed, and the delete removes all of them or none.
+    """
+    if not os.path.exists(staged):
+        return
+    first = pq.read_table(staged, columns=["id"]).column("id")[0].as_py()
+    with engine.connect() as connection:
+        archived = not connection.execute(
+            select(exists().where(model.id == first))
+        ).scalar()
+    if archived:
+        logger.warning(f"Publishing {staged} left by an interrupted archival")
+        os.replace(staged, _new_archive_path(table, month))
+    else:
+        os.remove(staged)
+
+
+def _archive_rows(
+    engine: Engine,
+    model,
+    table: str,
+    month: datetime.date,
+    staged: Optional[str],
+    batch_size: int,
+) -> int:
+    with engine.begin() as connection:
+        hashes: List[str] = []
+        if staged:
+            if table == "conversations":
+                schema = conversation_schema()
+                batches = conversation_batches(
+                    connection,
+                    _month_range(Conversation, month),
+                    batch_size,
+                    hashes,
+                    newest_first=True,
+                )
+            else:
+                schema = vote_schema(table)
+                batches = vote_batches(
+                    connection, table, _month_range(model, month), batch_size, hashes
+                )
+            count = write_parquet(staged, schema, batches)
+        else:
+            hashes = _month_hashes(connection, table, month)
+            count = connection.execute(
+                select(func.count())
+                .select_from(model.__table__)
+                .where(_month_range(model, month))
+            ).scalar_one()
+
+        release_blobs(connection, hashes)
+        if model is Conversation:
+            responses = ConversationAgentResponse.__table__
+            connection.execute(
+                delete(responses).where(
+                    responses.c.conversation_id.in_(
+                        select(Conversation.id).where(_month_range(Conversation, month))
+                    )
+                )
+            )
+        _drop_month(connection, model, month)
+    return count
+
+
+def _months_before(
+    connection: Connection, model, cutoff: datetime.date
+) -> List[datetime.date]:
+    months = set()
+    first = connection.execute(
+        select(func.min(model.timestamp)).where(model.timestamp < cutoff)
+    ).scalar()
+    if first is not None:
+        month = month_start(first)
+        while month < cutoff:
+            months.add(month)
+            month = add_months(month, 1)
+    if connection.dialect.name == "postgresql" and is_partitioned(
+        connection, model.__tablename__
+    ):
+        months.update(
+            month
+            for month in list_partitions(connection, model.__tablename__)
+            if month < cutoff
+        )
+    return sorted(months)
+
+
+def _drop_empty_response_partitions(
+    connection: Connection, cutoff: datetime.date
+) -> List[str]:
+    """
+    Response partitions before the cutoff are emptied by archiving their
+    conversations; drop them so their dead rows go without a vacuum.
+    """
+    table = ConversationAgentResponse.__tablename__
+    if not is_partitioned(connection, table):
+        return []
+    dropped = []
+    for month, partition in sorted(list_partitions(connection, table).items()):
+        if month >= cutoff:
+            continue
+        if connection.execute(
+            text(f"SELECT EXISTS (SELECT 1 FROM {partition})")
+        ).scalar():
+            logger.warning(f"{partition} still has rows, not dropping it")
+            continue
+        connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition}"))
+        connection.execute(text(f"DROP TABLE {partition}"))
+        dropped.append(partition)
+    return dropped
+
+
+def run_archival(
+    engine: Engine,
+    today: Optional[datetime.date] = None,
+    dry_run: bool = False,
+    batch_size: int = 5000,
+) -> List[str]:
+    """Create partitions, archive and apply retention. Returns what was done."""
+    current = month_start(today or datetime.date.today())
+    archive_cutoff = (
+        add_months(current, -ARCHIVE_AFTER_MONTHS) if ARCHIVE_AFTER_MONTHS > 0 else None
+    )
+    retention_cutoff = (
+        add_months(current, -RETENTION_MONTHS) if RETENTION_MONTHS > 0 else None
+    )
+    postgres = engine.dialect.name == "postgresql"
+    actions = []
+
+    if postgres and not dry_run:
+        with engine.begin() as connection:
+            for model in PARTITIONED_TABLES:
+                if is_partitioned(connection, model.__tablename__):
+                    actions += [
+                        f"created {name}"
+                        for name in ensure_partitions(
+                            connection,
+                            model.__tablename__,
+                            current,
+                            add_months(current, PARTITION_MONTHS_AHEAD),
+                        )
+                    ]
+
+    cutoffs = [cutoff for cutoff in (archive_cutoff, retention_cutoff) if cutoff]
+    if cutoffs:
+        cutoff = max(cutoffs)
+        for table in ["conversations", *ARCHIVED_VOTES]:
+            with engine.connect() as connection:
+                months = _months_before(connection, _archived_model(table), cutoff)
+            for month in months:
+                keep = retention_cutoff is None or month >= retention_cutoff
+                verb = "archive" if keep else "drop"
+                if dry_run:
+                    actions.append(f"would {verb} {table} {month:%Y-%m}")
+                    continue
+                count = archive_month(engine, table, month, keep, batch_size)
+                actions.append(f"{verb} {table} {month:%Y-%m}: {count} rows")
+        if postgres and not dry_run:
+            with engine.begin() as connection:
+                actions += [
+                    f"dropped {name}"
+                    for name in _drop_empty_response_partitions(connection, cutoff)
+                ]
+
+    if retention_cutoff:
+        for table in ["conversations", *ARCHIVED_VOTES]:
+            for month, path in archive_files(table):
+                if month < retention_cutoff:
+                    if not dry_run:
+                        os.remove(path)
+                    actions.append(f"{'would delete' if dry_run else 'deleted'} {path}")
+
+    if cutoffs and not dry_run:
+        with engine.begin() as connection:
+            actions.append(f"deleted {collect_garbage(connection)} unreferenced blobs")
+    return actions
+
+
+# Reading archived conversations
+
+
+def _archived_conversation(record: Dict[str, Any], summary: bool) -> Dict[str, Any]:
+    agents = record["agents"] or []
+    if summary:
+        agents = [{"id": agent["id"], "name": agent["name"]} for agent in agents]
+    return {
+        "id": record["id"],
+        "session_id": record["session_id"],
+        "timestamp": record["timestamp"].isoformat(),
+        "question": record["question"],
+        "agents": agents,
+        "archived": True,
+    }
+
+
+def read_archived_conversations(
+    offset: int = 0,
+    limit: int = 10,
+    agent_id: Optional[str] = None,
+    summary: bool = False,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    One page of archived conversations, newest first, and the total number
+    of archived conversations (with ``agent_id``). Without a filter only the
+    files the page falls in are read; the others are counted from metadata.
+    """
+    files = archive_files("conversations")
+    if files:
+        _require_pyarrow()
+    page: List[Dict[str, Any]] = []
+    total = 0
+    for _, path in files:
+        if agent_id is None:
+            rows_in_file = pq.ParquetFile(path).metadata.num_rows
+            if len(page) >= limit or total + rows_in_file <= offset:
+                total += rows_in_file
+                continue
+            records = pq.read_table(path).to_pylist()
+        else:
+            records = [
+                record
+                for record in pq.read_table(path).to_pylist()
+                if any(agent["id"] == agent_id for agent in record["agents"] or [])
+            ]
+        start = max(0, offset - total)
+        page += [
+            _archived_conversation(record, summary)
+            for record in records[start : start + max(0, limit - len(page))]
+        ]
+        total += len(records)
+    return page, total
+
+
+def get_archived_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
+    files = archive_files("conversations")
+    if files:
+        _require_pyarrow()
+    for _, path in files:
+        records = pq.read_table(
+            path, filters=[("id", "=", conversation_id)]
+        ).to_pylist()
+        if records:
+            return _archived_conversation(records[0], summary=False)
+    return None
+
+
+if __name__ == "__main__":
+    from database import get_engine
+    from dotenv import load_dotenv
+
+    load_dotenv("../../.env")  # Load from parent directory .env file
+    load_dotenv()  # Load from .env file and environment variables
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    for action in run_archival(
+        get_engine(), dry_run=args.dry_run, batch_size=args.batch_size
+    ):
+        print(action)
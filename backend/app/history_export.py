@@ -0,0 +1,249 @@
+"""
+Streaming bulk export of conversations, choices and votes for offline
+analysis.
+
+Rows are read through server-side cursors (``yield_per``) in batches of
+EXPORT_BATCH_SIZE and written out batch by batch, as NDJSON lines or as one
+Parquet row group per batch, so memory use stays flat however many rows are
+exported. Blob references are resolved to text within each batch, and
+conversations carry their agent answers nested, as in the archive files of
+history_archive.py.
+
+Served by ``GET /api/export`` and usable from the command line. The batch
+size is read from EXPORT_BATCH_SIZE (default 2000).
+
+Usage:
+    python history_export.py conversations --since 2025-01-01 > conversations.ndjson
+    python history_export.py choices --format parquet -o choices.parquet
+"""
+
+import argparse
+import datetime
+import os
+import sys
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import codec
+from blob_store import BlobTextCache
+from db_schema import Conversation, DeepResearchUserResponse
+from history_archive import (
+    ARCHIVED_VOTES,
+    arrow_type,
+    arrow_value,
+    conversation_batches,
+    conversation_schema,
+    pa,
+    pq,
+    vote_batches,
+    vote_schema,
+)
+from sqlalchemy import select, true
+from sqlalchemy.engine import Connection, Engine
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+EXPORT_FORMATS = {"ndjson": codec.NDJSON_MEDIA_TYPE, "parquet": PARQUET_MEDIA_TYPE}
+
+# Choice columns written as is; the transcripts are resolved from their blobs
+CHOICE_COLUMNS = [
+    "id",
+    "session_id",
+    "agentid_a",
+    "agentid_b",
+    "question",
+    "userresponse",
+    "lastupdated",
+]
+CHOICE_TEXT_COLUMNS = ["conversation_a", "conversation_b"]
+
+
+def choice_schema():
+    columns = DeepResearchUserResponse.__table__.c
+    return pa.schema(
+        [(name, arrow_type(columns[name])) for name in CHOICE_COLUMNS]
+        + [(name, pa.string()) for name in CHOICE_TEXT_COLUMNS]
+    )
+
+
+def choice_batches(
+    connection: Connection, condition, batch_size: int
+) -> Iterator[List[Dict[str, Any]]]:
+    choices = DeepResearchUserResponse.__table__
+    cache = BlobTextCache()
+    result = connection.execute(
+        select(choices)
+        .where(condition)
+        .order_by(choices.c.lastupdated)
+        .execution_options(yield_per=batch_size)
+    )
+    for rows in result.partitions():
+        texts = cache.get_blobs(
+            connection,
+            (
+                getattr(row, f"{name}_hash")
+                for row in rows
+                for name in CHOICE_TEXT_COLUMNS
+            ),
+        )
+        records = []
+        for row in rows:
+            record = {name: arrow_value(getattr(row, name)) for name in CHOICE_COLUMNS}
+            for name in CHOICE_TEXT_COLUMNS:
+                digest = getattr(row, f"{name}_hash")
+                record[name] = texts.get(digest) if digest else getattr(row, name)
+            records.append(record)
+        yield records
+
+
+def _vote_table(table: str) -> Tuple[Any, Callable, Callable]:
+    return (
+        ARCHIVED_VOTES[table][0].timestamp,
+        lambda: vote_schema(table),
+        lambda connection, condition, batch_size: vote_batches(
+            connection, table, condition, batch_size
+        ),
+    )
+
+
+# table -> (time column, schema, batches(connection, condition, batch_size))
+EXPORT_TABLES: Dict[str, Tuple[Any, Callable, Callable]] = {
+    "conversations": (
+        Conversation.timestamp,
+        conversation_schema,
+        conversation_batches,
+    ),
+    "choices": (DeepResearchUserResponse.lastupdated, choice_schema, choice_batches),
+    **{table: _vote_table(table) for table in ARCHIVED_VOTES},
+}
+
+
+def export_batches(
+    connection: Connection,
+    table: str,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Rows of ``table`` with ``since <= time < until``, oldest first."""
+    time_column, _, batches = EXPORT_TABLES[table]
+    condition = true() if since is None else time_column >= since
+    if until is not None:
+        condition = condition & (time_column < until)
+    return batches(connection, condition, batch_size)
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def export_ndjson(
+    engine: Engine,
+    table: str,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """NDJSON lines of ``table``, one chunk per batch."""
+    if codec.JSON_BACKEND == "orjson":
+        encode = codec.dumps_bytes  # serializes datetimes itself
+    else:
+
+        def encode(record):
+            return codec.dumps_bytes(
+                {name: _json_value(value) for name, value in record.items()}
+            )
+
+    with engine.connect() as connection:
+        for records in export_batches(connection, table, since, until, batch_size):
+            yield b"".join(encode(record) + b"\n" for record in records)
+
+
+class _ChunkSink:
+    """Write-only file for the Parquet writer that hands out what it wrote."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_parquet(
+    engine: Engine,
+    table: str,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """
+    A zstd-compressed Parquet file of ``table``, yielded one row group at a
+    time; the footer comes last.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for Parquet exports")
+    schema = EXPORT_TABLES[table][1]()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    with engine.connect() as connection:
+        for records in export_batches(connection, table, since, until, batch_size):
+            writer.write_table(pa.Table.from_pylist(records, schema=schema))
+            yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def export(engine: Engine, table: str, format: str, **kwargs) -> Iterator[bytes]:
+    if format == "parquet":
+        return export_parquet(engine, table, **kwargs)
+    return export_ndjson(engine, table, **kwargs)
+
+
+if __name__ == "__main__":
+    from database import get_engine
+    from dotenv import load_dotenv
+
+    load_dotenv("../../.env")  # Load from parent directory .env file
+    load_dotenv()  # Load from .env file and environment variables
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("table", choices=list(EXPORT_TABLES))
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--since", type=datetime.datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.datetime.fromisoformat)
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    args = parser.parse_args()
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    with output:
+        for chunk in export(
+            get_engine(),
+            args.table,
+            args.format,
+            since=args.since,
+            until=args.until,
+            batch_size=args.batch_size,
+        ):
+            output.write(chunk)
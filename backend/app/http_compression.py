@@ -0,0 +1,231 @@
+"""
+Negotiated response compression for streamed and large JSON responses.
+
+Starlette's GZipMiddleware buffers streamed bodies, which would hold back
+agent updates until the buffer fills. Here every frame is compressed and
+flushed on its own, so the client can decode each update as soon as it
+arrives while the compressor keeps its window across frames (most of each
+frame repeats the previous cumulative report, so that window is where the
+savings come from).
+
+Supported encodings, in order of preference: zstd (``zstandard``), br
+(``brotli``) and gzip (stdlib). Levels are read from the environment:
+
+- COMPRESSION_ENABLED (default "true")
+- COMPRESSION_GZIP_LEVEL (default 6)
+- COMPRESSION_BROTLI_QUALITY (default 4)
+- COMPRESSION_ZSTD_LEVEL (default 3)
+- COMPRESSION_MIN_SIZE: smallest non-streamed body worth compressing (default 1024)
+"""
+
+import logging
+import os
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, Optional
+
+import codec
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional encoding
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+
+def available_encodings() -> list[str]:
+    """Encodings this process can produce, most preferred first."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Choose a content encoding from an ``Accept-Encoding`` header.
+
+    The client's q-values decide first; ties fall back to our preference
+    order. Returns None when nothing acceptable is available.
+    """
+    if not COMPRESSION_ENABLED or not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+
+    best = None
+    best_weight = 0.0
+    for encoding in available_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class StreamCompressor:
+    """
+    Compresses a sequence of frames, flushing after each one.
+
+    Also keeps the byte counts and CPU time needed to judge whether the
+    bandwidth saved is worth the extra work per frame.
+    """
+
+    def __init__(self, encoding: str, level: Optional[int] = None):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(
+                GZIP_LEVEL if level is None else level, zlib.DEFLATED, 31
+            )
+        elif encoding == "br":
+            if brotli is None:
+                raise RuntimeError("brotli is not installed")
+            self._compressor = brotli.Compressor(
+                quality=BROTLI_QUALITY if level is None else level
+            )
+        elif encoding == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is not installed")
+            self._compressor = zstandard.ZstdCompressor(
+                level=ZSTD_LEVEL if level is None else level
+            ).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+        self.frames = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress one frame and flush it so it can be decoded immediately."""
+        start = time.process_time()
+        if self.encoding == "gzip":
+            out = self._compressor.compress(data) + self._compressor.flush(
+                zlib.Z_SYNC_FLUSH
+            )
+        elif self.encoding == "br":
+            out = self._compressor.process(data) + self._compressor.flush()
+        else:
+            out = self._compressor.compress(data) + self._compressor.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            )
+        self.cpu_seconds += time.process_time() - start
+        self.frames += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        return out
+
+    def finish(self) -> bytes:
+        """Terminate the compressed stream."""
+        start = time.process_time()
+        if self.encoding == "br":
+            out = self._compressor.finish()
+        else:
+            out = self._compressor.flush()
+        self.cpu_seconds += time.process_time() - start
+        self.bytes_out += len(out)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "encoding": self.encoding,
+            "frames": self.frames,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": self.bytes_out / self.bytes_in if self.bytes_in else 1.0,
+            "cpu_us_per_frame": (
+                self.cpu_seconds / self.frames * 1e6 if self.frames else 0.0
+            ),
+        }
+
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    """Compress a complete response body in one shot."""
+    compressor = StreamCompressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+async def _compress_frames(
+    frames: AsyncIterator[Any], compressor: StreamCompressor
+) -> AsyncIterator[bytes]:
+    try:
+        async for frame in frames:
+            if isinstance(frame, str):
+                frame = frame.encode("utf-8")
+            chunk = compressor.compress(frame)
+            if chunk:
+                yield chunk
+        tail = compressor.finish()
+        if tail:
+            yield tail
+    finally:
+        logger.info(f"Compressed stream stats: {compressor.stats()}")
+
+
+def compressed_streaming_response(
+    request: Request,
+    frames: AsyncIterator[Any],
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> StreamingResponse:
+    """Stream ``frames`` with per-frame flushed compression if the client allows it."""
+    headers = dict(headers or {})
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is None:
+        return StreamingResponse(frames, media_type=media_type, headers=headers)
+
+    headers.update({"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+    return StreamingResponse(
+        _compress_frames(frames, StreamCompressor(encoding)),
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+def compressed_json_response(
+    request: Request, content: Any, status_code: int = 200
+) -> Response:
+    """JSON response whose body is compressed when it is large enough to matter."""
+    body = codec.dumps_bytes(content)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None and len(body) >= MIN_SIZE:
+        body = compress_body(body, encoding)
+        headers["Content-Encoding"] = encoding
+
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
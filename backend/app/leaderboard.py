@@ -0,0 +1,330 @@
+"""
+Agent leaderboard from pairwise choices.
+
+Every stored choice is kept as one (agent_a, agent_b, score) triple in
+compact NumPy arrays, where score is agent A's result: 1 for "Agent A is
+better", 0 for "Agent B is better" and 0.5 for a tie or "both are bad". On
+top of that the leaderboard maintains:
+
+- an online Elo rating, updated in O(1) as each choice arrives,
+- a pairwise outcome table (wins of i over j), also updated in O(1), from
+  which Bradley-Terry ratings are refitted with the MM algorithm. A refit
+  costs O(agents^2) per iteration no matter how many votes there are, and
+  is warm-started from the previous fit,
+- bootstrap confidence intervals, computed in batch by resampling the
+  pairwise table with a multinomial draw per round. They are only refreshed
+  every BOOTSTRAP_EVERY votes: an agent whose games changed since is marked
+  ``ci_stale`` (its rating may lie outside them), and an agent with no games
+  in the last bootstrap has no interval (null) rather than a made-up one.
+
+Ratings are reported on the Elo scale (400 points = 10x odds, mean 1000).
+
+Settings are read from the environment:
+
+- LEADERBOARD_ELO_K: online Elo step size (default 4)
+- LEADERBOARD_BOOTSTRAP_ROUNDS (default 200)
+- LEADERBOARD_BOOTSTRAP_EVERY: new votes before the intervals are
+  recomputed (default 200)
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+ELO_K = float(os.getenv("LEADERBOARD_ELO_K", "4"))
+BOOTSTRAP_ROUNDS = int(os.getenv("LEADERBOARD_BOOTSTRAP_ROUNDS", "200"))
+BOOTSTRAP_EVERY = int(os.getenv("LEADERBOARD_BOOTSTRAP_EVERY", "200"))
+
+ELO_SCALE = 400.0
+ELO_BASE = 1000.0
+
+# Agent A's score for each choice sent by the frontend
+CHOICE_SCORES = {
+    "choice1": 1.0,  # Agent A is better
+    "choice2": 0.0,  # Agent B is better
+    "choice3": 0.5,  # Tie
+    "choice4": 0.5,  # Both are bad
+}
+
+
+def fit_bradley_terry(
+    wins: np.ndarray,
+    strengths: Optional[np.ndarray] = None,
+    max_iterations: int = 1000,
+    tolerance: float = 1e-8,
+) -> np.ndarray:
+    """
+    Bradley-Terry strengths from ``wins[i, j]`` (times i beat j; ties count
+    half to each side), using Hunter's MM updates. Returns strengths
+    normalized to a geometric mean of 1. Agents without games keep 1.
+    """
+    n = wins.shape[0]
+    p = np.ones(n) if strengths is None else strengths.copy()
+    if n == 0:
+        return p
+    games = wins + wins.T
+    total_wins = wins.sum(axis=1)
+    played = games.sum(axis=1) > 0
+    # Tiny pseudo-count so an agent that never won does not collapse to 0
+    total_wins = total_wins + 1e-3 * played
+    for _ in range(max_iterations):
+        denominator = (games / (p[:, None] + p[None, :])).sum(axis=1)
+        updated = np.where(played, total_wins / np.maximum(denominator, 1e-300), 1.0)
+        updated /= np.exp(np.log(updated[played]).mean()) if played.any() else 1.0
+        converged = np.max(np.abs(updated - p)) < tolerance
+        p = updated
+        if converged:
+            break
+    return p
+
+
+def strengths_to_elo(strengths: np.ndarray) -> np.ndarray:
+    return ELO_BASE + ELO_SCALE * np.log10(strengths)
+
+
+class Leaderboard:
+    """In-memory ratings over a growing set of pairwise choices."""
+
+    def __init__(self, capacity: int = 1024, seed: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+        self.agents: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._a = np.empty(capacity, dtype=np.int32)
+        self._b = np.empty(capacity, dtype=np.int32)
+        self._score = np.empty(capacity, dtype=np.float32)
+        self.count = 0
+        self._elo = np.empty(0)
+        self._wins = np.zeros((0, 0))
+        self._strengths: Optional[np.ndarray] = None
+        self._intervals: Optional[np.ndarray] = None  # NaN: not bootstrapped
+        self._bootstrap_games = np.empty(0)  # games of each agent at bootstrap
+        self._votes_at_bootstrap = 0
+        self._dirty = True
+        self.updated_at = time.time()
+
+    def _agent_index(self, agent_id: str) -> int:
+        index = self._index.get(agent_id)
+        if index is None:
+            index = len(self.agents)
+            self._index[agent_id] = index
+            self.agents.append(agent_id)
+            n = len(self.agents)
+            self._elo = np.append(self._elo, ELO_BASE)
+            wins = np.zeros((n, n))
+            wins[: n - 1, : n - 1] = self._wins
+            self._wins = wins
+            if self._strengths is not None:
+                self._strengths = np.append(self._strengths, 1.0)
+            if self._intervals is not None:
+                self._intervals = np.vstack([self._intervals, np.full((1, 2), np.nan)])
+                self._bootstrap_games = np.append(self._bootstrap_games, 0.0)
+        return index
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._a)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for name in ("_a", "_b", "_score"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[: self.count] = old[: self.count]
+            setattr(self, name, new)
+
+    def record(self, agent_a: str, agent_b: str, choice: str) -> bool:
+        """Add one choice. Returns False for choices that carry no outcome."""
+        score = CHOICE_SCORES.get(choice)
+        if score is None or agent_a == agent_b:
+            return False
+        with self._lock:
+            a = self._agent_index(agent_a)
+            b = self._agent_index(agent_b)
+            self._grow(self.count + 1)
+            self._a[self.count] = a
+            self._b[self.count] = b
+            self._score[self.count] = score
+            self.count += 1
+
+            expected = 1.0 / (1.0 + 10 ** ((self._elo[b] - self._elo[a]) / ELO_SCALE))
+            self._elo[a] += ELO_K * (score - expected)
+            self._elo[b] -= ELO_K * (score - expected)
+            self._wins[a, b] += score
+            self._wins[b, a] += 1.0 - score
+            self._dirty = True
+            self.updated_at = time.time()
+        return True
+
+    def extend(self, triples: Iterable[Tuple[str, str, str]]) -> int:
+        """
+        Bulk-load (agent_a, agent_b, choice) triples, e.g. from the database.
+        The Elo ratings are replayed in order; the outcome table is built in
+        one vectorized pass.
+        """
+        a_ids, b_ids, scores = [], [], []
+        with self._lock:
+            for agent_a, agent_b, choice in triples:
+                score = CHOICE_SCORES.get(choice)
+                if score is None or agent_a == agent_b:
+                    continue
+                a_ids.append(self._agent_index(agent_a))
+                b_ids.append(self._agent_index(agent_b))
+                scores.append(score)
+            if not scores:
+                return 0
+            a = np.asarray(a_ids, dtype=np.int32)
+            b = np.asarray(b_ids, dtype=np.int32)
+            s = np.asarray(scores, dtype=np.float32)
+            start = self.count
+            self._grow(start + len(s))
+            self._a[start : start + len(s)] = a
+            self._b[start : start + len(s)] = b
+            self._score[start : start + len(s)] = s
+            self.count += len(s)
+
+            n = len(self.agents)
+            self._wins += self._outcome_table(a, b, s, n)
+            self._elo = self._replay_elo(a, b, s, self._elo)
+            self._dirty = True
+            self.updated_at = time.time()
+        return len(s)
+
+    @staticmethod
+    def _outcome_table(a, b, s, n) -> np.ndarray:
+        wins = np.bincount(a * n + b, weights=s, minlength=n * n)
+        wins += np.bincount(b * n + a, weights=1.0 - s, minlength=n * n)
+        return wins.reshape(n, n)
+
+    @staticmethod
+    def _replay_elo(a, b, s, elo, k: float = ELO_K) -> np.ndarray:
+        elo = elo.copy()
+        for i, j, score in zip(a.tolist(), b.tolist(), s.tolist()):
+            expected = 1.0 / (1.0 + 10 ** ((elo[j] - elo[i]) / ELO_SCALE))
+            elo[i] += k * (score - expected)
+            elo[j] -= k * (score - expected)
+        return elo
+
+    def replay_elo(self, k: float = ELO_K) -> Dict[str, float]:
+        """Online Elo recomputed from scratch over the stored triples."""
+        with self._lock:
+            a = self._a[: self.count].copy()
+            b = self._b[: self.count].copy()
+            s = self._score[: self.count].copy()
+            agents = list(self.agents)
+        elo = self._replay_elo(a, b, s, np.full(len(agents), ELO_BASE), k)
+        return dict(zip(agents, elo.tolist()))
+
+    def _bootstrap(
+        self, wins: np.ndarray, strengths: np.ndarray, rounds: int
+    ) -> np.ndarray:
+        """
+        95% intervals of the Elo-scaled ratings from resampled tables, NaN
+        for agents without games.
+        """
+        n = wins.shape[0]
+        # Resample whole votes: each (i, j) cell is a category, with
+        # decisive and tied outcomes split into half-vote units
+        units = np.rint(wins * 2).ravel()
+        total = int(units.sum())
+        if total == 0:
+            return np.full((n, 2), np.nan)
+        probabilities = units / units.sum()
+        samples = np.empty((rounds, n))
+        for r in range(rounds):
+            resampled = self._rng.multinomial(total, probabilities) / 2.0
+            samples[r] = strengths_to_elo(
+                fit_bradley_terry(resampled.reshape(n, n), strengths, 200, 1e-6)
+            )
+        intervals = np.percentile(samples, [2.5, 97.5], axis=0).T
+        intervals[(wins + wins.T).sum(axis=1) == 0] = np.nan
+        return intervals
+
+    def refresh(self, bootstrap: Optional[bool] = None) -> None:
+        """
+        Refit Bradley-Terry if new votes arrived, and the bootstrap intervals
+        when ``bootstrap`` is True or BOOTSTRAP_EVERY votes came in since the
+        last ones.
+
+        The fits run on copies outside the lock; the results are swapped in
+        under it, padded for agents that record() added in the meantime (with
+        no interval: they were not part of the bootstrap).
+        """
+        with self._lock:
+            wins = self._wins.copy()
+            count = self.count
+            dirty = self._dirty
+            self._dirty = False
+            strengths = None if self._strengths is None else self._strengths.copy()
+            intervals = self._intervals
+        n = len(wins)
+        if dirty or strengths is None:
+            strengths = fit_bradley_terry(wins, strengths)
+        if bootstrap is None:
+            bootstrap = (
+                intervals is None
+                or len(intervals) != n
+                or count - self._votes_at_bootstrap >= BOOTSTRAP_EVERY
+            )
+        if bootstrap:
+            intervals = self._bootstrap(wins, strengths, BOOTSTRAP_ROUNDS)
+        with self._lock:
+            added = len(self.agents) - n
+            self._strengths = np.append(strengths, np.ones(added))
+            if bootstrap:
+                self._intervals = np.vstack([intervals, np.full((added, 2), np.nan)])
+                self._bootstrap_games = np.append(
+                    (wins + wins.T).sum(axis=1), np.zeros(added)
+                )
+                self._votes_at_bootstrap = count
+
+    def snapshot(self) -> List[Dict]:
+        """Agents sorted by Bradley-Terry rating, with intervals and records."""
+        self.refresh()
+        with self._lock:
+            wins = self._wins.copy()
+            elo = self._elo.copy()
+            agents = list(self.agents)
+            ratings = strengths_to_elo(self._strengths[: len(agents)])
+            intervals = self._intervals[: len(agents)]
+            bootstrap_games = self._bootstrap_games[: len(agents)]
+        games = wins + wins.T
+        rows = []
+        for i, agent_id in enumerate(agents):
+            known = not np.isnan(intervals[i, 0])
+            rows.append(
+                {
+                    "agent_id": agent_id,
+                    "rating": round(float(ratings[i]), 1),
+                    "ci_low": round(float(intervals[i, 0]), 1) if known else None,
+                    "ci_high": round(float(intervals[i, 1]), 1) if known else None,
+                    # Games played since the intervals were computed
+                    "ci_stale": bool(games[i].sum() != bootstrap_games[i]),
+                    "elo": round(float(elo[i]), 1),
+                    "votes": int(round(games[i].sum())),
+                    "score": round(float(wins[i].sum()), 1),
+                }
+            )
+        return sorted(rows, key=lambda row: row["rating"], reverse=True)
+
+
+def load_leaderboard(executor, batch_size: int = 10000) -> Leaderboard:
+    """Build a leaderboard from every stored choice, streaming the rows."""
+    from db_schema import DeepResearchUserResponse
+    from sqlalchemy import select
+
+    leaderboard = Leaderboard()
+    result = executor.execute(
+        select(
+            DeepResearchUserResponse.agentid_a,
+            DeepResearchUserResponse.agentid_b,
+            DeepResearchUserResponse.userresponse,
+        )
+        .order_by(DeepResearchUserResponse.lastupdated)
+        .execution_options(yield_per=batch_size)
+    )
+    for rows in result.partitions():
+        leaderboard.extend(rows)
+    return leaderboard
@@ -0,0 +1,123 @@
+"""
+Copy rows from the legacy wide conversation_history table into the normalized
+conversations / conversation_agent_responses tables.
+
+Each legacy row keeps its id as the conversation id and becomes one response
+row per agent column group (position 0, 1, 2 for agents A, B, C). The copy
+is done with INSERT ... SELECT inside the database and skips rows that were
+already migrated, so it can be re-run safely.
+
+Usage:
+    python migrate_conversation_history.py
+"""
+
+from db_schema import (
+    Conversation,
+    ConversationAgentResponse,
+    ConversationHistory,
+    random_uuid,
+)
+from sqlalchemy import LargeBinary, exists, func, insert, inspect, literal, select
+
+LEGACY_AGENT_COLUMNS = ("a", "b", "c")
+
+
+def _binary_columns(connection, table) -> set:
+    """
+    Columns of ``table`` that are bytea on Postgres (compressed text columns
+    after migration 0004). Legacy text is copied into them as plain UTF-8,
+    which reads back unchanged, and compressed later by
+    compress_text_columns.py. Other databases accept the text as is.
+    """
+    if connection.dialect.name != "postgresql":
+        return set()
+    return {
+        column["name"]
+        for column in inspect(connection).get_columns(table)
+        if isinstance(column["type"], LargeBinary)
+    }
+
+
+def migrate_conversation_history(connection) -> dict:
+    """
+    Migrate legacy conversations on ``connection``. Returns the number of
+    conversation and response rows inserted.
+    """
+    if not inspect(connection).has_table(ConversationHistory.__tablename__):
+        return {"conversations": 0, "responses": 0}
+
+    legacy = ConversationHistory.__table__
+    conversations = Conversation.__table__
+    responses = ConversationAgentResponse.__table__
+
+    inserted_conversations = connection.execute(
+        insert(conversations).from_select(
+            ["id", "session_id", "timestamp", "question"],
+            select(
+                legacy.c.id, legacy.c.session_id, legacy.c.timestamp, legacy.c.question
+            ).where(~exists().where(conversations.c.id == legacy.c.id)),
+        )
+    ).rowcount
+
+    binary_columns = _binary_columns(connection, responses.name)
+
+    def as_stored(name):
+        column = legacy.c[f"agent_{label}_{name}"]
+        if name in binary_columns:
+            return func.convert_to(column, "UTF8")
+        return column
+
+    inserted_responses = 0
+    for position, label in enumerate(LEGACY_AGENT_COLUMNS):
+        inserted_responses += connection.execute(
+            insert(responses).from_select(
+                [
+                    "id",
+                    "conversation_id",
+                    "position",
+                    "timestamp",
+                    "agent_id",
+                    "agent_name",
+                    "response",
+                    "intermediate_steps",
+                    "citations",
+                ],
+                select(
+                    # One new id per row; the Python default would be shared
+                    random_uuid(),
+                    legacy.c.id,
+                    literal(position),
+                    legacy.c.timestamp,
+                    legacy.c[f"agent_{label}_id"],
+                    legacy.c[f"agent_{label}_name"],
+                    as_stored("response"),
+                    as_stored("intermediate_steps"),
+                    as_stored("citations"),
+                ).where(
+                    ~exists().where(
+                        (responses.c.conversation_id == legacy.c.id)
+                        & (responses.c.position == position)
+                    )
+                ),
+            )
+        ).rowcount
+
+    return {"conversations": inserted_conversations, "responses": inserted_responses}
+
+
+if __name__ == "__main__":
+    from database import get_engine
+    from dotenv import load_dotenv
+
+    load_dotenv("../../.env")  # Load from parent directory .env file
+    load_dotenv()  # Load from .env file and environment variables
+
+    engine = get_engine()
+    Conversation.__table__.create(bind=engine, checkfirst=True)
+    ConversationAgentResponse.__table__.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        counts = migrate_conversation_history(connection)
+    print(
+        f"Migrated {counts['conversations']} conversations "
+        f"({counts['responses']} agent responses)"
+    )
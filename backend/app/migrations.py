@@ -0,0 +1,488 @@
+"""
+Versioned schema migrations for the orchestrator database.
+
+Each migration is a function registered with ``@migration(version, name)``
+that receives a connection inside its own transaction. Applied versions are
+recorded in the ``schema_migrations`` table, so ``run_migrations`` only runs
+what is pending. The baseline creates the tables as they stood before the
+first migration, and later migrations bring them up to the current models.
+Databases created before the baseline was frozen got the current models
+from it, so every later migration must still be safe to run against a
+schema that already has its change (``IF NOT EXISTS``, inspector checks).
+
+Usage:
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list applied and pending migrations
+    python migrations.py --target 2 # apply up to version 2
+"""
+
+import argparse
+import fcntl
+import logging
+import re
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Set, Tuple
+
+from blob_store import get_blobs
+from db_schema import (
+    ContentBlob,
+    IntermediateStepVote,
+    RollupWatermark,
+    SchemaMigration,
+    UUIDType,
+    VoteRollup,
+    random_uuid,
+)
+from history_archive import PARTITIONED_TABLES, partition_table
+from migrate_conversation_history import migrate_conversation_history
+from sqlalchemy import (
+    TIMESTAMP,
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    Text,
+    func,
+    insert,
+    inspect,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.engine import Connection, Engine
+from vote_rollups import normalize_step_type
+
+logger = logging.getLogger(__name__)
+
+# Key for the Postgres advisory lock that serializes concurrent runners
+# (several containers or workers starting at once, see migration_lock)
+MIGRATION_LOCK_KEY = 5_001_031
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = []
+
+
+def migration(version: int, name: str):
+    def register(upgrade: Callable[[Connection], None]):
+        MIGRATIONS.append((version, name, upgrade))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return upgrade
+
+    return register
+
+
+def create_indexes(connection: Connection, table: str, indexes) -> None:
+    for name, columns in indexes:
+        connection.execute(
+            text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+        )
+
+
+# The tables as they stood before the first migration; never change these,
+# add a migration instead
+BASELINE = MetaData()
+
+Table(
+    "deepresearch_agents",
+    BASELINE,
+    Column("agent_uuid", UUIDType, primary_key=True),
+    Column("agent_id", String(64), nullable=False, unique=True),
+    Column("agent_name", Text),
+)
+
+Table(
+    "deepresearch_user_response",
+    BASELINE,
+    Column("id", String(128), primary_key=True),
+    Column("session_id", UUIDType, nullable=False, unique=True),
+    Column("agentid_a", String(128)),
+    Column("agentid_b", String(128)),
+    Column("question", String(65535)),
+    Column("conversation_a", Text),
+    Column("conversation_b", Text),
+    Column("userresponse", String(128)),
+    Column("lastupdated", TIMESTAMP, server_default=func.now()),
+)
+
+
+def _baseline_vote_table(name: str, text_column: str) -> Table:
+    return Table(
+        name,
+        BASELINE,
+        Column("id", UUIDType, primary_key=True, server_default=random_uuid()),
+        Column("session_id", UUIDType, nullable=False),
+        Column("timestamp", TIMESTAMP, server_default=func.now()),
+        Column("agent_id", String(128), nullable=False),
+        Column("vote", String(10), nullable=False),
+        Column(text_column, Text, nullable=False),
+    )
+
+
+_baseline_vote_table("answer_span_votes", "highlighted_text")
+_baseline_vote_table("intermediate_step_votes", "intermediate_step")
+
+Table(
+    "conversations",
+    BASELINE,
+    Column("id", UUIDType, primary_key=True, server_default=random_uuid()),
+    Column("session_id", UUIDType, nullable=False),
+    Column("timestamp", TIMESTAMP, server_default=func.now()),
+    Column("question", Text, nullable=False),
+    Index("ix_conversations_timestamp", "timestamp"),
+)
+
+Table(
+    "conversation_agent_responses",
+    BASELINE,
+    Column("id", UUIDType, primary_key=True, server_default=random_uuid()),
+    Column(
+        "conversation_id",
+        UUIDType,
+        ForeignKey("conversations.id", ondelete="CASCADE"),
+        nullable=False,
+    ),
+    Column("position", Integer, nullable=False),
+    Column("timestamp", TIMESTAMP, server_default=func.now()),
+    Column("agent_id", String(128), nullable=False),
+    Column("agent_name", String(255), nullable=False),
+    Column("response", Text, nullable=False),
+    Column("intermediate_steps", Text),
+    Column("citations", Text),
+    Index(
+        "ix_conversation_agent_responses_conversation_position",
+        "conversation_id",
+        "position",
+        unique=True,
+    ),
+    Index(
+        "ix_conversation_agent_responses_agent_id_timestamp", "agent_id", "timestamp"
+    ),
+    Index("ix_conversation_agent_responses_timestamp", "timestamp"),
+)
+
+
+@migration(1, "baseline")
+def baseline(connection: Connection) -> None:
+    BASELINE.create_all(bind=connection, checkfirst=True)
+
+
+@migration(2, "normalize_conversation_history")
+def normalize_conversation_history(connection: Connection) -> None:
+    counts = migrate_conversation_history(connection)
+    logger.info(f"Copied legacy conversation history: {counts}")
+
+
+# Per-session lookups, per-agent time ranges and recent-first listings
+VOTE_AND_HISTORY_INDEXES = {
+    "answer_span_votes": [
+        ("ix_answer_span_votes_session_id", ["session_id"]),
+        ("ix_answer_span_votes_agent_id_timestamp", ["agent_id", "timestamp"]),
+        ("ix_answer_span_votes_timestamp", ["timestamp"]),
+    ],
+    "intermediate_step_votes": [
+        ("ix_intermediate_step_votes_session_id", ["session_id"]),
+        ("ix_intermediate_step_votes_agent_id_timestamp", ["agent_id", "timestamp"]),
+        ("ix_intermediate_step_votes_timestamp", ["timestamp"]),
+    ],
+    "deepresearch_user_response": [
+        (
+            "ix_deepresearch_user_response_agentid_a_lastupdated",
+            ["agentid_a", "lastupdated"],
+        ),
+        (
+            "ix_deepresearch_user_response_agentid_b_lastupdated",
+            ["agentid_b", "lastupdated"],
+        ),
+        ("ix_deepresearch_user_response_lastupdated", ["lastupdated"]),
+    ],
+    "conversations": [
+        ("ix_conversations_session_id", ["session_id"]),
+    ],
+}
+
+
+@migration(3, "vote_and_history_indexes")
+def vote_and_history_indexes(connection: Connection) -> None:
+    for table, indexes in VOTE_AND_HISTORY_INDEXES.items():
+        create_indexes(connection, table, indexes)
+
+
+# Columns mapped as CompressedText in db_schema.py
+COMPRESSED_TEXT_COLUMNS = {
+    "deepresearch_user_response": ["conversation_a", "conversation_b"],
+    "conversation_agent_responses": ["response", "intermediate_steps", "citations"],
+}
+
+
+@migration(4, "compressed_text_columns")
+def compressed_text_columns(connection: Connection) -> None:
+    """
+    Convert the large text columns to bytea, keeping existing values as plain
+    UTF-8 bytes; compress_text_columns.py compresses them afterwards. This
+    rewrites the tables under an exclusive lock. Other databases store the
+    bytes in the existing column, so there is nothing to change.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    inspector = inspect(connection)
+    for table, columns in COMPRESSED_TEXT_COLUMNS.items():
+        types = {c["name"]: c["type"] for c in inspector.get_columns(table)}
+        for column in columns:
+            if isinstance(types[column], LargeBinary):
+                continue
+            connection.execute(
+                text(
+                    f"ALTER TABLE {table} ALTER COLUMN {column} TYPE bytea "
+                    f"USING convert_to({column}, 'UTF8')"
+                )
+            )
+
+
+# Hash columns pointing into content_blobs, and the inline text columns they
+# replace (kept for legacy rows, so they become nullable)
+CONTENT_BLOB_COLUMNS = {
+    "deepresearch_user_response": {
+        "add": {
+            "conversation_a_hash": "VARCHAR(64)",
+            "conversation_b_hash": "VARCHAR(64)",
+        },
+        "nullable": [],
+    },
+    "answer_span_votes": {
+        "add": {
+            "highlighted_text_hash": "VARCHAR(64)",
+            "response_hash": "VARCHAR(64)",
+            "span_start": "INTEGER",
+            "span_end": "INTEGER",
+        },
+        "nullable": ["highlighted_text"],
+    },
+    "intermediate_step_votes": {
+        "add": {"intermediate_step_hash": "VARCHAR(64)"},
+        "nullable": ["intermediate_step"],
+    },
+    "conversation_agent_responses": {
+        "add": {
+            "response_hash": "VARCHAR(64)",
+            "intermediate_steps_hash": "VARCHAR(64)",
+            "citations_hash": "VARCHAR(64)",
+        },
+        "nullable": ["response"],
+    },
+}
+
+
+@migration(5, "content_blobs")
+def content_blobs(connection: Connection) -> None:
+    """
+    Add the content_blobs table and the hash columns that reference it. The
+    inline copies are moved into blobs afterwards by dedupe_content.py.
+    """
+    ContentBlob.__table__.create(bind=connection, checkfirst=True)
+    inspector = inspect(connection)
+    for table, changes in CONTENT_BLOB_COLUMNS.items():
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        for column, column_type in changes["add"].items():
+            if column not in existing:
+                connection.execute(
+                    text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                )
+        if connection.dialect.name == "postgresql":
+            for column in changes["nullable"]:
+                connection.execute(
+                    text(f"ALTER TABLE {table} ALTER COLUMN {column} DROP NOT NULL")
+                )
+        elif connection.dialect.name == "sqlite" and changes["nullable"]:
+            sqlite_drop_not_null(connection, table, changes["nullable"])
+
+
+def sqlite_drop_not_null(connection: Connection, table: str, columns) -> None:
+    """
+    Drop NOT NULL from ``columns``. SQLite can't alter a column, so the table
+    is recreated from its stored definition and its rows and indexes copied.
+    """
+    definition, indexes = None, []
+    for kind, sql in connection.execute(
+        text("SELECT type, sql FROM sqlite_master WHERE tbl_name = :table"),
+        {"table": table},
+    ):
+        if kind == "table":
+            definition = sql
+        elif sql:  # automatic indexes of constraints have no sql
+            indexes.append(sql)
+    changed = definition
+    for column in columns:
+        changed = re.sub(rf"(\n\s*{column} [^,\n]*?) NOT NULL", r"\1", changed, count=1)
+    if changed == definition:
+        return
+    rebuilt = f"{table}_rebuilt"
+    connection.execute(
+        text(changed.replace(f"CREATE TABLE {table}", f"CREATE TABLE {rebuilt}", 1))
+    )
+    connection.execute(text(f"INSERT INTO {rebuilt} SELECT * FROM {table}"))
+    connection.execute(text(f"DROP TABLE {table}"))
+    connection.execute(text(f"ALTER TABLE {rebuilt} RENAME TO {table}"))
+    for sql in indexes:
+        connection.execute(text(sql))
+
+
+@migration(6, "vote_rollups")
+def vote_rollups(connection: Connection) -> None:
+    """
+    Add the rollup tables and the normalized step type of step votes, filling
+    it in for existing votes so the first rollup run covers them.
+    """
+    VoteRollup.__table__.create(bind=connection, checkfirst=True)
+    RollupWatermark.__table__.create(bind=connection, checkfirst=True)
+    existing = {
+        c["name"] for c in inspect(connection).get_columns("intermediate_step_votes")
+    }
+    if "step_type" not in existing:
+        connection.execute(
+            text("ALTER TABLE intermediate_step_votes ADD COLUMN step_type VARCHAR(64)")
+        )
+
+    votes = IntermediateStepVote.__table__
+    rows = connection.execute(
+        select(
+            votes.c.id, votes.c.intermediate_step, votes.c.intermediate_step_hash
+        ).where(votes.c.step_type.is_(None))
+    ).all()
+    texts = get_blobs(connection, (row.intermediate_step_hash for row in rows))
+    for row in rows:
+        step = texts.get(row.intermediate_step_hash) or row.intermediate_step
+        connection.execute(
+            update(votes)
+            .where(votes.c.id == row.id)
+            .values(step_type=normalize_step_type(step))
+        )
+
+
+@migration(7, "partition_history")
+def partition_history(connection: Connection) -> None:
+    """
+    Range-partition the conversation and vote tables by month (see
+    history_archive.py). Each table is rebuilt and its rows copied under an
+    exclusive lock. Other databases keep plain tables.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    for model in PARTITIONED_TABLES:
+        if partition_table(connection, model):
+            logger.info(f"Partitioned {model.__tablename__} by month")
+
+
+@migration(8, "conversation_search")
+def conversation_search(connection: Connection) -> None:
+    """
+    Add the full-text search vector of conversations and, in Postgres, its GIN
+    index. Existing conversations are indexed by
+    ``python conversation_search.py --backfill``, which can run while the
+    orchestrator serves requests.
+    """
+    existing = {c["name"] for c in inspect(connection).get_columns("conversations")}
+    is_postgres = connection.dialect.name == "postgresql"
+    if "search_vector" not in existing:
+        column_type = "TSVECTOR" if is_postgres else "TEXT"
+        connection.execute(
+            text(f"ALTER TABLE conversations ADD COLUMN search_vector {column_type}")
+        )
+    if is_postgres:
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_conversations_search_vector "
+                "ON conversations USING GIN (search_vector)"
+            )
+        )
+
+
+def applied_versions(connection: Connection) -> Set[int]:
+    return set(connection.execute(select(SchemaMigration.version)).scalars())
+
+
+@contextmanager
+def migration_lock(connection: Connection) -> Iterator[None]:
+    """
+    Serialize concurrent runners: a Postgres advisory lock, or on a SQLite
+    file an exclusive lock on a file next to it, since every uvicorn worker
+    migrates an embedded database at startup.
+    """
+    if connection.dialect.name == "postgresql":
+        key = {"key": MIGRATION_LOCK_KEY}
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), key)
+        connection.commit()
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), key)
+            connection.commit()
+        return
+    path = connection.engine.url.database
+    if connection.dialect.name != "sqlite" or not path or path == ":memory:":
+        yield
+        return
+    with open(f"{path}.migrations.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run_migrations(engine: Engine, target: Optional[int] = None) -> List[str]:
+    """
+    Apply pending migrations up to ``target`` (default: all), each in its own
+    transaction. Returns the names of the migrations that were applied.
+    """
+    applied_now = []
+    with engine.connect() as connection:
+        # Lock first: the table creation and the applied versions have to see
+        # what a runner that held the lock before us did
+        with migration_lock(connection):
+            with connection.begin():
+                SchemaMigration.__table__.create(bind=connection, checkfirst=True)
+            applied = applied_versions(connection)
+            connection.commit()
+            for version, name, upgrade in MIGRATIONS:
+                if version in applied or (target is not None and version > target):
+                    continue
+                logger.info(f"Applying migration {version:04d}_{name}")
+                with connection.begin():
+                    upgrade(connection)
+                    connection.execute(
+                        insert(SchemaMigration).values(version=version, name=name)
+                    )
+                applied_now.append(f"{version:04d}_{name}")
+    return applied_now
+
+
+def migration_status(engine: Engine) -> List[Tuple[int, str, bool]]:
+    SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as connection:
+        applied = applied_versions(connection)
+    return [(version, name, version in applied) for version, name, _ in MIGRATIONS]
+
+
+if __name__ == "__main__":
+    from database import get_engine
+    from dotenv import load_dotenv
+
+    load_dotenv("../../.env")  # Load from parent directory .env file
+    load_dotenv()  # Load from .env file and environment variables
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--status", action="store_true")
+    parser.add_argument("--target", type=int)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.status:
+        for version, name, is_applied in migration_status(engine):
+            print(f"{version:04d}_{name}: {'applied' if is_applied else 'pending'}")
+    else:
+        applied_now = run_migrations(engine, target=args.target)
+        print(f"Applied {len(applied_now)} migrations: {applied_now}")
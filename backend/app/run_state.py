@@ -0,0 +1,459 @@
+"""
+Run state shared between orchestrator workers.
+
+A deep research run used to live only inside the generator of the worker
+that started it. To run several workers (or nodes) the orchestrator keeps
+the state that has to outlive a single connection behind this interface:
+
+- the run registry (which worker owns a run and whether it has finished),
+- the resume buffer (the frames emitted so far, so a client can reconnect),
+- the dedup map (idempotency keys, so a retried request joins the
+  existing run instead of starting three new agent calls).
+
+Backends are selected with RUN_STATE_URL:
+
+- ``memory://`` (default): process-local, only correct with one worker.
+  Resumes and idempotent retries must reach the worker that started the
+  run, so several workers need a load balancer that is sticky on the
+  ``dr_worker`` cookie the run responses set.
+- ``redis://host:6379/0`` / ``rediss://...``: any Redis-compatible server,
+  shared by every worker; requires the ``redis`` package. Any worker can
+  replay any run, whichever worker executes it.
+- ``local-redis://``: the Redis backend on top of an in-process stand-in,
+  for tests and single-process development.
+
+Every method is a coroutine: frames are appended and replayed from inside
+the streaming responses, so the Redis backend uses the ``redis.asyncio``
+client and a round trip never blocks the event loop.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+RUN_STATE_URL = os.getenv("RUN_STATE_URL", "memory://")
+RUN_TTL_SECONDS = int(os.getenv("RUN_TTL_SECONDS", "3600"))
+RUN_BUFFER_MAX_FRAMES = int(os.getenv("RUN_BUFFER_MAX_FRAMES", "500"))
+
+
+class RunStateBackend:
+    """Interface for run state storage. Frames are opaque JSON bytes."""
+
+    # True when every worker sees the same state
+    shared = False
+
+    async def register_run(self, run_id: str, session_id: Optional[str]) -> None:
+        raise NotImplementedError
+
+    async def get_run(self, run_id: str) -> Optional[Dict[str, str]]:
+        raise NotImplementedError
+
+    async def finish_run(self, run_id: str) -> None:
+        raise NotImplementedError
+
+    async def append_frame(self, run_id: str, frame: bytes) -> None:
+        raise NotImplementedError
+
+    async def get_frames(self, run_id: str, start: int) -> Tuple[List[bytes], int]:
+        """
+        Return the buffered frames from absolute index ``start`` onwards and
+        the index to ask for next time. Frames that fell out of the buffer are
+        skipped: each frame carries the cumulative agent state, but only the
+        run's first frame carries its metadata (the agents), so that frame is
+        kept apart and returned first when a replay from 0 finds it trimmed.
+        """
+        raise NotImplementedError
+
+    async def claim_request(self, dedup_key: str, run_id: str) -> Optional[str]:
+        """
+        Bind ``dedup_key`` to ``run_id``. Returns None if the claim succeeded,
+        or the run id that already holds the key.
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release connections; called once when the worker shuts down."""
+
+
+class InMemoryRunStateBackend(RunStateBackend):
+    """Process-local backend. Entries expire lazily after RUN_TTL_SECONDS."""
+
+    def __init__(
+        self,
+        ttl: int = RUN_TTL_SECONDS,
+        max_frames: int = RUN_BUFFER_MAX_FRAMES,
+    ):
+        self.ttl = ttl
+        self.max_frames = max_frames
+        self._lock = threading.Lock()
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        self._claims: Dict[str, Tuple[str, float]] = {}
+
+    def _expire(self, now: float) -> None:
+        for run_id in [k for k, v in self._runs.items() if v["expires"] < now]:
+            del self._runs[run_id]
+        for key in [k for k, v in self._claims.items() if v[1] < now]:
+            del self._claims[key]
+
+    async def register_run(self, run_id: str, session_id: Optional[str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            self._runs[run_id] = {
+                "meta": {
+                    "owner": WORKER_ID,
+                    "session_id": session_id or "",
+                    "started": str(now),
+                    "finished": "0",
+                },
+                "head": None,
+                "frames": [],
+                "dropped": 0,
+                "expires": now + self.ttl,
+            }
+
+    async def get_run(self, run_id: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            self._expire(time.time())
+            run = self._runs.get(run_id)
+            return dict(run["meta"]) if run else None
+
+    async def finish_run(self, run_id: str) -> None:
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run:
+                run["meta"]["finished"] = "1"
+
+    async def append_frame(self, run_id: str, frame: bytes) -> None:
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return
+            if run["head"] is None:
+                run["head"] = frame
+            run["frames"].append(frame)
+            overflow = len(run["frames"]) - self.max_frames
+            if overflow > 0:
+                del run["frames"][:overflow]
+                run["dropped"] += overflow
+
+    async def get_frames(self, run_id: str, start: int) -> Tuple[List[bytes], int]:
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return [], start
+            first = max(start - run["dropped"], 0)
+            frames = run["frames"][first:]
+            if start == 0 and run["dropped"]:
+                frames.insert(0, run["head"])
+            return frames, run["dropped"] + len(run["frames"])
+
+    async def claim_request(self, dedup_key: str, run_id: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            existing = self._claims.get(dedup_key)
+            if existing:
+                return existing[0]
+            self._claims[dedup_key] = (run_id, now + self.ttl)
+            return None
+
+
+class RedisRunStateBackend(RunStateBackend):
+    """
+    Backend for any Redis-compatible server. Only plain string, hash and list
+    commands and MULTI/EXEC are used, so KeyDB, Dragonfly or Valkey work as
+    well.
+
+    A run's frames are a list trimmed to the newest ``max_frames``, and its
+    hash counts every frame appended (``total``), so the frames trimmed so far
+    are ``total`` minus the list length. Both are written and read together in
+    transactions; the first frame is also kept under a key of its own.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        client: Any,
+        prefix: str = "deepresearch:",
+        ttl: int = RUN_TTL_SECONDS,
+        max_frames: int = RUN_BUFFER_MAX_FRAMES,
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_frames = max_frames
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    @staticmethod
+    def _str(value: Any) -> str:
+        return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+    async def register_run(self, run_id: str, session_id: Optional[str]) -> None:
+        key = self._key("run", run_id)
+        await self.client.hset(
+            key,
+            mapping={
+                "owner": WORKER_ID,
+                "session_id": session_id or "",
+                "started": str(time.time()),
+                "finished": "0",
+                "total": "0",
+            },
+        )
+        await self.client.expire(key, self.ttl)
+
+    async def get_run(self, run_id: str) -> Optional[Dict[str, str]]:
+        meta = await self.client.hgetall(self._key("run", run_id))
+        if not meta:
+            return None
+        return {self._str(k): self._str(v) for k, v in meta.items()}
+
+    async def finish_run(self, run_id: str) -> None:
+        key = self._key("run", run_id)
+        if await self.client.exists(key):
+            await self.client.hset(key, "finished", "1")
+
+    async def append_frame(self, run_id: str, frame: bytes) -> None:
+        run_key = self._key("run", run_id)
+        frames_key = self._key("frames", run_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.rpush(frames_key, frame)
+            pipe.ltrim(frames_key, -self.max_frames, -1)
+            pipe.hincrby(run_key, "total", 1)
+            pipe.set(self._key("head", run_id), frame, nx=True, ex=self.ttl)
+            pipe.expire(frames_key, self.ttl)
+            pipe.expire(run_key, self.ttl)
+            await pipe.execute()
+
+    async def _dropped(self, run_id: str) -> Optional[int]:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hget(self._key("run", run_id), "total")
+            pipe.llen(self._key("frames", run_id))
+            total, length = await pipe.execute()
+        return None if total is None else int(total) - length
+
+    async def get_frames(self, run_id: str, start: int) -> Tuple[List[bytes], int]:
+        dropped = await self._dropped(run_id)
+        while dropped is not None:
+            first = max(start - dropped, 0)
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.lrange(self._key("frames", run_id), first, -1)
+                pipe.hget(self._key("run", run_id), "total")
+                pipe.llen(self._key("frames", run_id))
+                pipe.get(self._key("head", run_id))
+                frames, total, length, head = await pipe.execute()
+            if total is None:
+                break
+            if int(total) - length != dropped:
+                # Trimmed since the count was read: the offset is off
+                dropped = int(total) - length
+                continue
+            frames = list(frames)
+            next_frame = dropped + first + len(frames)
+            if start == 0 and dropped and head is not None:
+                frames.insert(0, head)
+            return frames, next_frame
+        return [], start
+
+    async def claim_request(self, dedup_key: str, run_id: str) -> Optional[str]:
+        key = self._key("dedup", dedup_key)
+        if await self.client.set(key, run_id, nx=True, ex=self.ttl):
+            return None
+        existing = await self.client.get(key)
+        return self._str(existing) if existing is not None else None
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the subset of the ``redis.asyncio`` client used
+    above.
+
+    Values are stored as bytes like a real server returns them, so tests run
+    the same code paths as production without a Redis container.
+    """
+
+    def __init__(self) -> None:
+        # Reentrant, so a transaction can hold it across the commands it runs
+        self._lock = threading.RLock()
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+
+    @staticmethod
+    def _bytes(value: Any) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode("utf-8")
+
+    def _live(self, key: str) -> bool:
+        expires = self._expires.get(key)
+        if expires is not None and expires < time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    async def set(
+        self, key: str, value: Any, nx: bool = False, ex: Optional[int] = None
+    ) -> Optional[bool]:
+        with self._lock:
+            if nx and self._live(key):
+                return None
+            self._data[key] = self._bytes(value)
+            self._expires.pop(key, None)
+            if ex is not None:
+                self._expires[key] = time.time() + ex
+            return True
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._data[key] if self._live(key) else None
+
+    async def exists(self, key: str) -> int:
+        with self._lock:
+            return int(self._live(key))
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        with self._lock:
+            if not self._live(key):
+                return False
+            self._expires[key] = time.time() + seconds
+            return True
+
+    async def hset(
+        self,
+        key: str,
+        field: Optional[str] = None,
+        value: Any = None,
+        mapping: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        with self._lock:
+            if not self._live(key):
+                self._data[key] = {}
+            hash_value = self._data[key]
+            items = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            added = 0
+            for k, v in items.items():
+                k_bytes = self._bytes(k)
+                added += k_bytes not in hash_value
+                hash_value[k_bytes] = self._bytes(v)
+            return added
+
+    async def hget(self, key: str, field: str) -> Optional[bytes]:
+        with self._lock:
+            if not self._live(key):
+                return None
+            return self._data[key].get(self._bytes(field))
+
+    async def hgetall(self, key: str) -> Dict[bytes, bytes]:
+        with self._lock:
+            return dict(self._data[key]) if self._live(key) else {}
+
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        with self._lock:
+            if not self._live(key):
+                self._data[key] = {}
+            hash_value = self._data[key]
+            k_bytes = self._bytes(field)
+            new_value = int(hash_value.get(k_bytes, b"0")) + amount
+            hash_value[k_bytes] = self._bytes(new_value)
+            return new_value
+
+    async def rpush(self, key: str, *values: Any) -> int:
+        with self._lock:
+            if not self._live(key):
+                self._data[key] = []
+            self._data[key].extend(self._bytes(v) for v in values)
+            return len(self._data[key])
+
+    async def llen(self, key: str) -> int:
+        with self._lock:
+            return len(self._data[key]) if self._live(key) else 0
+
+    @staticmethod
+    def _range(values: List[bytes], start: int, end: int) -> List[bytes]:
+        start = max(len(values) + start, 0) if start < 0 else start
+        end = len(values) + end if end < 0 else end
+        return values[start : end + 1]
+
+    async def lrange(self, key: str, start: int, end: int) -> List[bytes]:
+        with self._lock:
+            if not self._live(key):
+                return []
+            return self._range(self._data[key], start, end)
+
+    async def ltrim(self, key: str, start: int, end: int) -> bool:
+        with self._lock:
+            if self._live(key):
+                self._data[key] = self._range(self._data[key], start, end)
+            return True
+
+    def pipeline(self, transaction: bool = True) -> "LocalPipeline":
+        return LocalPipeline(self)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class LocalPipeline:
+    """Queued LocalRedis commands, run together under its lock on execute()."""
+
+    def __init__(self, client: LocalRedis) -> None:
+        self._client = client
+        self._commands: List[Tuple[str, tuple, dict]] = []
+
+    async def __aenter__(self) -> "LocalPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self._commands = []
+
+    def __getattr__(self, name: str) -> Any:
+        def queue(*args: Any, **kwargs: Any) -> "LocalPipeline":
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> List[Any]:
+        with self._client._lock:
+            results = []
+            for name, args, kwargs in self._commands:
+                results.append(await getattr(self._client, name)(*args, **kwargs))
+        self._commands = []
+        return results
+
+
+def create_run_state_backend(url: str = RUN_STATE_URL) -> RunStateBackend:
+    """Build the backend selected by ``url`` (see module docstring)."""
+    if not url or url.startswith("memory://"):
+        logger.info("Run state backend: in-memory")
+        return InMemoryRunStateBackend()
+    if url.startswith("local-redis://"):
+        logger.info("Run state backend: in-process Redis stand-in")
+        backend = RedisRunStateBackend(LocalRedis())
+        backend.shared = False
+        return backend
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError(
+                "RUN_STATE_URL points at Redis but the redis package is not installed"
+            ) from e
+        logger.info("Run state backend: Redis")
+        return RedisRunStateBackend(redis.Redis.from_url(url))
+    raise ValueError(f"Unsupported RUN_STATE_URL: {url}")
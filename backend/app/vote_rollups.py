@@ -0,0 +1,250 @@
+"""
+Pre-aggregated counters for span and intermediate-step votes.
+
+``vote_rollups`` holds one counter per (day, agent, vote kind, step type,
+vote). An incremental job folds new raw votes into it: each source table has
+a watermark in ``rollup_watermarks``, and a run aggregates only the rows
+between the watermark and now minus ROLLUP_LAG_SECONDS (so transactions
+still in flight are not skipped), upserts the sums and advances the
+watermark in the same transaction. The watermark row is locked for the
+duration, so several workers or a cron job can run it concurrently without
+double counting.
+
+Dashboards read the counters, whose size depends on days x agents x step
+types, not on the number of raw votes.
+
+Settings are read from the environment:
+
+- ROLLUP_INTERVAL_SECONDS: how often the orchestrator runs the job in the
+  background (default 60, 0 disables it, e.g. when running this module from
+  cron instead)
+- ROLLUP_LAG_SECONDS (default 30)
+
+Usage:
+    python vote_rollups.py            # one incremental run
+    python vote_rollups.py --rebuild  # recompute from all raw votes
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import re
+from typing import Any, Dict, Optional
+
+from db_schema import AnswerSpanVote, IntermediateStepVote, RollupWatermark, VoteRollup
+from sqlalchemy import delete, func, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_INTERVAL_SECONDS = float(os.getenv("ROLLUP_INTERVAL_SECONDS", "60"))
+ROLLUP_LAG_SECONDS = float(os.getenv("ROLLUP_LAG_SECONDS", "30"))
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+_STEP_ACTION = re.compile(r"\*\*ACTION:\s*([A-Za-z]+)")
+_WORDS = re.compile(r"[a-z]+")
+_STOP_WORDS = {"the", "a", "an", "for", "of", "to", "with", "on", "in", "and"}
+
+
+def normalize_step_type(step: Optional[str]) -> str:
+    """
+    Coarse type of an intermediate step, for grouping votes: the ACTION of a
+    baseline agent step, "search"/"thought" for its observation and thought
+    blocks, otherwise the first two content words ("starting research",
+    "browsing urls").
+    """
+    if not step:
+        return "other"
+    match = _STEP_ACTION.search(step)
+    if match:
+        return match.group(1).lower()
+    if "**Search Queries**" in step:
+        return "search"
+    if "**Thought**" in step:
+        return "thought"
+    words = [w for w in _WORDS.findall(step[:200].lower()) if w not in _STOP_WORDS]
+    return " ".join(words[:2])[:64] or "other"
+
+
+# source name -> (model, vote kind, step type expression)
+SOURCES = {
+    "answer_span_votes": (AnswerSpanVote, "span", lambda model: literal("")),
+    "intermediate_step_votes": (
+        IntermediateStepVote,
+        "step",
+        lambda model: func.coalesce(model.step_type, "other"),
+    ),
+}
+
+
+def _upsert_counts(connection, select_counts) -> None:
+    rollups = VoteRollup.__table__
+    columns = ["day", "agent_id", "vote_kind", "step_type", "vote", "count"]
+    dialect_name = connection.dialect.name
+    if dialect_name not in ("postgresql", "sqlite"):
+        raise NotImplementedError(f"Vote rollups need upserts ({dialect_name})")
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    # The SELECT always has a WHERE, which SQLite needs to parse ON CONFLICT
+    statement = insert(rollups).from_select(columns, select_counts)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=[c for c in rollups.primary_key.columns],
+            set_={"count": rollups.c.count + statement.excluded.count},
+        )
+    )
+
+
+def run_rollups(connection, until: Optional[datetime.datetime] = None) -> Dict:
+    """
+    Fold votes newer than each source's watermark into vote_rollups. Runs in
+    the caller's transaction. Returns the new watermark per source.
+    """
+    if until is None:
+        now = connection.execute(select(func.now())).scalar_one()
+        until = now.replace(tzinfo=None) - datetime.timedelta(
+            seconds=ROLLUP_LAG_SECONDS
+        )
+    watermarks = {}
+    for name, (model, vote_kind, step_type) in SOURCES.items():
+        since = connection.execute(
+            select(RollupWatermark.last_timestamp)
+            .where(RollupWatermark.name == name)
+            .with_for_update()
+        ).scalar()
+        if since is None:
+            connection.execute(
+                RollupWatermark.__table__.insert().values(
+                    name=name, last_timestamp=EPOCH
+                )
+            )
+            since = EPOCH
+        if since >= until:
+            watermarks[name] = since
+            continue
+
+        day = func.date(model.timestamp)
+        kind = step_type(model)
+        _upsert_counts(
+            connection,
+            select(
+                day,
+                model.agent_id,
+                literal(vote_kind),
+                kind,
+                model.vote,
+                func.count(),
+            )
+            .where(model.timestamp > since, model.timestamp <= until)
+            .group_by(day, model.agent_id, kind, model.vote),
+        )
+        connection.execute(
+            update(RollupWatermark)
+            .where(RollupWatermark.name == name)
+            .values(last_timestamp=until)
+        )
+        watermarks[name] = until
+    return watermarks
+
+
+def rebuild_rollups(connection) -> Dict:
+    """
+    Drop all counters and recompute them from the raw votes. Votes already
+    moved out by history_archive.py are no longer counted.
+    """
+    connection.execute(delete(VoteRollup))
+    connection.execute(
+        update(RollupWatermark)
+        .where(RollupWatermark.name.in_(list(SOURCES)))
+        .values(last_timestamp=EPOCH)
+    )
+    return run_rollups(connection)
+
+
+def vote_stats(
+    executor, days: int = 30, agent_id: Optional[str] = None, top_steps: int = 10
+) -> Dict[str, Any]:
+    """
+    Per-agent up/down totals for span and step votes over the last ``days``
+    days, and the most downvoted step types, read from the counters only.
+    """
+    since = datetime.date.today() - datetime.timedelta(days=days)
+    query = select(
+        VoteRollup.agent_id,
+        VoteRollup.vote_kind,
+        VoteRollup.step_type,
+        VoteRollup.vote,
+        func.sum(VoteRollup.count).label("count"),
+    ).where(VoteRollup.day >= since)
+    if agent_id:
+        query = query.where(VoteRollup.agent_id == agent_id)
+    rows = executor.execute(
+        query.group_by(
+            VoteRollup.agent_id,
+            VoteRollup.vote_kind,
+            VoteRollup.step_type,
+            VoteRollup.vote,
+        )
+    ).all()
+
+    agents: Dict[str, Dict[str, int]] = {}
+    step_types: Dict[str, Dict[str, int]] = {}
+    for row in rows:
+        counts = agents.setdefault(
+            row.agent_id, {"span_up": 0, "span_down": 0, "step_up": 0, "step_down": 0}
+        )
+        key = f"{row.vote_kind}_{row.vote}"
+        if key in counts:
+            counts[key] += int(row.count)
+        if row.vote_kind == "step":
+            step = step_types.setdefault(row.step_type, {"up": 0, "down": 0})
+            if row.vote in step:
+                step[row.vote] += int(row.count)
+
+    agent_rows = []
+    for agent, counts in sorted(agents.items()):
+        up = counts["span_up"] + counts["step_up"]
+        total = up + counts["span_down"] + counts["step_down"]
+        agent_rows.append(
+            {
+                "agent_id": agent,
+                **counts,
+                "up_ratio": round(up / total, 4) if total else None,
+            }
+        )
+    step_rows = sorted(
+        (
+            {"step_type": step_type, **counts}
+            for step_type, counts in step_types.items()
+        ),
+        key=lambda row: row["down"],
+        reverse=True,
+    )[:top_steps]
+    watermark = executor.execute(
+        select(func.min(RollupWatermark.last_timestamp))
+    ).scalar()
+    return {
+        "since": since.isoformat(),
+        "agents": agent_rows,
+        "most_downvoted_steps": step_rows,
+        "up_to": watermark.isoformat() if watermark else None,
+    }
+
+
+if __name__ == "__main__":
+    from database import get_engine
+    from dotenv import load_dotenv
+
+    load_dotenv("../../.env")  # Load from parent directory .env file
+    load_dotenv()  # Load from .env file and environment variables
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+
+    with get_engine().begin() as connection:
+        if args.rebuild:
+            print(f"Rebuilt vote rollups up to {rebuild_rollups(connection)}")
+        else:
+            print(f"Vote rollups up to {run_rollups(connection)}")
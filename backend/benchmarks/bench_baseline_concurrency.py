@@ -0,0 +1,146 @@
+"""
+How concurrent research runs scale on one Simple DeepResearch process.
+
+Sends N concurrent POST /run requests to the service's ASGI app in-process,
+with the Gemini client and the ClueWeb/Serper search replaced by stand-ins
+that only wait (--model-ms, --search-ms) and make every run last --turns
+turns (searches, then an answer). For each concurrency level it reports the
+wall time, completed runs per second, the mean run time against the ideal
+(turns x latency, i.e. no queuing at all), and the threads and peak RSS of
+the process.
+
+Usage:
+    python benchmarks/bench_baseline_concurrency.py [--concurrency 1 8 32 64]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import resource
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "Simple_DeepResearch_server")
+)
+
+import httpx  # noqa: E402
+import main  # noqa: E402
+
+
+class FakeModels:
+    """Stands in for ``client.aio.models``: waits, then searches or answers."""
+
+    def __init__(self, latency: float, turns: int):
+        self.latency = latency
+        self.turns = turns
+
+    async def generate_content_stream(self, model, contents, config=None):
+        turn = contents.count("[Turn ") + 1
+        if turn >= self.turns:
+            text = "<answer>Final report.</answer>"
+        else:
+            text = f"<search>benchmark query {turn}</search>"
+        parts = [
+            SimpleNamespace(text="Reasoning about the sources.", thought=True),
+            SimpleNamespace(text=text, thought=False),
+        ]
+
+        async def stream():
+            await asyncio.sleep(self.latency)
+            yield SimpleNamespace(
+                candidates=[SimpleNamespace(content=SimpleNamespace(parts=parts))],
+                usage_metadata=None,
+            )
+
+        return stream()
+
+
+def install_fakes(model_latency: float, search_latency: float, turns: int) -> None:
+    # Inputs stay below the prompt cache minimum, so no caches are created
+    main._genai_client = SimpleNamespace(
+        aio=SimpleNamespace(models=FakeModels(model_latency, turns))
+    )
+
+    async def fake_search(query, num_docs=10, **kwargs):
+        await asyncio.sleep(search_latency)
+        return ["Title: result\n\nContent: " + "text " * 200], ["https://example.com"]
+
+    main.aquery_clueweb = fake_search
+
+
+async def one_run(client: httpx.AsyncClient) -> float:
+    start = time.perf_counter()
+    response = await client.post(
+        "/run",
+        json={"question": "How do concurrent research runs scale?"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    response.raise_for_status()
+    if b'"is_complete":true' not in response.content:
+        raise RuntimeError("run did not complete")
+    return time.perf_counter() - start
+
+
+async def run_level(concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        peak_threads = threading.active_count()
+
+        async def sample_threads():
+            nonlocal peak_threads
+            while True:
+                peak_threads = max(peak_threads, threading.active_count())
+                await asyncio.sleep(0.05)
+
+        sampler = asyncio.create_task(sample_threads())
+        start = time.perf_counter()
+        run_times = await asyncio.gather(*(one_run(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+        sampler.cancel()
+    return {
+        "wall": wall,
+        "mean_run": sum(run_times) / len(run_times),
+        "threads": peak_threads,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 8, 32, 64, 128]
+    )
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--model-ms", type=float, default=50)
+    parser.add_argument("--search-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    install_fakes(args.model_ms / 1000, args.search_ms / 1000, args.turns)
+    # Turns that search wait for the model and the search, the last one only
+    # for the model
+    ideal = (args.turns * args.model_ms + (args.turns - 1) * args.search_ms) / 1000
+
+    print(
+        f"{'runs':>5} {'wall s':>8} {'runs/s':>8} {'mean run s':>11} "
+        f"{'ideal s':>8} {'threads':>8} {'peak RSS MB':>12}"
+    )
+    for concurrency in args.concurrency:
+        # The service prints every turn; keep the table readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = asyncio.run(run_level(concurrency))
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(
+            f"{concurrency:>5} {result['wall']:>8.2f} "
+            f"{concurrency / result['wall']:>8.1f} {result['mean_run']:>11.2f} "
+            f"{ideal:>8.2f} {result['threads']:>8} {peak_mb:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,141 @@
+"""
+Microbenchmark for the streaming frame codec.
+
+Builds frames shaped like the ones the services actually emit (a per-token
+Perplexity update early and late in a run, and the orchestrator's combined
+three-agent state near the end of a run) and times encode/decode for stdlib
+json, orjson and MessagePack.
+
+Usage:
+    python benchmarks/bench_codec.py [--iterations 2000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import codec  # noqa: E402
+
+VOCABULARY = (
+    "battery solid-state electrolyte density lithium cathode anode cost "
+    "manufacturing research source report **evidence** suggests improves "
+    "compared the a of to in and with although recent studies über électrolyte "
+    "[1] [2] [3] 30% 500 Wh/kg cycle life safety thermal stability"
+).split()
+
+
+def make_report(num_chars, seed=0):
+    """Markdown-ish text with realistic (not degenerate) compressibility."""
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    while size < num_chars:
+        if rng.random() < 0.08:
+            chunk = f"\n\n## Section {rng.randint(1, 99)}\n\n"
+        elif rng.random() < 0.05:
+            chunk = f"\n| Metric | {rng.randint(1, 999)} |\n"
+        else:
+            words = rng.choices(VOCABULARY, k=rng.randint(6, 18))
+            chunk = " ".join(words).capitalize() + ". "
+        parts.append(chunk)
+        size += len(chunk)
+    return "".join(parts)[:num_chars]
+
+
+def make_citations(count):
+    return [
+        {"url": f"https://example.org/articles/{i}", "text": f"Source {i}"}
+        for i in range(count)
+    ]
+
+
+def make_frames():
+    steps = "|||---|||".join(
+        f"### Step {i}\n**Thought**\n\n1. {make_report(600)}" for i in range(12)
+    )
+    agent_state = {}
+    for label in ("agentA", "agentB", "agentC"):
+        agent_state.update(
+            {
+                f"{label}_intermediate_steps": steps,
+                f"{label}_final_report": make_report(20000),
+                f"{label}_is_intermediate": False,
+                f"{label}_is_complete": False,
+                f"{label}_citations": make_citations(25),
+                f"{label}_updated": label == "agentA",
+            }
+        )
+    agent_state["is_final"] = False
+
+    return {
+        "token_early": {
+            "intermediate_steps": make_report(800),
+            "final_report": make_report(200),
+            "is_intermediate": True,
+            "complete": False,
+        },
+        "token_late": {
+            "intermediate_steps": steps,
+            "final_report": make_report(15000),
+            "is_intermediate": False,
+            "complete": False,
+            "citations": make_citations(25),
+        },
+        "orchestrator_state": agent_state,
+    }
+
+
+def stdlib_encode(frame):
+    return f"data: {json.dumps(frame)}\n\n".encode("utf-8")
+
+
+def stdlib_decode(payload):
+    return json.loads(payload[len(b"data: ") :])
+
+
+def bench(fn, arg, iterations):
+    seconds = timeit.timeit(lambda: fn(arg), number=iterations)
+    return seconds / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    variants = [("json (stdlib)", stdlib_encode, stdlib_decode)]
+    if codec.orjson is not None:
+        variants.append(
+            ("orjson", codec.encode_sse, lambda p: codec.loads(p[len(b"data: ") :]))
+        )
+    if codec.msgpack is not None:
+        variants.append(
+            (
+                "msgpack",
+                codec.encode_msgpack,
+                lambda p: codec.msgpack.unpackb(p, raw=False),
+            )
+        )
+
+    print(
+        f"{'frame':<20} {'codec':<14} {'bytes':>9} {'encode us':>10} {'decode us':>10}"
+    )
+    for frame_name, frame in make_frames().items():
+        for codec_name, encode, decode in variants:
+            payload = encode(frame)
+            assert decode(payload) == frame
+            encode_us = bench(encode, frame, args.iterations)
+            decode_us = bench(decode, payload, args.iterations)
+            print(
+                f"{frame_name:<20} {codec_name:<14} {len(payload):>9} "
+                f"{encode_us:>10.1f} {decode_us:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
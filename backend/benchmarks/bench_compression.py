@@ -0,0 +1,105 @@
+"""
+Bandwidth vs CPU trade-off of per-frame flushed stream compression.
+
+Replays a synthetic deep research run through the orchestrator framing: three
+agents whose intermediate steps and final reports grow chunk by chunk, each
+update re-sending the cumulative state as one NDJSON frame. Every encoding
+and level is measured on the same frames, followed by a one-shot compression
+of a conversation history page.
+
+Usage:
+    python benchmarks/bench_compression.py [--updates 400] [--chunk-chars 120]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import codec  # noqa: E402
+import http_compression  # noqa: E402
+from bench_codec import make_citations, make_report  # noqa: E402
+
+LEVELS = {"gzip": [1, 6, 9], "br": [1, 4, 8], "zstd": [1, 3, 9]}
+
+
+def make_run_frames(updates, chunk_chars):
+    report = make_report(updates * chunk_chars)
+    state = {}
+    for label in ("agentA", "agentB", "agentC"):
+        state[f"{label}_intermediate_steps"] = None
+        state[f"{label}_final_report"] = None
+        state[f"{label}_citations"] = []
+    frames = []
+    for i in range(updates):
+        label = ("agentA", "agentB", "agentC")[i % 3]
+        size = (i // 3 + 1) * chunk_chars
+        state[f"{label}_final_report"] = report[:size]
+        state[f"{label}_intermediate_steps"] = report[: size // 2]
+        if i % 50 == 0:
+            state[f"{label}_citations"] = make_citations(i // 10)
+        payload = dict(state)
+        payload["agentA_updated"] = label == "agentA"
+        payload["agentB_updated"] = label == "agentB"
+        payload["agentC_updated"] = label == "agentC"
+        frames.append(codec.encode_ndjson(payload))
+    return frames
+
+
+def make_history_page(page_size=10):
+    conversations = []
+    for i in range(page_size):
+        conversations.append(
+            {
+                "id": f"conversation-{i}",
+                "question": "How do solid-state batteries compare?",
+                "agents": [
+                    {
+                        "id": agent,
+                        "response": make_report(20000, seed=i * 7 + j),
+                        "intermediate_steps": make_report(30000, seed=i * 7 + j + 3),
+                        "citations": codec.dumps(make_citations(25)),
+                    }
+                    for j, agent in enumerate(
+                        ("perplexity", "baseline", "gpt-researcher")
+                    )
+                ],
+            }
+        )
+    return codec.dumps_bytes({"status": "success", "conversations": conversations})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--updates", type=int, default=400)
+    parser.add_argument("--chunk-chars", type=int, default=120)
+    args = parser.parse_args()
+
+    frames = make_run_frames(args.updates, args.chunk_chars)
+    raw_bytes = sum(len(frame) for frame in frames)
+    print(f"Stream: {len(frames)} frames, {raw_bytes / 1e6:.2f} MB uncompressed")
+    print(
+        f"{'encoding':<10} {'level':>5} {'out MB':>8} {'saved':>7} {'cpu us/frame':>13}"
+    )
+    for encoding in http_compression.available_encodings():
+        for level in LEVELS[encoding]:
+            compressor = http_compression.StreamCompressor(encoding, level=level)
+            for frame in frames:
+                compressor.compress(frame)
+            compressor.finish()
+            stats = compressor.stats()
+            print(
+                f"{encoding:<10} {level:>5} {stats['bytes_out'] / 1e6:>8.3f} "
+                f"{1 - stats['ratio']:>7.1%} {stats['cpu_us_per_frame']:>13.1f}"
+            )
+
+    body = make_history_page()
+    print(f"\nHistory page: {len(body) / 1e3:.1f} KB uncompressed")
+    for encoding in http_compression.available_encodings():
+        compressed = http_compression.compress_body(body, encoding)
+        print(f"{encoding:<10} {len(compressed) / 1e3:>8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Searches and evidence tokens of a Simple DeepResearch run with and without
+the per-run document store.
+
+Replays the searches of a run (--searches of them, a --repeat share
+rewording an earlier query with a stopword and punctuation) against a
+stand-in search over a pool of documents, where related queries return
+overlapping documents. Every search goes through DocumentStore.find_search, add and
+select_evidence, as in LLMAgent.search. Reports the requests sent, the
+evidence tokens and the passages shown again while still in the input, for
+the store enabled and disabled, and the cost of a duplicate query lookup.
+
+Usage:
+    python benchmarks/bench_document_store.py [--searches 30] [--repeat 0.3]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "Simple_DeepResearch_server")
+)
+
+import passages  # noqa: E402
+from document_store import DocumentStore  # noqa: E402
+
+TOPICS = "solar wind hydrogen battery grid nuclear geothermal tidal".split()
+ASPECTS = "cost efficiency deployment policy storage emissions".split()
+FILLER = "market report energy data region growth trend analysis study".split()
+
+
+def document(topic, aspect, rng):
+    paragraphs = [
+        " ".join(rng.choice(FILLER + [topic, aspect]) for _ in range(60))
+        for _ in range(20)
+    ]
+    return "\n\n".join(paragraphs)
+
+
+def replay(store, searches, pool, num_docs):
+    requests, shown, tokens = 0, {}, 0
+    repeated = 0
+    for turn, (query, topic, aspect) in enumerate(searches, 1):
+        keys = store.find_search(query, num_docs)
+        if keys is None:
+            requests += 1
+            # Documents of the query's topic, then of its aspect
+            related = pool[topic] + pool[aspect]
+            documents = [related[(turn + i) % len(related)] for i in range(num_docs)]
+            urls = [f"https://example.com/{abs(hash(d)) % 10**8}" for d in documents]
+            keys = store.add(documents, urls)
+            store.record_search(query, num_docs, keys)
+        # The last 3 turns keep their observation (CONTEXT_KEEP_RECENT_TURNS)
+        selected, _ = store.select_evidence(
+            [query], keys, turn, set(range(turn - 3, turn))
+        )
+        for passage, _, _ in selected:
+            tokens += len(passage) / passages.CHARS_PER_TOKEN
+            # Already in the input through one of the last 3 turns
+            repeated += shown.get(passage, -10) >= turn - 3
+            shown[passage] = turn
+    return requests, tokens, repeated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--searches", type=int, default=30)
+    parser.add_argument("--repeat", type=float, default=0.3)
+    parser.add_argument("--num-docs", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pool = {word: [] for word in TOPICS + ASPECTS}
+    for topic in TOPICS:
+        for aspect in ASPECTS:
+            text = document(topic, aspect, rng)
+            pool[topic].append(text)
+            pool[aspect].append(text)
+    searches = []
+    for _ in range(args.searches):
+        if searches and rng.random() < args.repeat:
+            query, topic, aspect = rng.choice(searches)
+            # The same terms in the same order, with stopwords and punctuation
+            words = query.split()
+            words.insert(rng.randrange(1, len(words)), rng.choice(("the", "of", "in")))
+            searches.append((" ".join(words).capitalize() + "?", topic, aspect))
+        else:
+            topic, aspect = rng.choice(TOPICS), rng.choice(ASPECTS)
+            searches.append((f"{topic} {aspect} trends worldwide", topic, aspect))
+
+    print(
+        f"{'store':>8} {'requests':>9} {'evidence tokens':>16} {'still in input':>15}"
+    )
+    for enabled in (False, True):
+        store = DocumentStore(enabled=enabled)
+        with contextlib.redirect_stdout(io.StringIO()):
+            requests, tokens, repeated = replay(store, searches, pool, args.num_docs)
+        label = "enabled" if enabled else "disabled"
+        print(f"{label:>8} {requests:>9} {tokens:>16.0f} {repeated:>15}")
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for query, _, _ in searches:
+            store.find_search(query + " outlook", args.num_docs)
+    us = (time.perf_counter() - start) / len(searches) * 1e6
+    print(f"\nduplicate query lookup: {us:.0f} us over {len(searches)} searches")
+
+
+if __name__ == "__main__":
+    main()
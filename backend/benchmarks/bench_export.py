@@ -0,0 +1,175 @@
+"""
+Time and peak memory of exporting a million votes: paging through the table
+the way /api/conversation-history does, loading it with one .all(), and
+streaming it with history_export.py as NDJSON and Parquet.
+
+Fills intermediate_step_votes with --rows synthetic votes whose steps are
+shared blobs, then runs every mode in a fresh subprocess so each peak RSS is
+its own. Uses a scratch SQLite file unless --url points at another database
+(which must be empty or disposable).
+
+Usage:
+    python benchmarks/bench_export.py [--rows 1000000] [--url postgresql://...]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import codec  # noqa: E402
+import history_export  # noqa: E402
+import migrations  # noqa: E402
+from blob_store import get_blobs, put_blobs  # noqa: E402
+from database import create_database_engine  # noqa: E402
+from db_schema import IntermediateStepVote  # noqa: E402
+from sqlalchemy import func, insert, select  # noqa: E402
+
+AGENTS = ["perplexity", "baseline", "gpt-researcher", "open-deep-research"]
+PAGE_SIZE = 10000
+
+
+def populate(engine, rows: int, steps: int = 2000) -> None:
+    migrations.run_migrations(engine)
+    rng = random.Random(0)
+    with engine.begin() as connection:
+        hashes = put_blobs(
+            connection,
+            [
+                f"### Step {i}\n**Thought**\n\n" + "reasoning about the sources " * 20
+                for i in range(steps)
+            ],
+        )
+    start = datetime.datetime(2025, 1, 1)
+    batch = 50000
+
+    def random_uuid():
+        return uuid.UUID(int=rng.getrandbits(128))
+
+    for offset in range(0, rows, batch):
+        with engine.begin() as connection:
+            connection.execute(
+                insert(IntermediateStepVote.__table__),
+                [
+                    {
+                        "id": random_uuid(),
+                        "session_id": random_uuid(),
+                        "timestamp": start + datetime.timedelta(seconds=i * 30),
+                        "agent_id": AGENTS[i % len(AGENTS)],
+                        "vote": "up" if rng.random() < 0.6 else "down",
+                        "intermediate_step_hash": hashes[rng.randrange(steps)],
+                        "step_type": "thought",
+                    }
+                    for i in range(offset, min(rows, offset + batch))
+                ],
+            )
+
+
+def dump_rows(connection, rows) -> int:
+    """NDJSON size of ``rows`` with their step texts resolved, as the export does."""
+    texts = get_blobs(connection, (row.intermediate_step_hash for row in rows))
+    size = 0
+    for row in rows:
+        record = {
+            key: value if isinstance(value, (str, int, type(None))) else str(value)
+            for key, value in row._asdict().items()
+        }
+        record["intermediate_step"] = texts.get(record.pop("intermediate_step_hash"))
+        size += len(codec.dumps_bytes(record)) + 1
+    return size
+
+
+def run_mode(url: str, mode: str) -> dict:
+    """Export every vote in ``mode``; returns the output size and row count."""
+    engine = create_database_engine(url)
+    votes = IntermediateStepVote.__table__
+    size = rows = 0
+    if mode == "paged":
+        with engine.connect() as connection:
+            page = 0
+            while True:
+                batch = connection.execute(
+                    select(votes)
+                    .order_by(votes.c.timestamp.desc())
+                    .offset(page * PAGE_SIZE)
+                    .limit(PAGE_SIZE)
+                ).all()
+                connection.execute(select(func.count()).select_from(votes)).scalar()
+                if not batch:
+                    break
+                size += dump_rows(connection, batch)
+                rows += len(batch)
+                page += 1
+    elif mode == "all":
+        with engine.connect() as connection:
+            everything = connection.execute(select(votes)).all()
+            size = dump_rows(connection, everything)
+        rows = len(everything)
+    else:
+        for chunk in history_export.export(engine, votes.name, mode):
+            size += len(chunk)
+            rows += chunk.count(b"\n") if mode == "ndjson" else 0
+    return {"bytes": size, "rows": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--url")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        result = run_mode(args.url, args.mode)
+        result["seconds"] = time.perf_counter() - start
+        result["baseline_kb"] = baseline
+        result["peak_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(json.dumps(result))
+        return
+
+    scratch = None
+    url = args.url
+    if url is None:
+        scratch = tempfile.mkdtemp()
+        url = f"sqlite:///{os.path.join(scratch, 'export.db')}"
+    start = time.perf_counter()
+    populate(create_database_engine(url), args.rows)
+    print(f"Inserted {args.rows} votes in {time.perf_counter() - start:.1f} s")
+
+    print(
+        f"{'mode':<8} {'seconds':>8} {'rows/s':>10} {'output MB':>10} "
+        f"{'peak RSS MB':>12} {'over import':>12}"
+    )
+    for mode in ("paged", "all", "ndjson", "parquet"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--url", url, "--mode", mode],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{mode:<8} {result['seconds']:>8.1f} "
+            f"{args.rows / result['seconds']:>10.0f} "
+            f"{result['bytes'] / 1e6:>10.1f} "
+            f"{result['peak_kb'] / 1024:>12.0f} "
+            f"{(result['peak_kb'] - result['baseline_kb']) / 1024:>12.0f}"
+        )
+    if scratch:
+        shutil.rmtree(scratch)  # the database and its WAL files
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Cost of the leaderboard engine on a large synthetic vote history.
+
+Draws --votes pairwise choices between agents with known true ratings (ties
+and "both are bad" included), then times:
+
+- bulk load of all triples (what a worker does at startup),
+- a full recompute from scratch, as the offline script did,
+- one incremental record() per new choice,
+- a warm-started Bradley-Terry refit after new votes,
+- the batch bootstrap of the confidence intervals,
+
+and prints the fitted ratings next to the true ones.
+
+Usage:
+    python benchmarks/bench_leaderboard.py [--votes 1000000] [--agents 8]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import leaderboard  # noqa: E402
+
+
+def make_votes(count, true_ratings, seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(true_ratings)
+    a = rng.integers(0, n, count)
+    b = (a + rng.integers(1, n, count)) % n
+    p_a = 1.0 / (1.0 + 10 ** ((true_ratings[b] - true_ratings[a]) / 400.0))
+    u = rng.random(count)
+    decisive = rng.random(count) < 0.85
+    choices = np.where(
+        decisive,
+        np.where(u < p_a, "choice1", "choice2"),
+        np.where(u < 0.5, "choice3", "choice4"),
+    )
+    return a, b, choices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--votes", type=int, default=1000000)
+    parser.add_argument("--agents", type=int, default=8)
+    parser.add_argument("--new-votes", type=int, default=10000)
+    args = parser.parse_args()
+
+    # A fresh deployment, or one with only choices that carry no outcome
+    empty = leaderboard.Leaderboard(seed=0)
+    empty.extend([("agent-0", "agent-1", "choice5"), ("agent-0", "agent-0", "choice1")])
+    assert empty.snapshot() == []
+
+    true_ratings = np.linspace(1200, 800, args.agents)
+    agents = [f"agent-{i}" for i in range(args.agents)]
+    a, b, choices = make_votes(args.votes, true_ratings)
+    triples = list(
+        zip([agents[i] for i in a], [agents[i] for i in b], choices.tolist())
+    )
+
+    start = time.perf_counter()
+    board = leaderboard.Leaderboard(seed=0)
+    board.extend(triples)
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    board.refresh(bootstrap=False)
+    cold_fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    board.refresh(bootstrap=True)
+    bootstrap_s = time.perf_counter() - start
+
+    new_a, new_b, new_choices = make_votes(args.new_votes, true_ratings, seed=1)
+    start = time.perf_counter()
+    for i, j, choice in zip(new_a.tolist(), new_b.tolist(), new_choices.tolist()):
+        board.record(agents[i], agents[j], choice)
+    record_us = (time.perf_counter() - start) / args.new_votes * 1e6
+
+    start = time.perf_counter()
+    board.refresh(bootstrap=False)
+    warm_fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scratch = leaderboard.Leaderboard(seed=0)
+    scratch.extend(triples)
+    scratch.refresh(bootstrap=True)
+    recompute_s = time.perf_counter() - start
+
+    print(f"{board.count} votes, {args.agents} agents")
+    print(f"  bulk load (table + Elo replay)   {load_s * 1e3:10.1f} ms")
+    print(f"  full recompute incl. intervals   {recompute_s * 1e3:10.1f} ms")
+    print(f"  record() per new choice          {record_us:10.2f} us")
+    print(f"  Bradley-Terry refit, cold        {cold_fit_s * 1e3:10.2f} ms")
+    print(f"  Bradley-Terry refit, warm        {warm_fit_s * 1e3:10.2f} ms")
+    print(
+        f"  {f'bootstrap ({leaderboard.BOOTSTRAP_ROUNDS} rounds)':<32} "
+        f"{bootstrap_s * 1e3:10.1f} ms"
+    )
+
+    print(f"\n{'agent':<10} {'true':>7} {'BT':>8} {'95% CI':>17} {'Elo':>8}")
+    rows = {row["agent_id"]: row for row in board.snapshot()}
+    for agent, true_rating in zip(agents, true_ratings):
+        row = rows[agent]
+        print(
+            f"{agent:<10} {true_rating:>7.0f} {row['rating']:>8.1f} "
+            f"[{row['ci_low']:>7.1f}, {row['ci_high']:>7.1f}] {row['elo']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
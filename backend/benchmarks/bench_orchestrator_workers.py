@@ -0,0 +1,210 @@
+"""
+Throughput of the orchestrator against its number of uvicorn workers.
+
+Starts a stand-in agent service that streams --frames SSE frames per agent
+(intermediate steps growing by --step-bytes, one every --frame-ms), seeds
+an embedded SQLite database with the three agents, and launches app.py's
+app with WEB_CONCURRENCY = 1, 2, 4... workers on one socket. For each
+worker count it sends --runs POST /api/deepresearch-question requests,
+--concurrency at a time, reading every streamed frame, and reports completed
+runs per second, streamed frames per second and the mean run time.
+
+Scaling needs as many cores as workers; with RUN_STATE_URL=redis://... the
+frame buffer round trips are included (the default memory:// keeps it per
+worker, which is enough here since nothing resumes).
+
+Usage:
+    python benchmarks/bench_orchestrator_workers.py [--workers 1 2 4] [--runs 60]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def serve_agent(port: int, frames: int, frame_ms: float, step_bytes: int):
+    """Minimal HTTP server streaming normalized agent frames as SSE."""
+
+    async def handle(reader, writer):
+        headers = b""
+        while b"\r\n\r\n" not in headers:
+            chunk = await reader.read(65536)
+            if not chunk:
+                return
+            headers += chunk
+        head, body = headers.split(b"\r\n\r\n", 1)
+        length = 0
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        while len(body) < length:
+            body += await reader.read(65536)
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        steps = ""
+        for i in range(frames):
+            await asyncio.sleep(frame_ms / 1000)
+            steps += f"Step {i}: " + "x" * step_bytes + "\n"
+            frame = {"intermediate_steps": steps, "is_intermediate": True}
+            writer.write(f"data: {json.dumps(frame)}\n\n".encode())
+            await writer.drain()
+        final = {"final_report": "Report. " * 200, "complete": True}
+        writer.write(f"data: {json.dumps(final)}\n\n".encode())
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", port, backlog=1024)
+    async with server:
+        await server.serve_forever()
+
+
+def seed_database(url: str) -> None:
+    os.environ["DATABASE_URL"] = url
+    import database
+    import migrations
+    from db_schema import DeepResearchAgent
+
+    migrations.run_migrations(database.get_engine())
+    with database.get_session() as session:
+        for agent_id in ("perplexity", "baseline", "gpt-researcher"):
+            session.add(DeepResearchAgent(agent_id=agent_id, agent_name=agent_id))
+        session.commit()
+
+
+def wait_until_up(port: int, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("orchestrator did not start")
+
+
+async def drive(port: int, runs: int, concurrency: int):
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    frames = 0
+    durations = []
+
+    async def one_run(client):
+        nonlocal frames
+        async with semaphore:
+            start = time.perf_counter()
+            async with client.stream(
+                "POST",
+                f"http://127.0.0.1:{port}/api/deepresearch-question",
+                json={"question": "How do heat pumps compare?"},
+                headers={"Accept-Encoding": "identity"},
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    frames += bool(line)
+            durations.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        auth=("admin", "password"), timeout=600, limits=limits
+    ) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one_run(client) for _ in range(runs)))
+        wall = time.perf_counter() - start
+    return wall, frames, sum(durations) / len(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--runs", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=30)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--frame-ms", type=float, default=10)
+    parser.add_argument("--step-bytes", type=int, default=200)
+    parser.add_argument("--run-state-url", default="memory://")
+    parser.add_argument("--serve-agent", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_agent:
+        asyncio.run(
+            serve_agent(args.serve_agent, args.frames, args.frame_ms, args.step_bytes)
+        )
+        return
+
+    directory = tempfile.mkdtemp()
+    database_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    seed_database(database_url)
+    agent_port = free_port()
+    agent = subprocess.Popen(
+        [sys.executable, __file__, "--serve-agent", str(agent_port)]
+        + ["--frames", str(args.frames), "--frame-ms", str(args.frame_ms)]
+        + ["--step-bytes", str(args.step_bytes)]
+    )
+    agent_url = f"http://127.0.0.1:{agent_port}/"
+    print(f"cores: {os.cpu_count()}, run state: {args.run_state_url}")
+    print(
+        f"{'workers':>8} {'runs/s':>8} {'frames/s':>9} {'mean run s':>11} "
+        f"{'wall s':>7}"
+    )
+    try:
+        wait_until_up(agent_port)
+        for workers in args.workers:
+            port = free_port()
+            env = dict(
+                os.environ,
+                DATABASE_URL=database_url,
+                WEB_CONCURRENCY=str(workers),
+                RUN_STATE_URL=args.run_state_url,
+                PERPLEXITY_URL=agent_url,
+                BASELINE_URL=agent_url,
+                GPT_RESEARCHER_URL=agent_url,
+            )
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)]
+                + ["--workers", str(workers), "--log-level", "warning"],
+                cwd=APP_DIR,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_until_up(port)
+                asyncio.run(drive(port, workers, 1))  # warm every worker up
+                wall, frames, mean = asyncio.run(
+                    drive(port, args.runs, args.concurrency)
+                )
+                print(
+                    f"{workers:>8} {args.runs / wall:>8.2f} {frames / wall:>9.0f} "
+                    f"{mean:>11.2f} {wall:>7.2f}"
+                )
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        agent.terminate()
+        agent.wait()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Time to link the outlink anchors of a ClueWeb document, before and after
+the single-pass annotator.
+
+Builds a document of --words words with --outlinks outlinks whose anchors
+are phrases of the document (plus a --missing share that don't occur), and
+times:
+
+- the old annotator as retrieval.py called it, once per outlink appended
+  (only up to --loop-limit outlinks, it grows with their cube)
+- the old annotator called once, a find and a document copy per outlink
+- outlinks.annotate_outlinks, a find per outlink in the original text and
+  one rebuild
+
+The gain comes from calling the annotator once per document instead of once
+per outlink, and from not copying the document per matched anchor. The
+single pass reports more anchors as not found because it never matches
+inside a link it already inserted (see outlinks.py).
+
+Usage:
+    python benchmarks/bench_outlinks.py [--words 10000] [--outlinks 1000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "Simple_DeepResearch_server")
+)
+
+from outlinks import annotate_outlinks  # noqa: E402
+
+
+def old_match_outlinks_to_doc(outlinks, doc_text):
+    """retrieval.match_outlinks_to_doc before the single-pass annotator."""
+    exact_match_not_found = 0
+    not_matched_links = []
+    for outlink in outlinks:
+        url, urlhash, anchor_text, _, language, cweb_id = outlink
+        idx = doc_text.find(anchor_text)
+        if idx != -1:
+            doc_text = (
+                doc_text[:idx]
+                + f"[{anchor_text}]({url})"
+                + doc_text[idx + len(anchor_text) :]
+            )
+        else:
+            exact_match_not_found += 1
+            not_matched_links.append(f"[{anchor_text}]({url})")
+    doc_text += (
+        "Here are additional URLs and their anchor texts mentioned in this document:\n"
+        + "\n".join(not_matched_links)
+    )
+    return doc_text, exact_match_not_found, len(outlinks)
+
+
+def document_with_outlinks(args, rng):
+    vocabulary = [f"word{i}" for i in range(2000)]
+    words = [rng.choice(vocabulary) for _ in range(args.words)]
+    outlinks = []
+    for i in range(args.outlinks):
+        if rng.random() < args.missing:
+            anchor = f"missing anchor {i}"
+        else:
+            start = rng.randrange(len(words) - 4)
+            anchor = " ".join(words[start : start + rng.randint(1, 4)])
+        url = f"https://example.com/page/{i}"
+        outlinks.append((url, str(i), anchor, None, "en", f"clueweb22-en0000-{i}"))
+    return " ".join(words), outlinks
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def per_outlink_loop(outlinks, text):
+    valid_outlinks = []
+    for outlink in outlinks:
+        valid_outlinks.append(outlink)
+        result = old_match_outlinks_to_doc(valid_outlinks, text)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--words", type=int, default=10000)
+    parser.add_argument("--outlinks", type=int, default=1000)
+    parser.add_argument("--missing", type=float, default=0.2)
+    parser.add_argument("--loop-limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    text, outlinks = document_with_outlinks(args, random.Random(0))
+    print(f"document: {len(text) / 1024:.0f} KiB, {len(outlinks)} outlinks")
+
+    if len(outlinks) <= args.loop_limit:
+        _, loop = timed(per_outlink_loop, outlinks, text)
+        print(f"old, once per outlink appended: {loop * 1000:10.1f} ms")
+    (_, old_missing, _), old = timed(old_match_outlinks_to_doc, outlinks, text)
+    print(f"old, called once:               {old * 1000:10.1f} ms")
+    (_, missing), new = timed(annotate_outlinks, outlinks, text)
+    print(f"single pass:                    {new * 1000:10.1f} ms")
+    if len(outlinks) <= args.loop_limit:
+        print(f"speedup from calling once:      {loop / old:10.1f}x")
+    print(f"speedup of the single pass:     {old / new:10.1f}x")
+    print(f"anchors not found: old {old_missing}, single pass {missing}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Cost and size of the BM25 passage evidence of a Simple DeepResearch search.
+
+Builds the results of one search action (--queries queries, --docs documents
+each, --words words per document) out of filler text, with one sentence per
+query that answers it planted in a random document. Times
+passages.select_passages over the results and reports the evidence tokens
+against the tokens of the whole documents, and how many planted answers made
+it into the evidence.
+
+Usage:
+    python benchmarks/bench_passages.py [--queries 4] [--docs 5] [--words 3000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "Simple_DeepResearch_server")
+)
+
+import passages  # noqa: E402
+
+FILLER = (
+    "research market policy energy climate data report analysis growth system "
+    "model price region sector demand supply study result trend cost network"
+).split()
+TOPICS = ["geothermal", "hydrogen", "tidal", "perovskite", "biochar", "fusion"]
+
+
+def search_results(args, rng):
+    queries = [f"{topic} deployment cost" for topic in TOPICS[: args.queries]]
+    documents = []
+    for _ in range(args.queries * args.docs):
+        paragraphs = []
+        for _ in range(args.words // 60):
+            paragraphs.append(" ".join(rng.choice(FILLER) for _ in range(60)))
+        documents.append(paragraphs)
+    for topic in TOPICS[: args.queries]:
+        document = rng.choice(documents)
+        document.insert(
+            rng.randrange(len(document)),
+            f"{topic} deployment cost fell to 40 dollars per unit in 2024",
+        )
+    documents = ["\n\n".join(paragraphs) for paragraphs in documents]
+    urls = [f"https://example.com/{i}" for i in range(len(documents))]
+    return queries, documents, urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--queries", type=int, default=4)
+    parser.add_argument("--docs", type=int, default=5)
+    parser.add_argument("--words", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    queries, documents, urls = search_results(args, random.Random(0))
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        selected = passages.select_passages(queries, documents, urls)
+    ms = (time.perf_counter() - start) / args.repeat * 1000
+
+    evidence = passages.format_evidence(selected)
+    whole = sum(len(document) for document in documents) / passages.CHARS_PER_TOKEN
+    found = sum(f"{topic} deployment" in evidence for topic in TOPICS[: args.queries])
+    print(
+        f"{len(documents)} documents, "
+        f"{sum(len(passages.split_passages(d)) for d in documents)} passages"
+    )
+    print(f"select_passages: {ms:.1f} ms")
+    print(
+        f"tokens: whole documents {whole:.0f}, evidence "
+        f"{len(evidence) / passages.CHARS_PER_TOKEN:.0f} in {len(selected)} passages"
+    )
+    print(f"planted answers in evidence: {found}/{args.queries}")
+
+
+if __name__ == "__main__":
+    main()
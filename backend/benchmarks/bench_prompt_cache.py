@@ -0,0 +1,175 @@
+"""
+Prompt tokens served from cache and time to first token per turn of a
+Simple DeepResearch run, with and without explicit prompt caching.
+
+Runs LLMAgent.run_llm_loop against a stand-in for the Gemini client that
+implements cached content: a request's prompt is the cached prefix plus the
+contents sent, and its time to first token grows with the uncached tokens
+only (--ttft-ms plus --prefill-us per uncached token). Creating a cache takes
+as long as a request prefilling its tokens, and the tokens written to caches
+are counted, since they are billed like input. The model writes long
+thoughts, searches, and a report draft every fifth turn, like
+bench_turn_context.py; searches return instantly, with --result-words of
+text. Per turn it reports the
+prompt and cached tokens and the TTFT of both modes.
+
+Usage:
+    python benchmarks/bench_prompt_cache.py [--turns 30] [--prefill-us 20]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "Simple_DeepResearch_server")
+)
+
+import main  # noqa: E402
+from prompt_cache import PromptCache  # noqa: E402
+
+WORDS = (
+    "research model search result evidence source claim report section method "
+    "data study analysis figure market policy energy cost growth risk trend"
+).split()
+
+
+class FakeGemini:
+    """``client.aio`` with models.generate_content_stream and caches."""
+
+    def __init__(self, turns: int, ttft: float, prefill: float):
+        self.turns = turns
+        self.ttft = ttft
+        self.prefill = prefill
+        self.turn = 0
+        self.cached = {}
+        self.written = 0  # tokens processed to create caches
+        self.rng = random.Random(0)
+        self.aio = SimpleNamespace(models=self, caches=self)
+
+    def text(self, words: int) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(words))
+
+    async def create(self, model, config):
+        text = config["contents"][0]["parts"][0]["text"]
+        await asyncio.sleep(self.ttft + len(text) // 4 * self.prefill)
+        self.written += len(text) // 4
+        name = f"cachedContents/{len(self.cached)}"
+        self.cached[name] = text
+        return SimpleNamespace(name=name)
+
+    async def delete(self, name):
+        del self.cached[name]
+
+    async def generate_content_stream(self, model, contents, config=None):
+        self.turn += 1
+        prefix = self.cached.get((config or {}).get("cached_content"), "")
+        prompt_tokens = (len(prefix) + len(contents)) // 4
+        cached_tokens = len(prefix) // 4
+        if self.turn >= self.turns:
+            action = "<answer>Final report.</answer>"
+        elif self.turn % 5 == 0:
+            action = f"<scripts>{self.text(1500)}</scripts>"
+        else:
+            action = f"<search>{self.text(6)}</search>"
+        thought = self.text(400)
+        delay = self.ttft + (prompt_tokens - cached_tokens) * self.prefill
+
+        async def stream():
+            await asyncio.sleep(delay)
+            for part in (
+                SimpleNamespace(text=thought, thought=True),
+                SimpleNamespace(text=action, thought=False),
+            ):
+                yield SimpleNamespace(
+                    candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+                    usage_metadata=SimpleNamespace(
+                        prompt_token_count=prompt_tokens,
+                        cached_content_token_count=cached_tokens,
+                    ),
+                )
+
+        return stream()
+
+
+def fake_search(words: int):
+    rng = random.Random(1)
+
+    async def search(query, num_docs=10, **kwargs):
+        content = " ".join(rng.choice(WORDS) for _ in range(words)) or "result text"
+        return [f"Title: result\n\nContent: {content}"], ["https://example.com"]
+
+    return search
+
+
+async def run(mode: str, args) -> PromptCache:
+    main._genai_client = FakeGemini(
+        args.turns, args.ttft_ms / 1000, args.prefill_us / 1e6
+    )
+    main.aquery_clueweb = fake_search(args.result_words)
+    config = {
+        "max_turns": args.turns,
+        "num_docs": 1,
+        "max_try_time": 1,
+        "search_reminder_turn": 5,
+        "final_report_reminder_turn": 15,
+    }
+    agent = main.LLMAgent(config, is_flash=False)
+    original = main.PromptCache
+    main.PromptCache = lambda client, model: original(client, model, mode=mode)
+    prepare = original.prepare
+    waited = []
+
+    async def timed_prepare(self, *args, **kwargs):
+        # Time spent before the request is sent, e.g. waiting on a new cache
+        start = time.perf_counter()
+        result = await prepare(self, *args, **kwargs)
+        waited.append(time.perf_counter() - start)
+        return result
+
+    original.prepare = timed_prepare
+    try:
+        prompt = main.report_prompt.format(question="How do heat pumps compare?")
+        with contextlib.redirect_stdout(io.StringIO()):
+            async for _ in agent.run_llm_loop(prompt):
+                pass
+    finally:
+        main.PromptCache = original
+        original.prepare = prepare
+    return agent.prompt_cache, main._genai_client.written, sum(waited)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--prefill-us", type=float, default=20)
+    parser.add_argument("--result-words", type=int, default=0)
+    args = parser.parse_args()
+
+    implicit, _, _ = asyncio.run(run("implicit", args))
+    explicit, written, waited = asyncio.run(run("explicit", args))
+
+    print(
+        f"{'turn':>5} {'prompt tok':>11} {'cached':>8} {'TTFT ms':>8} "
+        f"{'cached (explicit)':>18} {'TTFT ms (explicit)':>19}"
+    )
+    for off, on in zip(implicit.turns, explicit.turns):
+        print(
+            f"{off['turn']:>5} {off['prompt_tokens']:>11} {off['cached_tokens']:>8} "
+            f"{off['ttft_ms']:>8.0f} {on['cached_tokens']:>18} {on['ttft_ms']:>19.0f}"
+        )
+    print(f"\nno explicit cache: {implicit.summary()}")
+    print(f"explicit cache:    {explicit.summary()}")
+    print(f"tokens written to caches: {written}")
+    print(f"time before requests (cache creation): {waited * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main_cli()
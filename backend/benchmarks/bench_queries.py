@@ -0,0 +1,216 @@
+"""
+Query latency of the vote and history tables before and after the indexes of
+migration 0003.
+
+Builds a synthetic dataset (several million vote and response rows spread
+over agents, sessions and a year of timestamps) with generate_series in a
+scratch Postgres schema, runs the orchestrator's per-session and analytics
+queries under EXPLAIN ANALYZE, applies the migration's indexes and runs them
+again. The scratch schema is dropped afterwards unless --keep is given.
+
+Needs a Postgres database; connection settings come from the same DB_*
+environment variables as the orchestrator, or from --url.
+
+Usage:
+    python benchmarks/bench_queries.py [--votes 3000000] [--responses 1000000]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import database  # noqa: E402
+import migrations  # noqa: E402
+from db_schema import (  # noqa: E402
+    AnswerSpanVote,
+    Conversation,
+    DeepResearchUserResponse,
+    IntermediateStepVote,
+)
+from sqlalchemy import create_engine, text  # noqa: E402
+
+SCHEMA = "bench_queries"
+AGENTS = ["perplexity", "baseline", "gpt-researcher", "open-deep-research", "storm"]
+SESSIONS = 200000
+
+POPULATE = {
+    "answer_span_votes": """
+        INSERT INTO answer_span_votes
+            (session_id, timestamp, agent_id, vote, highlighted_text)
+        SELECT
+            md5((i % {sessions})::text)::uuid,
+            now() - (random() * interval '365 days'),
+            (ARRAY{agents})[1 + i % {agent_count}],
+            CASE WHEN random() < 0.7 THEN 'up' ELSE 'down' END,
+            repeat('highlighted span ', 4)
+        FROM generate_series(1, {votes}) AS i
+    """,
+    "intermediate_step_votes": """
+        INSERT INTO intermediate_step_votes
+            (session_id, timestamp, agent_id, vote, intermediate_step)
+        SELECT
+            md5((i % {sessions})::text)::uuid,
+            now() - (random() * interval '365 days'),
+            (ARRAY{agents})[1 + i % {agent_count}],
+            CASE WHEN random() < 0.6 THEN 'up' ELSE 'down' END,
+            repeat('intermediate step ', 4)
+        FROM generate_series(1, {votes}) AS i
+    """,
+    "deepresearch_user_response": """
+        INSERT INTO deepresearch_user_response
+            (id, session_id, agentid_a, agentid_b, question, userresponse,
+             lastupdated)
+        SELECT
+            i::text,
+            md5(i::text)::uuid,
+            (ARRAY{agents})[1 + i % {agent_count}],
+            (ARRAY{agents})[1 + (i / {agent_count}) % {agent_count}],
+            'synthetic question ' || i,
+            'choice' || (1 + i % 4),
+            now() - (random() * interval '365 days')
+        FROM generate_series(1, {responses}) AS i
+    """,
+    "conversations": """
+        INSERT INTO conversations (session_id, timestamp, question)
+        SELECT
+            md5((i % {sessions})::text)::uuid,
+            now() - (random() * interval '365 days'),
+            'synthetic question ' || i
+        FROM generate_series(1, {responses}) AS i
+    """,
+}
+
+# (label, query): per-session lookups behind the vote/choice endpoints and the
+# per-agent / recent-first analytics queries
+QUERIES = [
+    (
+        "span votes of one session",
+        "SELECT * FROM answer_span_votes WHERE session_id = md5('4242')::uuid",
+    ),
+    (
+        "step votes of one session",
+        "SELECT * FROM intermediate_step_votes WHERE session_id = md5('4242')::uuid",
+    ),
+    (
+        "agent span votes, last 7 days",
+        "SELECT vote, count(*) FROM answer_span_votes"
+        " WHERE agent_id = 'perplexity' AND timestamp >= now() - interval '7 days'"
+        " GROUP BY vote",
+    ),
+    (
+        "latest 50 step votes",
+        "SELECT * FROM intermediate_step_votes ORDER BY timestamp DESC LIMIT 50",
+    ),
+    (
+        "agent A choices, last 30 days",
+        "SELECT userresponse, count(*) FROM deepresearch_user_response"
+        " WHERE agentid_a = 'baseline'"
+        " AND lastupdated >= now() - interval '30 days'"
+        " GROUP BY userresponse",
+    ),
+    (
+        "conversations of one session",
+        "SELECT id, timestamp FROM conversations"
+        " WHERE session_id = md5('4242')::uuid",
+    ),
+]
+
+
+def execution_ms(connection, query, runs):
+    """Median server-side execution time over ``runs`` EXPLAIN ANALYZE runs."""
+    times = []
+    for _ in range(runs):
+        plan = connection.execute(
+            text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}")
+        ).scalar_one()
+        times.append(plan[0]["Execution Time"])
+    return statistics.median(times), plan[0]["Plan"]["Node Type"]
+
+
+def run_queries(connection, runs):
+    return {label: execution_ms(connection, query, runs) for label, query in QUERIES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--votes", type=int, default=3000000)
+    parser.add_argument("--responses", type=int, default=1000000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    engine = create_engine(
+        args.url or database.database_url(),
+        connect_args={"options": f"-csearch_path={SCHEMA}"},
+    )
+    with engine.connect() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        connection.commit()
+
+        # Tables as they were before migration 0003: no secondary indexes
+        for model in (
+            AnswerSpanVote,
+            IntermediateStepVote,
+            DeepResearchUserResponse,
+            Conversation,
+        ):
+            model.__table__.create(bind=connection)
+            for index in model.__table__.indexes:
+                connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        connection.commit()
+
+        agents = "[" + ", ".join(f"'{agent}'" for agent in AGENTS) + "]"
+        for table, statement in POPULATE.items():
+            start = time.perf_counter()
+            connection.execute(
+                text(
+                    statement.format(
+                        agents=agents,
+                        agent_count=len(AGENTS),
+                        sessions=SESSIONS,
+                        votes=args.votes,
+                        responses=args.responses,
+                    )
+                )
+            )
+            connection.commit()
+            print(f"Populated {table} in {time.perf_counter() - start:.1f} s")
+        connection.execute(text("ANALYZE"))
+        connection.commit()
+
+        before = run_queries(connection, args.runs)
+
+        start = time.perf_counter()
+        with connection.begin():
+            migrations.vote_and_history_indexes(connection)
+        print(f"Built migration 0003 indexes in {time.perf_counter() - start:.1f} s")
+        connection.execute(text("ANALYZE"))
+        connection.commit()
+
+        after = run_queries(connection, args.runs)
+
+        print(
+            f"\n{'query':<32} {'before ms':>10} {'after ms':>10} {'speedup':>8}  plan"
+        )
+        for label, _ in QUERIES:
+            before_ms, before_plan = before[label]
+            after_ms, after_plan = after[label]
+            print(
+                f"{label:<32} {before_ms:>10.2f} {after_ms:>10.2f} "
+                f"{before_ms / max(after_ms, 1e-3):>7.0f}x  "
+                f"{before_plan} -> {after_plan}"
+            )
+
+        if not args.keep:
+            connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+            connection.commit()
+
+
+if __name__ == "__main__":
+    main()
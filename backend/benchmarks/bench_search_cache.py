@@ -0,0 +1,112 @@
+"""
+Hit rate, latency saved and lookup cost of the Simple DeepResearch search
+result cache.
+
+Replays searches whose queries follow a Zipf distribution (a few queries
+asked by many runs, a long tail asked once) through
+search_cache.acached_search, with a stand-in search that waits --search-ms.
+Two workers with their own memory tier share one SQLite file, as on a node.
+Reports the hit rate per tier, the search time saved, and the cost of a
+memory hit, a SQLite hit and a miss.
+
+Usage:
+    python benchmarks/bench_search_cache.py [--searches 2000] [--queries 1000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "Simple_DeepResearch_server")
+)
+
+import search_cache  # noqa: E402
+
+DOCUMENT = "Title: result\n\nContent: " + "search result text " * 300
+
+
+def zipf_queries(count: int, vocabulary: int, seed: int = 0):
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, vocabulary + 1)]
+    ranks = rng.choices(range(vocabulary), weights=weights, k=count)
+    return [f"benchmark query number {rank}" for rank in ranks]
+
+
+async def replay(workers, queries, search_ms: float):
+    async def search(query):
+        await asyncio.sleep(search_ms / 1000)
+        return [DOCUMENT], [f"https://example.com/{abs(hash(query))}"]
+
+    for i, query in enumerate(queries):
+        search_cache.cache = workers[i % len(workers)]
+        await search_cache.acached_search(
+            "serper", query, 1, lambda query=query: search(query)
+        )
+
+
+def lookup_cost(cache, key: str, repeat: int = 2000) -> float:
+    """Mean microseconds of ``cache.get(key)``."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        cache.get(key)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--searches", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--search-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "search_cache.sqlite3")
+    workers = [search_cache.SearchCache(path=path, memory_entries=256) for _ in "ab"]
+    queries = zipf_queries(args.searches, args.queries)
+
+    start = time.perf_counter()
+    asyncio.run(replay(workers, queries, args.search_ms))
+    wall = time.perf_counter() - start
+    totals = {}
+    for worker in workers:
+        for name, value in worker.stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[name] = totals.get(name, 0) + value
+    lookups = totals["memory_hits"] + totals["disk_hits"] + totals["misses"]
+    uncached = args.searches * args.search_ms / 1000
+    print(f"searches: {args.searches} over {args.queries} distinct queries")
+    print(
+        f"memory hits {totals['memory_hits'] / lookups:.1%}, "
+        f"SQLite hits {totals['disk_hits'] / lookups:.1%}, "
+        f"misses {totals['misses'] / lookups:.1%}"
+    )
+    print(
+        f"wall {wall:.2f} s vs {uncached:.2f} s uncached; "
+        f"search time saved {totals['saved_ms'] / 1000:.2f} s"
+    )
+
+    worker = workers[0]
+    key = search_cache.cache_key("serper", queries[0], 1)
+    worker.get(key)
+    memory_us = lookup_cost(worker, key)
+    cold = search_cache.SearchCache(path=path, memory_entries=0)
+    disk_us = lookup_cost(cold, key)
+    miss_us = lookup_cost(cold, search_cache.cache_key("serper", "never asked", 1))
+    print(
+        f"lookup cost: memory hit {memory_us:.1f} us, SQLite hit {disk_us:.1f} us, "
+        f"miss {miss_us:.1f} us"
+    )
+    size = os.path.getsize(path)
+    print(f"SQLite file: {size / 1024:.0f} KiB")
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
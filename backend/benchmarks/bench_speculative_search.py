@@ -0,0 +1,110 @@
+"""
+Turn time of a Simple DeepResearch run with and without speculative search.
+
+Runs LLMAgent.run_llm_loop against a stand-in for the streaming Gemini
+client: each turn streams its thought (--think-ms), then the action, then
+keeps the stream open for --tail-ms (the rest of the response and the
+closing chunk), while searches take --search-ms. With speculative search the
+search starts when ``</search>`` arrives and overlaps the tail. Reports the
+run time of both modes and the per-turn search time hidden behind
+generation.
+
+Usage:
+    python benchmarks/bench_speculative_search.py [--tail-ms 150] [--search-ms 400]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "Simple_DeepResearch_server")
+)
+
+import main  # noqa: E402
+
+
+class FakeModels:
+    """``client.aio.models`` whose responses stream with the given timing."""
+
+    def __init__(self, args):
+        self.args = args
+        self.turn = 0
+
+    def chunk(self, text, thought):
+        part = SimpleNamespace(text=text, thought=thought)
+        return SimpleNamespace(
+            candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+            usage_metadata=None,
+        )
+
+    async def generate_content_stream(self, model, contents, config=None):
+        self.turn += 1
+        if self.turn >= self.args.turns:
+            action = "<answer>Final report.</answer>"
+        else:
+            action = f"<search>benchmark query {self.turn}</search>"
+        args = self.args
+
+        async def stream():
+            await asyncio.sleep(args.think_ms / 1000)
+            yield self.chunk("Reasoning about the sources.", True)
+            yield self.chunk(action, False)
+            await asyncio.sleep(args.tail_ms / 1000)
+            yield self.chunk("", False)
+
+        return stream()
+
+
+async def run(speculative: bool, args):
+    main.SPECULATIVE_SEARCH = speculative
+    main._genai_client = SimpleNamespace(aio=SimpleNamespace(models=FakeModels(args)))
+
+    async def fake_search(query, num_docs=10, **kwargs):
+        await asyncio.sleep(args.search_ms / 1000)
+        return [f"Title: {query}\n\nContent: text"], [f"https://example.com/{query}"]
+
+    main.aquery_clueweb = fake_search
+    config = {
+        "max_turns": args.turns,
+        "num_docs": 1,
+        "max_try_time": 1,
+        "search_reminder_turn": args.turns,
+        "final_report_reminder_turn": args.turns,
+    }
+    agent = main.LLMAgent(config, is_flash=False)
+    prompt = main.report_prompt.format(question="How do heat pumps compare?")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        async for _ in agent.run_llm_loop(prompt):
+            pass
+    return time.perf_counter() - start, agent.prefetch_turns
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--think-ms", type=float, default=500)
+    parser.add_argument("--tail-ms", type=float, default=150)
+    parser.add_argument("--search-ms", type=float, default=400)
+    args = parser.parse_args()
+
+    sequential, _ = asyncio.run(run(False, args))
+    speculative, turns = asyncio.run(run(True, args))
+
+    print(f"{'turn':>5} {'search ms':>10} {'hidden ms':>10}")
+    for turn in turns:
+        print(f"{turn['turn']:>5} {turn['search_ms']:>10.0f} {turn['saved_ms']:>10.0f}")
+    print(
+        f"\nrun: sequential {sequential:.2f} s, speculative {speculative:.2f} s "
+        f"({(sequential - speculative) / sequential:.0%} faster)"
+    )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,117 @@
+"""
+Import and startup time of each backend service.
+
+Every measurement runs in a fresh interpreter, the way a container cold
+start or a new autoscaled replica does. For each service it reports:
+
+- import: wall time of ``import <module>`` (builds the app object),
+- factory: time of an extra ``create_app()`` call,
+- warmup: time of the service's warmup hook (SDK imports, client and pool
+  construction that the factories defer to first use),
+- the heaviest modules from ``python -X importtime``.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--service app] [--top 8]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SERVICES = {
+    "app": ("app", "app", "app.warmup()"),
+    "perplexity_server": ("perplexity_server", "main", None),
+    "gpt_researcher_server": (
+        "gpt_researcher_server",
+        "main",
+        "main.load_researcher_class()",
+    ),
+    "Simple_DeepResearch_server": (
+        "Simple_DeepResearch_server",
+        "main",
+        "main.get_genai_client()",
+    ),
+}
+
+PROBE = """
+import time
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+{module}.create_app()
+t2 = time.perf_counter()
+warmup_s = float("nan")
+if {warmup!r}:
+    try:
+        exec({warmup!r})
+        warmup_s = time.perf_counter() - t2
+    except Exception:
+        pass
+print("RESULT", t1 - t0, t2 - t1, warmup_s)
+"""
+
+
+def run_probe(directory, module, warmup):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, warmup=warmup or "")],
+        cwd=os.path.join(BACKEND_DIR, directory),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith("RESULT"):
+            return [float(value) for value in line.split()[1:]]
+    raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+
+def heaviest_imports(directory, module, top):
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.join(BACKEND_DIR, directory),
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        # Keep only the direct imports of the service module (indented one
+        # level below it), so nested imports are not double counted
+        if len(name) - len(name.lstrip()) == 3:
+            rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--service", choices=sorted(SERVICES), action="append")
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    for service in args.service or SERVICES:
+        directory, module, warmup = SERVICES[service]
+        try:
+            results = [run_probe(directory, module, warmup) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{service}: could not import ({e})\n")
+            continue
+        imports, factories, warmups = zip(*results)
+        print(f"{service}")
+        print(f"  import   median {statistics.median(imports) * 1e3:8.1f} ms")
+        print(f"  factory  median {statistics.median(factories) * 1e3:8.1f} ms")
+        print(f"  warmup   median {statistics.median(warmups) * 1e3:8.1f} ms")
+        for cumulative_us, name in heaviest_imports(directory, module, args.top):
+            print(f"    {cumulative_us / 1e3:8.1f} ms  {name}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Storage size and read/write cost of the compressed text columns.
+
+Generates agent reports, intermediate steps and citation lists shaped like
+the stored ones, trains a zstd dictionary on one half and measures the other
+half stored as plain UTF-8, zstd at several levels and zstd with the trained
+dictionary: stored bytes, compress time per value (write path) and
+decompress time per value (read path, what CompressedText adds to every
+load). For the same numbers on a live database use
+``app/compress_text_columns.py --report`` before and after the backfill.
+
+Usage:
+    python benchmarks/bench_text_compression.py [--values 400] [--dict-size 112640]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import codec  # noqa: E402
+import compressed_text  # noqa: E402
+from bench_codec import make_citations, make_report  # noqa: E402
+
+zstandard = compressed_text.zstandard
+
+
+def make_values(count, seed):
+    values = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            values.append(make_report(20000 + (i * 997) % 60000, seed=seed + i))
+        elif kind == 1:
+            values.append(
+                "|||---|||".join(
+                    f"### Step {j}\n**Thought**\n\n{make_report(800, seed + i + j)}"
+                    for j in range(10)
+                )
+            )
+        else:
+            values.append(codec.dumps(make_citations(10 + i % 40)))
+    return [value.encode("utf-8") for value in values]
+
+
+def measure(values, compress, decompress):
+    start = time.perf_counter()
+    stored = [compress(value) for value in values]
+    compress_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for data in stored:
+        decompress(data)
+    decompress_s = time.perf_counter() - start
+    return (
+        sum(len(data) for data in stored),
+        compress_s / len(values) * 1e6,
+        decompress_s / len(values) * 1e6,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--values", type=int, default=400)
+    parser.add_argument("--dict-size", type=int, default=112640)
+    args = parser.parse_args()
+    if zstandard is None:
+        raise SystemExit("zstandard is not installed")
+
+    training = make_values(args.values, seed=0)
+    values = make_values(args.values, seed=100000)
+    raw_bytes = sum(len(value) for value in values)
+    dictionary = zstandard.train_dictionary(args.dict_size, training)
+
+    variants = [("plain utf-8", lambda v: v, lambda d: d)]
+    for level in (1, 3, 9, 19):
+        compressor = zstandard.ZstdCompressor(level=level)
+        variants.append(
+            (
+                f"zstd {level}",
+                compressor.compress,
+                zstandard.ZstdDecompressor().decompress,
+            )
+        )
+    for level in (3, 9):
+        compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+        variants.append(
+            (
+                f"zstd {level} + dict",
+                compressor.compress,
+                zstandard.ZstdDecompressor(dict_data=dictionary).decompress,
+            )
+        )
+
+    print(
+        f"{len(values)} values, {raw_bytes / 1e6:.2f} MB as text, "
+        f"dictionary {args.dict_size / 1e3:.0f} KB"
+    )
+    print(
+        f"{'variant':<16} {'stored MB':>10} {'ratio':>7} {'write us':>10} {'read us':>9}"
+    )
+    for name, compress, decompress in variants:
+        stored, write_us, read_us = measure(values, compress, decompress)
+        print(
+            f"{name:<16} {stored / 1e6:>10.3f} {raw_bytes / stored:>6.1f}x "
+            f"{write_us:>10.1f} {read_us:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
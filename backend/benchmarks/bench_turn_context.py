@@ -0,0 +1,113 @@
+"""
+Input size per turn of a Simple DeepResearch run: the old whole-history
+prompt against the token-budgeted TurnContext.
+
+Replays a synthetic 30-turn run (searches with long thoughts, a report
+draft every few turns, no summary action from the model) through both ways
+of building the model input and reports, per turn, the estimated input
+tokens, plus the total tokens sent over the run and the time spent building
+inputs.
+
+Usage:
+    python benchmarks/bench_turn_context.py [--turns 30] [--budget 12000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "Simple_DeepResearch_server")
+)
+
+from prompt import report_prompt, summary_reminder_prompt  # noqa: E402
+from turn_context import DEFAULT_CHARS_PER_TOKEN, TurnContext  # noqa: E402
+
+# The character limit the old prompt builder reminded the model at
+MAX_CONTEXT_LENGTH = 40000
+
+WORDS = (
+    "research model search result evidence source claim report section method "
+    "data study analysis figure market policy energy cost growth risk trend"
+).split()
+
+
+def text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def synthetic_turns(turns: int, seed: int = 0):
+    """(thought, action, observation) of each turn but the final answer."""
+    rng = random.Random(seed)
+    for turn in range(1, turns):
+        thought = text(rng, 400)
+        if turn % 5 == 0:
+            action = f"<scripts>{text(rng, 1500)}</scripts>"
+            observation = ""
+        else:
+            query = text(rng, 6)
+            action = f"<search>{query}</search>"
+            observation = (
+                f"**Search Queries**\n\n1. {query}\n\n"
+                f"**Fetched URLS**\n\n1. https://example.com/{turn}"
+            )
+        yield thought, action, observation
+
+
+def legacy_inputs(prompt: str, turns):
+    """Inputs as built before TurnContext: the whole history, every turn."""
+    current = prompt
+    for number, (thought, action, observation) in enumerate(turns, 1):
+        response = f"<think>{thought}</think>\n\n{action}"
+        current = current + f"[Turn {number}]:\n{response}\n{observation}\n\n"
+        if len(current) > MAX_CONTEXT_LENGTH:
+            current = current + summary_reminder_prompt
+        yield current
+
+
+def budgeted_inputs(prompt: str, turns, budget: int):
+    context = TurnContext(
+        prompt, token_budget=budget, compaction_reminder=summary_reminder_prompt
+    )
+    for number, (thought, action, observation) in enumerate(turns, 1):
+        context.add_turn(number, thought, action, observation)
+        yield context.build_input()[0]
+
+
+def tokens(text: str) -> int:
+    return round(len(text) / DEFAULT_CHARS_PER_TOKEN)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--budget", type=int, default=12000)
+    args = parser.parse_args()
+
+    prompt = report_prompt.format(question="How do heat pumps compare on cost?")
+    turns = list(synthetic_turns(args.turns))
+
+    start = time.perf_counter()
+    legacy = [tokens(text) for text in legacy_inputs(prompt, turns)]
+    legacy_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    budgeted = [tokens(text) for text in budgeted_inputs(prompt, turns, args.budget)]
+    budgeted_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{'turn':>5} {'whole history':>14} {'budgeted':>9}")
+    for number, (old, new) in enumerate(zip(legacy, budgeted), 2):
+        print(f"{number:>5} {old:>14} {new:>9}")
+    print(
+        f"\ntotal input tokens: whole history {sum(legacy)}, budgeted "
+        f"{sum(budgeted)} ({sum(budgeted) / sum(legacy):.0%})"
+    )
+    print(
+        f"building inputs: whole history {legacy_ms:.1f} ms, "
+        f"budgeted {budgeted_ms:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
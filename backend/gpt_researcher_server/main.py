@@ -1,51 +1,63 @@
 import asyncio
-import json
 import logging
 import os
+from contextlib import asynccontextmanager
 from typing import Any, AsyncGenerator, Dict
 
-import openai
+import codec
 import requests
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import APIRouter, FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse
-from gpt_researcher import GPTResearcher
 
 # Load environment variables from parent directory
 load_dotenv("../../.env")  # Load from parent directory .env file
 load_dotenv()  # Also load from current directory and environment variables
 
-# Log environment variable status
-print("=== GPT Researcher Server Environment Variables ===")
-openai_api_key = os.getenv("OPENAI_API_KEY")
-serper_api_key = os.getenv("SERPER_API_KEY")
-print(f"OPENAI_API_KEY: {'✓ SET' if openai_api_key else '✗ NOT SET'}")
-print(f"SERPER_API_KEY: {'✓ SET' if serper_api_key else '✗ NOT SET'}")
-
-# Set GPT Researcher specific environment variables
-os.environ["RETRIEVER"] = "serper"  # Use Serper as the search engine
-os.environ["FAST_LLM"] = "openai:gpt-4o-mini"  # Use a valid OpenAI model
-os.environ["SMART_LLM"] = "openai:gpt-4o"  # Use a valid OpenAI model
-os.environ["STRATEGIC_LLM"] = "openai:gpt-4o"  # Use a valid OpenAI model
-os.environ["EMBEDDING"] = "openai:text-embedding-3-small"  # Use a valid embedding model
-
-print(f"RETRIEVER: {os.getenv('RETRIEVER')}")
-print(f"FAST_LLM: {os.getenv('FAST_LLM')}")
-print(f"SMART_LLM: {os.getenv('SMART_LLM')}")
-print(f"STRATEGIC_LLM: {os.getenv('STRATEGIC_LLM')}")
-print(f"EMBEDDING: {os.getenv('EMBEDDING')}")
-print("====================================================")
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+
+
+# GPT Researcher specific environment variables, applied before it is imported
+RESEARCHER_ENV = {
+    "RETRIEVER": "serper",  # Use Serper as the search engine
+    "FAST_LLM": "openai:gpt-4o-mini",  # Use a valid OpenAI model
+    "SMART_LLM": "openai:gpt-4o",  # Use a valid OpenAI model
+    "STRATEGIC_LLM": "openai:gpt-4o",  # Use a valid OpenAI model
+    "EMBEDDING": "openai:text-embedding-3-small",  # Use a valid embedding model
+}
+
+
+def log_environment():
+    """Log environment variable status."""
+    print("=== GPT Researcher Server Environment Variables ===")
+    print(f"OPENAI_API_KEY: {'✓ SET' if os.getenv('OPENAI_API_KEY') else '✗ NOT SET'}")
+    print(f"SERPER_API_KEY: {'✓ SET' if os.getenv('SERPER_API_KEY') else '✗ NOT SET'}")
+    for name, value in RESEARCHER_ENV.items():
+        print(f"{name}: {value}")
+    print("====================================================")
+
+
+def load_researcher_class():
+    """
+    Import GPTResearcher on first use. The package pulls in langchain and its
+    provider SDKs, which dominate the import time of this service.
+    """
+    os.environ.update(RESEARCHER_ENV)
+    from gpt_researcher import GPTResearcher
+
+    return GPTResearcher
+
+
+router = APIRouter()
 
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     """Health check endpoint that also validates configuration"""
     health_status = {"status": "ok", "service": "gpt-researcher"}
@@ -73,7 +85,7 @@ async def health_check():
     return health_status
 
 
-@app.get("/test-connections")
+@router.get("/test-connections")
 async def test_api_connections():
     """
     Test endpoint to verify OpenAI and Serper API connections
@@ -91,6 +103,8 @@ async def test_api_connections():
             results["openai"]["message"] = "OPENAI_API_KEY not set"
         else:
             # Test OpenAI with a simple request
+            import openai
+
             client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
             response = client.chat.completions.create(
                 model="gpt-4o-mini",
@@ -199,6 +213,8 @@ async def gpt_researcher_producer_gen(
                         "SERPER_API_KEY is not set. Please configure your Serper API key."
                     )
 
+                # The first import takes seconds; keep it off the event loop
+                GPTResearcher = await asyncio.to_thread(load_researcher_class)
                 researcher = GPTResearcher(
                     query=question, report_type="research_report", websocket=handler
                 )
@@ -276,7 +292,7 @@ async def gpt_researcher_producer_gen(
         yield {"error": error_msg}
 
 
-@app.post("/run")
+@router.post("/run")
 async def run_gpt_researcher(request: Request):
     data = await request.json()
     question = data.get("question")
@@ -284,11 +300,47 @@ async def run_gpt_researcher(request: Request):
     if not question:
         raise HTTPException(status_code=400, detail="Question is required.")
 
+    media_type = codec.negotiate_media_type(
+        request.headers.get("accept"), codec.SSE_MEDIA_TYPE
+    )
+
     async def stream_generator():
         async for result in gpt_researcher_producer_gen(question):
-            yield f"data: {json.dumps(result)}\n\n"
+            yield codec.encode_frame(result, media_type)
+
+    return StreamingResponse(stream_generator(), media_type=media_type)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_environment()
+    if WARMUP_ON_STARTUP:
+        await asyncio.to_thread(load_researcher_class)
+        yield
+        return
+    # Import it in the background once the service is up, so the first
+    # research run finds it loaded (or joins the import under way)
+    preload = asyncio.create_task(asyncio.to_thread(load_researcher_class))
+    preload.add_done_callback(preload_done)
+    yield
+
+
+def preload_done(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Preloading gpt_researcher failed: {task.exception()}")
+
+
+def create_app() -> FastAPI:
+    """
+    Build the service. gpt_researcher is imported in a thread right after
+    startup, or before the service accepts requests when WARMUP_ON_STARTUP=true.
+    """
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(router)
+    return app
+
 
-    return StreamingResponse(stream_generator(), media_type="text/event-stream")
+app = create_app()
 
 
 if __name__ == "__main__":
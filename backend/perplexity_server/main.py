@@ -1,12 +1,13 @@
-import json
 import logging
 import os
 import re
+from contextlib import asynccontextmanager
 from typing import Any, AsyncGenerator, Dict
 
+import codec
 import requests
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import APIRouter, FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from perplexity_client import stream_perplexity_api
 
@@ -14,29 +15,30 @@ from perplexity_client import stream_perplexity_api
 load_dotenv("../../.env")  # Load from parent directory .env file
 load_dotenv()  # Also load from current directory and environment variables
 
-# Log environment variable status
-perplexity_api_key = os.getenv("PERPLEXITY_API_KEY")
-print("=== Perplexity Server Environment Variables ===")
-print(f"PERPLEXITY_API_KEY: {'✓ SET' if perplexity_api_key else '✗ NOT SET'}")
-print("===============================================")
-
-# Use direct import to get the client
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+def log_environment():
+    """Log environment variable status."""
+    perplexity_api_key = os.getenv("PERPLEXITY_API_KEY")
+    print("=== Perplexity Server Environment Variables ===")
+    print(f"PERPLEXITY_API_KEY: {'✓ SET' if perplexity_api_key else '✗ NOT SET'}")
+    print("===============================================")
 
 
-@app.get("/health")
+router = APIRouter()
+
+
+@router.get("/health")
 async def health_check():
     return {"status": "ok"}
 
 
-@app.get("/test-connections")
+@router.get("/test-connections")
 async def test_api_connections():
     """
     Test endpoint to verify Perplexity API connection
@@ -208,7 +210,7 @@ async def perplexity_producer_gen(
         }
 
 
-@app.post("/run")
+@router.post("/run")
 async def run_perplexity(request: Request):
     data = await request.json()
     question = data.get("question")
@@ -216,11 +218,31 @@ async def run_perplexity(request: Request):
     if not question:
         raise HTTPException(status_code=400, detail="Question is required.")
 
+    media_type = codec.negotiate_media_type(
+        request.headers.get("accept"), codec.SSE_MEDIA_TYPE
+    )
+
     async def stream_generator():
         async for result in perplexity_producer_gen(question):
-            yield f"data: {json.dumps(result)}\n\n"
+            yield codec.encode_frame(result, media_type)
+
+    return StreamingResponse(stream_generator(), media_type=media_type)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_environment()
+    yield
+
+
+def create_app() -> FastAPI:
+    """Build the service. Also usable as ``uvicorn --factory main:create_app``."""
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(router)
+    return app
+
 
-    return StreamingResponse(stream_generator(), media_type="text/event-stream")
+app = create_app()
 
 
 if __name__ == "__main__":
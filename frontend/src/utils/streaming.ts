@@ -83,6 +83,8 @@ export const streamResponse = async (
     let agentA_type: string | undefined;
     let agentB_type: string | undefined;
     let rawResponse = '';
+    // Frames carry raw UTF-8, so multi-byte characters can straddle reads
+    const decoder = new TextDecoder();
 
     console.log('Starting to read stream');
 
@@ -94,7 +96,7 @@ export const streamResponse = async (
             break;
         }
 
-        const chunk = new TextDecoder().decode(value);
+        const chunk = decoder.decode(value, { stream: true });
         rawResponse += chunk;
         buffer += chunk;
 
@@ -98,6 +98,8 @@ export const streamAgentsResponse = async (
     let agentB_type: string | undefined;
     let agentC_type: string | undefined;
     let rawResponse = '';
+    // Frames carry raw UTF-8, so multi-byte characters can straddle reads
+    const decoder = new TextDecoder();
 
     console.log('Starting to read agents stream');
 
@@ -109,7 +111,7 @@ export const streamAgentsResponse = async (
             break;
         }
 
-        const chunk = new TextDecoder().decode(value);
+        const chunk = decoder.decode(value, { stream: true });
         rawResponse += chunk;
         buffer += chunk;
 